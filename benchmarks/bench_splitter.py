@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: dynamic_markdown_split chunks/sec over data/clean_md.
+
+Runs the current splitter against the previous (re-encode-per-paragraph)
+implementation kept below as `legacy_split`, checks both produce identical
+chunks for every document and prints throughput for each.
+
+python benchmarks/bench_splitter.py                 # whole corpus
+python benchmarks/bench_splitter.py --limit 500     # first 500 files
+"""
+from __future__ import annotations
+import argparse, pathlib, time
+from typing import Callable, List
+from procore_scraper import splitters
+from procore_scraper.splitters import enc, dynamic_markdown_split
+
+
+# ------------------------------------------------------------------- #
+# Reference: splitter as of 0.1.1 (quadratic in section length)
+# ------------------------------------------------------------------- #
+def _legacy_safe_split(section: str) -> List[str]:
+    toklen = splitters._toklen
+    if toklen(section) <= splitters.CHUNK_MAX:
+        return [section]
+    paras = section.split("\n\n")
+    out, buf, in_code = [], [], False
+    for para in paras:
+        if splitters._CODE_FENCE_RE.search(para):
+            in_code = not in_code
+        buf.append(para)
+        if (not in_code) and toklen("\n\n".join(buf)) >= splitters.CHUNK_TARGET:
+            out.append("\n\n".join(buf).strip())
+            buf = []
+    if buf:
+        out.append("\n\n".join(buf).strip())
+    if len(out) == 1 and toklen(out[0]) > splitters.CHUNK_MAX:
+        tokens = enc.encode(section)
+        mid = len(tokens) // 2
+        out = [enc.decode(tokens[:mid]), enc.decode(tokens[mid:])]
+    final: List[str] = []
+    for chunk in out:
+        final.extend(_legacy_safe_split(chunk) if toklen(chunk) > splitters.CHUNK_MAX else [chunk])
+    return final
+
+
+def legacy_split(md: str) -> List[str]:
+    chunks: List[str] = []
+    for sec in splitters._split_headers(md):
+        chunks.extend(_legacy_safe_split(sec))
+    result: List[str] = []
+    for i, chunk in enumerate(chunks):
+        if i == 0:
+            result.append(chunk.strip())
+        else:
+            overlap = enc.decode(enc.encode(chunks[i - 1])[-splitters.OVERLAP_TOKENS:])
+            result.append((overlap + "\n\n" + chunk).strip())
+    return result
+
+
+# ------------------------------------------------------------------- #
+def run(fn: Callable[[str], List[str]], docs: List[str]) -> tuple[list, float]:
+    t0 = time.perf_counter()
+    out = [fn(d) for d in docs]
+    return out, time.perf_counter() - t0
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--md-dir", type=pathlib.Path, default=pathlib.Path("data/clean_md"))
+    ap.add_argument("--limit", type=int, default=0)
+    args = ap.parse_args()
+
+    paths = sorted(args.md_dir.glob("*.md"))
+    if args.limit:
+        paths = paths[: args.limit]
+    if not paths:
+        raise SystemExit(f"No *.md files under {args.md_dir}")
+    docs = [p.read_text() for p in paths]
+    mb = sum(len(d.encode()) for d in docs) / 1e6
+
+    new, t_new = run(dynamic_markdown_split, docs)
+    old, t_old = run(legacy_split, docs)
+    diff = [p.name for p, a, b in zip(paths, new, old) if a != b]
+    n = sum(map(len, new))
+
+    print(f"{len(docs):,} docs  {mb:.1f} MB  {n:,} chunks")
+    print(f"before  {t_old:8.2f}s  {n / t_old:10,.0f} chunks/s")
+    print(f"after   {t_new:8.2f}s  {n / t_new:10,.0f} chunks/s  ({t_old / t_new:.1f}×)")
+    print("output identical" if not diff else f"OUTPUT DIFFERS in {len(diff)} docs, e.g. {diff[:5]}")
+    if diff:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
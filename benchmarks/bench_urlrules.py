@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Benchmark: URL prune + canonicalize + dedupe throughput.
+
+Runs the previous pipeline (one regex search per BAD pattern, lower-casing
+canonicalize, exact-string set) as `legacy_prune` against
+``UrlRules.process`` over the url_list_*.txt files and a synthetic list with
+the duplicates real crawls produce: host case, default ports, tracking
+parameters, fragments, index pages, locale prefixes, query order.
+
+python benchmarks/bench_urlrules.py                   # url lists + 1M synthetic
+python benchmarks/bench_urlrules.py --synthetic 200000
+"""
+from __future__ import annotations
+import argparse, pathlib, random, re, resource, time, urllib.parse
+from typing import Callable, Iterable, List
+from procore_scraper.urlrules import UrlRules, DEFAULT_EXCLUDE
+
+
+# ------------------------------------------------------------------- #
+# Reference: prune_urls.keep + utils.canonicalize as of 0.1.x
+# ------------------------------------------------------------------- #
+BAD = [re.compile(p) for p in DEFAULT_EXCLUDE]
+
+
+def legacy_prune(urls: Iterable[str]) -> List[str]:
+    out, seen = [], set()
+    for u in urls:
+        u = u.strip()
+        if not u or any(p.search(u) for p in BAD) or urllib.parse.urlparse(u).fragment:
+            continue
+        c = u.replace("http://", "https://").rstrip("/").lower()
+        if c not in seen:
+            seen.add(c)
+            out.append(c)
+    return out
+
+
+# ------------------------------------------------------------------- #
+def synthetic(n: int, seed: int = 0) -> List[str]:
+    """`n` URLs over ~n/4 distinct pages, each written several ways."""
+    rng = random.Random(seed)
+    hosts = ["developers.procore.com", "support.procore.com", "www.procore.com", "procore.com"]
+    words = ["rfis", "submittals", "Projects", "budget", "ChangeOrders", "daily-log", "api", "v1.0",
+             "tools", "Drawings", "webhooks", "oauth", "docs", "reference", "guide", "blog"]
+    pages = max(1, n // 4)
+    out: List[str] = []
+    for _ in range(n):
+        i = rng.randrange(pages)
+        r = random.Random(i)
+        host = hosts[i % len(hosts)]
+        path = "/" + "/".join(r.choice(words) for _ in range(1 + i % 4)) + f"/{i}"
+        query = f"id={i}&tab={i % 7}" if i % 5 == 0 else ""
+        v = rng.random()
+        if v < 0.1:
+            host = host.upper()
+        elif v < 0.15:
+            host += ":443"
+        if rng.random() < 0.1:
+            path = "/en-us" + path
+        if rng.random() < 0.05:
+            path += "/index.html"
+        if query and rng.random() < 0.3:
+            query = "&".join(reversed(query.split("&")))
+        if rng.random() < 0.2:
+            query = (query + "&" if query else "") + f"utm_source=news{rng.randrange(9)}"
+        url = f"{'http' if rng.random() < 0.1 else 'https'}://{host}{path}" + (f"?{query}" if query else "")
+        if rng.random() < 0.05:
+            url += "#section"
+        out.append(url)
+    return out
+
+
+def run(name: str, fn: Callable[[List[str]], List[str]], urls: List[str]) -> tuple[int, float]:
+    t0 = time.perf_counter()
+    kept = fn(urls)
+    dt = time.perf_counter() - t0
+    print(f"  {name:8s} {dt:7.2f}s  {len(urls) / dt:12,.0f} URLs/s  kept {len(kept):,}")
+    return len(kept), dt
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lists", nargs="*", default=sorted(str(p) for p in pathlib.Path(".").glob("url_list_*.txt")))
+    ap.add_argument("--synthetic", type=int, default=1_000_000, help="synthetic URLs (0 = skip)")
+    args = ap.parse_args()
+
+    sets = [(p, pathlib.Path(p).read_text().split()) for p in args.lists]
+    if args.synthetic:
+        sets.append((f"synthetic {args.synthetic:,}", synthetic(args.synthetic)))
+    rules = UrlRules(default_locales=("en", "en-us"))
+    for name, urls in sets:
+        print(f"{name}: {len(urls):,} URLs")
+        run("before", legacy_prune, urls)
+        run("after", lambda u: list(rules.process(u, set())), urls)
+    print(f"peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Benchmark fixtures: a frozen corpus of (url, raw HTML, clean Markdown).
+
+The suite reads benchmarks/fixtures/corpus.jsonl.gz when it exists. Freeze
+one from a scraped tree (a fixed, seeded sample of data/raw_html with the
+matching data/clean_md) with
+
+python benchmarks/fixtures.py --from data --n 300
+
+Without a frozen file the suite falls back to `synthetic()`: seeded
+Procore-style pages – nav / header / footer chrome around an article with
+headings, paragraphs, lists, tables and code samples, sized like the real
+support and API pages. Same seed, same bytes, so results stay comparable.
+Either way `digest()` identifies the corpus a result was measured on.
+"""
+from __future__ import annotations
+import argparse, gzip, hashlib, json, pathlib, random
+from typing import Dict, List
+
+FROZEN = pathlib.Path(__file__).parent / "fixtures" / "corpus.jsonl.gz"
+
+WORDS = ("project submittal rfi budget change order drawing schedule daily log inspection punch list "
+         "observation meeting contract commitment invoice vendor company user permission template "
+         "workflow approval reviewer due date status location trade cost code line item attachment "
+         "the a to of and in for with on is by can you your this that from be are as or select click "
+         "create edit delete open view export import settings tool page button field configure "
+         "when after before each all new existing required optional default custom admin level").split()
+API_PATHS = ("projects", "rfis", "submittals", "budget_line_items", "change_orders", "daily_logs",
+             "drawings", "companies", "users", "vendors", "webhooks", "observations")
+
+
+# ------------------------------------------------------------------- #
+def _sentence(r: random.Random, n: int) -> str:
+    s = " ".join(r.choice(WORDS) for _ in range(n))
+    return s[0].upper() + s[1:] + "."
+
+
+def _article(r: random.Random, i: int) -> str:
+    parts = [f"<h1>{_sentence(r, 4)[:-1]}</h1>"]
+    for s in range(r.randint(2, 9)):
+        parts.append(f"<h2 id='s{s}'>{_sentence(r, r.randint(2, 6))[:-1]}</h2>")
+        for _ in range(r.randint(1, 5)):
+            kind = r.random()
+            if kind < 0.55:
+                parts.append("<p>" + " ".join(_sentence(r, r.randint(6, 24)) for _ in range(r.randint(1, 6)))
+                             + "</p>")
+            elif kind < 0.75:
+                items = "".join(f"<li>{_sentence(r, r.randint(3, 12))}</li>" for _ in range(r.randint(2, 8)))
+                tag = "ol" if r.random() < 0.4 else "ul"
+                parts.append(f"<{tag}>{items}</{tag}>")
+            elif kind < 0.88:
+                path = r.choice(API_PATHS)
+                body = json.dumps({f"{r.choice(WORDS)}_id": r.randint(1, 10**6) for _ in range(r.randint(2, 8))},
+                                  indent=2)
+                parts.append(f"<pre><code class='language-bash'>curl -X GET "
+                             f"https://api.procore.com/rest/v1.0/{path}?project_id={r.randint(1, 9999)} \\\n"
+                             f"  -H 'Authorization: Bearer $TOKEN'\n</code></pre>"
+                             f"<pre><code class='language-json'>{body}</code></pre>")
+            else:
+                cols = r.randint(2, 5)
+                head = "".join(f"<th>{r.choice(WORDS)}</th>" for _ in range(cols))
+                rows = "".join("<tr>" + "".join(f"<td>{_sentence(r, r.randint(1, 4))}</td>" for _ in range(cols))
+                               + "</tr>" for _ in range(r.randint(2, 10)))
+                parts.append(f"<table><thead><tr>{head}</tr></thead><tbody>{rows}</tbody></table>")
+    return "".join(parts)
+
+
+def synthetic(n: int = 300, seed: int = 0) -> List[Dict[str, str]]:
+    """`n` seeded pages as {url, html, md}; ``md`` is filled in by the suite's extraction pass."""
+    out = []
+    for i in range(n):
+        r = random.Random(seed * 1_000_003 + i)
+        host = "developers.procore.com" if i % 3 == 0 else "support.procore.com"
+        url = f"https://{host}/{r.choice(API_PATHS)}/{i}"
+        nav = "".join(f"<li><a href='/{p}'>{p.replace('_', ' ').title()}</a></li>" for p in API_PATHS)
+        chrome = "<script>window.dataLayer=[];function gtag(){dataLayer.push(arguments)}</script>" * r.randint(1, 6)
+        html = (f"<!DOCTYPE html><html lang='en'><head><meta charset='utf-8'><title>{_sentence(r, 5)[:-1]} | Procore"
+                f"</title><link rel='stylesheet' href='/main.css'>{chrome}</head><body>"
+                f"<header><a href='/'>Procore</a><form><input name='q'></form></header><nav><ul>{nav}</ul></nav>"
+                f"<main><article>{_article(r, i)}</article></main>"
+                f"<aside>{_sentence(r, 12)}</aside><footer>© Procore Technologies {_sentence(r, 8)}</footer>"
+                f"</body></html>")
+        out.append({"url": url, "html": html, "md": ""})
+    return out
+
+
+def load(n: int = 300, seed: int = 0, path: pathlib.Path = FROZEN) -> List[Dict[str, str]]:
+    if path.exists():
+        with gzip.open(path, "rt", encoding="utf-8") as fh:
+            return [json.loads(line) for line in fh]
+    return synthetic(n, seed)
+
+
+def digest(pages: List[Dict[str, str]]) -> str:
+    h = hashlib.sha1()
+    for p in pages:
+        h.update(p["url"].encode())
+        h.update(hashlib.sha1(p["html"].encode("utf-8", "replace")).digest())
+    return h.hexdigest()[:12]
+
+
+# ------------------------------------------------------------------- #
+def freeze(data: pathlib.Path, n: int, seed: int, out: pathlib.Path) -> int:
+    """Write a seeded sample of `data`/raw_html (+ clean_md, meta url) to `out`."""
+    slugs = sorted(p.stem for p in (data / "raw_html").glob("*.html") if (data / "clean_md" / f"{p.stem}.md").exists())
+    pick = sorted(random.Random(seed).sample(slugs, min(n, len(slugs))))
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with gzip.open(out, "wt", encoding="utf-8") as fh:
+        for slug in pick:
+            meta_path = data / "meta" / f"{slug}.json"
+            url = json.loads(meta_path.read_text()).get("url", slug) if meta_path.exists() else slug
+            fh.write(json.dumps({"url": url,
+                                 "html": (data / "raw_html" / f"{slug}.html").read_text("utf-8", errors="ignore"),
+                                 "md": (data / "clean_md" / f"{slug}.md").read_text("utf-8", errors="ignore")})
+                     + "\n")
+    return len(pick)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--from", dest="data", type=pathlib.Path, default=pathlib.Path("data"))
+    ap.add_argument("--n", type=int, default=300, help="pages to sample")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("-o", "--out", type=pathlib.Path, default=FROZEN)
+    args = ap.parse_args()
+    n = freeze(args.data, args.n, args.seed, args.out)
+    print(f"froze {n} pages → {args.out} ({args.out.stat().st_size / 1e6:.1f} MB, digest {digest(load(path=args.out))})")
+
+
+if __name__ == "__main__":
+    main()
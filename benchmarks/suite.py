@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark suite: extraction → split → store → FAISS, no network.
+
+Runs every CPU-bound stage of the pipeline over the fixture corpus (see
+benchmarks/fixtures.py) with a stub embedder in place of the API, and
+reports
+
+* extract    – extract_page pages/s and MB/s (one process)
+* split      – dynamic_markdown_split chunks/s
+* store      – StoreWriter rows/s
+* ingest     – ingest_faiss rows/s and peak RSS, in a fresh child process
+* ann        – recall@10, p50 / p99 single-query latency and bytes / vector
+  for every index type and query-time setting ann.tune sweeps, lossy
+  types also with full-precision rescoring
+
+The stub embedder is deterministic: each page gets a random centroid and
+each chunk a unit vector near it, so the ANN numbers see clustered data
+like real embeddings rather than uniform noise. Timed sections are the best
+of --repeat runs.
+
+python benchmarks/suite.py                                   # print results
+python benchmarks/suite.py --save                            # + benchmarks/results/<time>.json
+python benchmarks/suite.py --baseline benchmarks/results/main.json --threshold 0.15
+
+With --baseline, metrics that moved the wrong way by more than --threshold
+(relative) are flagged and the exit status is 1. Results are only
+comparable on the same machine and fixture digest; the digest is recorded
+and a mismatch is reported.
+"""
+from __future__ import annotations
+import argparse, hashlib, json, multiprocessing, os, pathlib, platform, resource, subprocess, sys, tempfile, time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Tuple
+import numpy as np
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))                     # ingest_vector_db is a top-level script
+sys.path.insert(0, str(pathlib.Path(__file__).parent))
+import fixtures
+from procore_scraper import ann
+from procore_scraper.extract import extract_page
+from procore_scraper.splitters import dynamic_markdown_split
+from procore_scraper.store import EmbeddingStore, StoreWriter
+
+RESULTS = pathlib.Path(__file__).parent / "results"
+
+
+def best(fn: Callable[[], object], repeat: int) -> Tuple[float, object]:
+    """Fastest wall time of `repeat` calls, and the last result."""
+    t, out = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        t = min(t, time.perf_counter() - t0)
+    return t, out
+
+
+def _seed(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "little")
+
+
+def stub_embed(doc: str, chunks: List[str], dim: int) -> np.ndarray:
+    """Unit vectors scattered around a per-document centroid; same input, same output."""
+    centre = np.random.default_rng(_seed(doc)).standard_normal(dim, dtype=np.float32)
+    vecs = np.stack([centre + 0.6 * np.random.default_rng(_seed(c)).standard_normal(dim, dtype=np.float32)
+                     for c in chunks]) if chunks else np.empty((0, dim), np.float32)
+    return vecs / np.linalg.norm(vecs, axis=1, keepdims=True).clip(1e-9)
+
+
+# ------------------------------------------------------------------- #
+# Stages
+# ------------------------------------------------------------------- #
+def bench_extract(pages: List[dict], repeat: int) -> Dict[str, float]:
+    t, out = best(lambda: [extract_page(p["html"], p["url"]) for p in pages], repeat)
+    for p, (_, md, _, _) in zip(pages, out):
+        p["md"] = p["md"] or md                   # frozen fixtures keep their stored Markdown
+    mb = sum(len(p["html"].encode("utf-8", "replace")) for p in pages) / 1e6
+    return {"extract.pages_per_s": len(pages) / t, "extract.mb_per_s": mb / t}
+
+
+def bench_split(pages: List[dict], repeat: int) -> Tuple[Dict[str, float], List[List[str]]]:
+    t, chunks = best(lambda: [dynamic_markdown_split(p["md"]) for p in pages], repeat)
+    return {"split.chunks_per_s": sum(map(len, chunks)) / t}, chunks
+
+
+def bench_store(root: pathlib.Path, pages: List[dict], chunks: List[List[str]], dim: int) -> Dict[str, float]:
+    docs = [(hashlib.sha1(p["url"].encode()).hexdigest(), c) for p, c in zip(pages, chunks)]
+    vecs = [stub_embed(d, c, dim) for d, c in docs]
+    t0 = time.perf_counter()
+    w = StoreWriter(root, "stub", dim)
+    for (doc, cs), v in zip(docs, vecs):
+        w.append(v, [{"doc_sha1": doc, "chunk_id": i, "chunk_sha1": hashlib.sha1(c.encode()).hexdigest(),
+                      "text": c} for i, c in enumerate(cs)])
+        if w.pending >= 4096:
+            w.commit()
+    w.commit()
+    rows = sum(map(len, chunks))
+    return {"store.rows_per_s": rows / (time.perf_counter() - t0)}
+
+
+def _ingest_child(workdir: str, spec: dict) -> dict:
+    os.chdir(workdir)                             # ingest_vector_db resolves data/ against the cwd
+    import ingest_vector_db as iv
+    store = iv.open_store()
+    t0 = time.perf_counter()
+    iv.ingest_faiss(store, index_path="faiss.index", spec=spec, rebuild=True)
+    dt = time.perf_counter() - t0
+    scale = 1 if platform.system() == "Darwin" else 1024  # ru_maxrss: bytes on macOS, KiB on Linux
+    return {"rows": len(store), "seconds": dt,
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20}
+
+
+def bench_ingest(workdir: pathlib.Path, spec: dict) -> Dict[str, float]:
+    # fresh interpreter: the peak RSS is ingest's, not the extraction pass's
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        res = pool.submit(_ingest_child, str(workdir), spec).result()
+    return {"ingest.rows_per_s": res["rows"] / res["seconds"], "ingest.peak_rss_mb": res["peak_rss_mb"]}
+
+
+def bench_ann(store: EmbeddingStore, rows: int, queries: int, k: int, seed: int) -> Dict[str, float]:
+    """Grow the stub rows to `rows` by jittering them, then run ann.tune over every index type."""
+    rng = np.random.default_rng(seed)
+    src = np.concatenate([b.astype(np.float32) for _, b in store.blocks(4096)])
+    pick = rng.integers(0, len(src), rows)
+    base = src[pick] + 0.15 * rng.standard_normal((rows, store.dim), dtype=np.float32)
+    base /= np.linalg.norm(base, axis=1, keepdims=True)
+    qs = base[rng.choice(rows, queries, replace=False)] + 0.1 * rng.standard_normal((queries, store.dim),
+                                                                                     dtype=np.float32)
+    qs = np.ascontiguousarray(qs / np.linalg.norm(qs, axis=1, keepdims=True), dtype=np.float32)
+    specs = [ann.make_spec(t, pq_m=next(m for m in (64, 48, 32, 16, 8) if store.dim % m == 0))
+             for t in ann.INDEX_TYPES]
+    out: Dict[str, float] = {}
+    for r in ann.tune(ann.import_faiss(), base, np.arange(rows, dtype="int64"), qs, specs, k=k, seed=seed,
+                      rescore_factors=(0, 4)):
+        s = r["spec"]
+        knob = "".join(f",{key}={s[key]}" for key in ann.SEARCH_KEYS if key in s)
+        name = f"ann.{s['type']}{knob}" + (f",rescore={r['rescore']}" if r["rescore"] else "")
+        out[f"{name}.recall"] = r["recall"]
+        out[f"{name}.p50_ms"] = r["p50_ms"]
+        out[f"{name}.p99_ms"] = r["p99_ms"]
+        out[f"{name}.bytes_per_vec"] = r["bytes_per_vector"]
+    return out
+
+
+# ------------------------------------------------------------------- #
+# Results
+# ------------------------------------------------------------------- #
+LOWER = ("_ms", "_mb", "_per_vec")                            # metric suffixes where smaller is better
+
+
+def direction(name: str) -> str:
+    return "lower" if name.endswith(LOWER) else "higher"
+
+
+def git_rev() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(cur: dict, base: dict, threshold: float) -> List[str]:
+    """Print a side-by-side table; return the names of regressed metrics and of baseline metrics now missing."""
+    if cur["meta"]["fixtures"] != base["meta"].get("fixtures"):
+        print(f"! fixture digest {cur['meta']['fixtures']} ≠ baseline {base['meta'].get('fixtures')}; "
+              "numbers are not comparable", file=sys.stderr)
+    bad = []
+    print(f"\n{'metric':48s} {'baseline':>12s} {'current':>12s} {'change':>8s}")
+    for name, m in cur["metrics"].items():
+        old = base["metrics"].get(name)
+        if old is None or not old["value"]:
+            print(f"{name:48s} {'–':>12s} {m['value']:12.4g}")
+            continue
+        change = m["value"] / old["value"] - 1
+        worse = -change if m["better"] == "higher" else change
+        flag = "  REGRESSION" if worse > threshold else ""
+        if flag:
+            bad.append(name)
+        print(f"{name:48s} {old['value']:12.4g} {m['value']:12.4g} {change:+8.1%}{flag}")
+    for name, old in base["metrics"].items():
+        if name not in cur["metrics"]:                # e.g. an index type that stopped building
+            bad.append(name)
+            print(f"{name:48s} {old['value']:12.4g} {'–':>12s} {'':8s}  MISSING")
+    return bad
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", type=int, default=300, help="synthetic pages when no frozen fixtures exist")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--dim", type=int, default=768, help="stub embedding width")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--ann-rows", type=int, default=20_000)
+    ap.add_argument("--ann-queries", type=int, default=200)
+    ap.add_argument("-k", type=int, default=10)
+    ap.add_argument("--skip", nargs="*", default=[], choices=["ingest", "ann"])
+    ap.add_argument("--save", nargs="?", const="", metavar="PATH",
+                    help="write results JSON (default benchmarks/results/<time>.json)")
+    ap.add_argument("--baseline", type=pathlib.Path, help="results JSON to compare against")
+    ap.add_argument("--threshold", type=float, default=0.10, help="relative change that counts as a regression")
+    args = ap.parse_args()
+
+    pages = fixtures.load(args.pages, args.seed)
+    digest = fixtures.digest(pages)
+    print(f"fixtures: {len(pages)} pages, {sum(len(p['html']) for p in pages) / 1e6:.1f} MB HTML, digest {digest}")
+
+    values: Dict[str, float] = {}
+    values.update(bench_extract(pages, args.repeat))
+    split, chunks = bench_split(pages, args.repeat)
+    values.update(split)
+    with tempfile.TemporaryDirectory(prefix="procore-bench-") as tmp:
+        work = pathlib.Path(tmp)
+        root = work / "data" / "embeddings" / "store"     # ingest_vector_db.STORE_DIR under `work`
+        values.update(bench_store(root, pages, chunks, args.dim))
+        if "ingest" not in args.skip:
+            values.update(bench_ingest(work, ann.make_spec("flat")))
+        if "ann" not in args.skip:
+            values.update(bench_ann(EmbeddingStore(root), args.ann_rows, args.ann_queries, args.k, args.seed))
+
+    result = {"meta": {"git": git_rev(), "python": platform.python_version(), "machine": platform.machine(),
+                       "cpus": os.cpu_count(), "fixtures": digest, "pages": len(pages),
+                       "chunks": sum(map(len, chunks)), "dim": args.dim, "ann_rows": args.ann_rows,
+                       "ts": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())},
+              "metrics": {k: {"value": round(v, 6), "better": direction(k)} for k, v in values.items()}}
+    for k, m in result["metrics"].items():
+        print(f"{k:48s} {m['value']:12.4g}")
+
+    if args.save is not None:
+        path = pathlib.Path(args.save or RESULTS / f"{time.strftime('%Y%m%d-%H%M%S')}.json")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(result, indent=2) + "\n")
+        print(f"saved → {path}")
+    if args.baseline:
+        bad = compare(result, json.loads(args.baseline.read_text()), args.threshold)
+        if bad:
+            print(f"\n{len(bad)} metric(s) regressed by more than {args.threshold:.0%} or went missing",
+                  file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
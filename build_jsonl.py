@@ -1,26 +1,36 @@
 # build_jsonl.py
-import json, pathlib, hashlib, tiktoken, sys
+"""
+Build the OpenAI vector-store payload: sharded JSON Lines in data/payload/
+(see procore_scraper.payload). Only shards whose documents changed are
+written; token counts come from the chunk cache where it is current.
+"""
+import argparse, pathlib, yaml
+from procore_scraper.chunk_cache import ChunkManifest
+from procore_scraper.payload import build, MAX_SHARD_BYTES, AVG_SHARD_DOCS
 
-enc = tiktoken.encoding_for_model("gpt-4o-mini")
-MD_DIR = pathlib.Path("data/clean_md")
-OUT    = pathlib.Path("openai_payload.json")
+CFG_PATH = pathlib.Path("config/settings.yaml")
+cfg = yaml.safe_load(CFG_PATH.read_text()) if CFG_PATH.exists() else {}
 
-# Build list of documents
-documents = []
-for md in MD_DIR.glob("*.md"):
-    text = md.read_text()
-    documents.append({
-        "text": text,
-        "metadata": {
-            "sha1": hashlib.sha1(text.encode()).hexdigest(),
-            "filename": md.name,
-            "tokens": len(enc.encode(text))
-        }
-    })
+MD_DIR    = pathlib.Path("data/clean_md")
+CHUNK_DIR = pathlib.Path("data/chunks")
+OUT_DIR   = pathlib.Path("data/payload")
 
-# Write as JSON file
-with OUT.open("w", encoding="utf-8") as fh:
-    json.dump(documents, fh, indent=2, ensure_ascii=False)
 
-print("✓ wrote", OUT, f"({OUT.stat().st_size/1e6:.1f} MB)")
-print(f"✓ processed {len(documents)} documents") 
\ No newline at end of file
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--out", default=str(OUT_DIR), help="shard directory")
+    ap.add_argument("--shard-bytes", type=int, default=cfg.get("payload_shard_bytes", MAX_SHARD_BYTES),
+                    help="upper bound on shard size")
+    ap.add_argument("--shard-docs", type=int, default=cfg.get("payload_shard_docs", AVG_SHARD_DOCS),
+                    help="average documents per shard")
+    args = ap.parse_args()
+
+    out = pathlib.Path(args.out)
+    shards, written = build(MD_DIR, out, ChunkManifest(CHUNK_DIR), args.shard_bytes, args.shard_docs)
+    size = sum(s["bytes"] for s in shards)
+    print(f"✓ {len(shards)} shards, {sum(s['docs'] for s in shards)} documents ({size/1e6:.1f} MB) in {out}")
+    print(f"✓ wrote {len(written)} changed shards")
+
+
+if __name__ == "__main__":
+    main()
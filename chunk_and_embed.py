@@ -3,12 +3,33 @@
 Chunk + embed Procore Markdown corpus using DynamicMarkdownSplitter and
 OpenAI text-embedding-3-large (configurable via settings.yaml or $EMB_MODEL).
 
-Skips embeddings already on disk (checks doc_sha1 + chunk_id).
+Chunking runs in a process pool and is cached in data/chunks/ (see
+chunk_cache), so files whose content has not changed are neither re-read nor
+re-tokenized. Near-duplicate pages are clustered next (data/chunks/neardup.sqlite,
+see neardup): each duplicate is marked ``dup_of`` its canonical page in the
+manifest and in data/meta/, and is left out of BM25, embedding and ingest
+unless --keep-duplicates is given. The BM25 index for hybrid retrieval
+(data/chunks/bm25.sqlite, see bm25) is updated from the same chunks. A document whose content changed
+gets fresh rows; vectors come from the content-addressed cache (see
+emb_cache) keyed by model + chunk sha1, so only chunk texts never seen before
+are sent to the API.
+
+Embedding requests are packed by token budget and kept in flight
+concurrently (see embedder); results land in the cache batch by batch. Rows
+go to the segment store in data/embeddings/store/ (see store), where vectors
+and metadata are committed atomically. Set OPENAI_BASE_URL to use another
+endpoint.
 """
 from __future__ import annotations
-import os, json, argparse, pathlib, numpy as np, openai, yaml
-from procore_scraper.utils import log_json, sha1_text
-from procore_scraper.splitters import dynamic_markdown_split
+import os, json, argparse, asyncio, pathlib, numpy as np, openai, yaml
+from procore_scraper import metrics
+from procore_scraper.utils import emb_dims, log_json, sha1_text
+from procore_scraper.chunk_cache import ChunkManifest
+from procore_scraper.bm25 import BM25Index
+from procore_scraper.neardup import NearDupIndex
+from procore_scraper.emb_cache import EmbeddingCache, chunk_key
+from procore_scraper.store import EmbeddingStore, StoreWriter
+from procore_scraper.embedder import EmbeddingScheduler, pack_batches, MAX_BATCH_ITEMS
 
 # --------------------------------------------------------------------------- #
 # Settings
@@ -18,75 +39,307 @@ if CFG_PATH.exists():
     cfg = yaml.safe_load(CFG_PATH.read_text())
     DEFAULT_MODEL = cfg.get("emb_model", "text-embedding-3-large")
 else:
+    cfg = {}
     DEFAULT_MODEL = "text-embedding-3-large"
 
 EMB_MODEL = os.getenv("EMB_MODEL", DEFAULT_MODEL)
+# Matryoshka cut: text-embedding-3-* return the first EMB_DIMS dims, renormalised
+EMB_DIMS  = emb_dims(cfg)
+# cache / "embedded" key – a cut vector is a different embedding of the same text
+EMB_KEY   = f"{EMB_MODEL}@{EMB_DIMS}" if EMB_DIMS else EMB_MODEL
 DATA      = pathlib.Path("data")
 MD_DIR    = DATA / "clean_md"
 EMB_DIR   = DATA / "embeddings"
+CHUNK_DIR = DATA / "chunks"
+META_DIR  = DATA / "meta"
+STORE_DIR = EMB_DIR / "store"
 EMB_DIR.mkdir(parents=True, exist_ok=True)
 
+COMMIT_ROWS = 4096   # rows per store segment
+
 # --------------------------------------------------------------------------- #
-def embed_texts(batch: list[str]) -> list[list[float]]:
-    resp = openai.embeddings.create(model=EMB_MODEL, input=batch)
-    return [d.embedding for d in resp.data]
+def legacy_dim(mmap_path: pathlib.Path) -> int | None:
+    """Width of the old headerless vecs.fp16: where the first unit-norm row ends (and a second one fits)."""
+    flat = np.memmap(mmap_path, dtype="float16", mode="r")
+    ss = np.cumsum(np.asarray(flat[: 1 << 16], dtype="float64") ** 2)
+    for d in np.flatnonzero(np.abs(ss - 1.0) < 1e-2) + 1:
+        if len(flat) % d == 0 and (len(flat) == d or abs(ss[min(2 * d, len(ss)) - 1] - 2.0) < 2e-2):
+            return int(d)
+    return None
+
+
+def import_legacy(writer: StoreWriter, jsonl_path: pathlib.Path, mmap_path: pathlib.Path) -> int:
+    """
+    One-off migration of the old vecs.fp16 + chunks.jsonl pair into the store.
+    Only rows that have both a complete JSONL line and a vector are taken.
+    """
+    vecs = np.memmap(mmap_path, dtype="float16", mode="r").reshape(-1, writer.dim)
+    rows = 0
+    with open(jsonl_path, "rb") as jf:
+        for row, line in enumerate(jf):
+            if not line.endswith(b"\n") or row >= len(vecs):
+                break
+            j = json.loads(line)
+            j.setdefault("chunk_sha1", chunk_key(j["text"]).hex())
+            writer.append(vecs[row : row + 1], [j])
+            rows += 1
+            if writer.pending >= COMMIT_ROWS:
+                writer.commit()
+    writer.commit()
+    return rows
+
+
+def seed_cache(cache: EmbeddingCache, manifest: ChunkManifest, store: EmbeddingStore) -> int:
+    """
+    One-off: stream the store's rows into an empty cache and mark documents
+    whose current chunks are all present as embedded. Returns docs marked.
+    """
+    seen: dict[tuple[str, int], bytes] = {}
+    for start, block in store.blocks(1024):
+        batch = []
+        for i, vec in enumerate(block):
+            j = store.meta(start + i)
+            key = bytes.fromhex(j["chunk_sha1"])
+            seen[(j["doc_sha1"], j["chunk_id"])] = key
+            batch.append((key, vec))
+        cache.put_many(batch)
+    marked = 0
+    for stem, entry in manifest.docs.items():
+        chunks = manifest.load(stem)["chunks"]
+        if all(seen.get((stem, i)) == chunk_key(c) for i, c in enumerate(chunks)):
+            entry.setdefault("embedded", {})[EMB_KEY] = entry["sha1"]
+            marked += 1
+    return marked
+
+
+def update_neardup(manifest: ChunkManifest, changed: list[str], skip: bool, batch: int = 256) -> int:
+    """
+    Cluster changed, missing and removed docs; mark duplicates ``dup_of`` in
+    the manifest (only when `skip`) and in their meta/ files. Returns the
+    number of duplicates.
+    """
+    nd_cfg = cfg.get("neardup") or {}
+    nd = NearDupIndex(CHUNK_DIR / "neardup.sqlite", threshold=nd_cfg.get("threshold", 0.85),
+                      shingle=nd_cfg.get("shingle", 5))
+    have = nd.docs()
+    todo = sorted(set(changed) | (manifest.docs.keys() - have))
+    gone = have - manifest.docs.keys()
+    old = nd.duplicates()
+    nd.update({}, drop=gone)
+    for i in range(0, len(todo), batch):
+        nd.update({s: (MD_DIR / f"{s}.md").read_text("utf-8", errors="ignore") for s in todo[i : i + batch]})
+    dups = nd.duplicates()
+    nd.close()
+
+    # meta/ records clusters both ways; only touch pages whose cluster changed
+    moved = {s for s in old.keys() | dups.keys() if old.get(s) != dups.get(s)}
+    members: dict[str, list[str]] = {}
+    for s, c in dups.items():
+        members.setdefault(c, []).append(s)
+    touched = moved | {old[s] for s in moved if s in old} | {dups[s] for s in moved if s in dups}
+    for stem in sorted(touched):
+        path = META_DIR / f"{stem}.json"
+        if not path.exists():
+            continue
+        meta = json.loads(path.read_text())
+        meta.pop("dup_of", None)
+        meta.pop("duplicates", None)
+        if stem in dups:
+            meta["dup_of"] = dups[stem]
+        if stem in members:
+            meta["duplicates"] = sorted(members[stem])
+        path.write_text(json.dumps(meta, indent=2))
+    for stem, entry in manifest.docs.items():
+        if skip and stem in dups:
+            # ingest drops its rows; should it stop being a duplicate, fresh
+            # rows are appended again (from the embedding cache)
+            entry["dup_of"] = dups[stem]
+            entry.pop("embedded", None)
+        else:
+            entry.pop("dup_of", None)
+    manifest.save()
+    if todo or gone or moved:
+        log_json("neardup_updated", docs=len(todo), dropped=len(gone), duplicates=len(dups),
+                 clusters=len(members), reassigned=len(moved))
+    return len(dups)
+
+
+def update_bm25(manifest: ChunkManifest, changed: list[str], batch: int = 256) -> None:
+    """Bring the BM25 index in line with the manifest: changed, missing, removed and duplicate docs."""
+    bm25 = BM25Index(CHUNK_DIR / "bm25.sqlite")
+    have = bm25.docs()
+    live = {s for s, e in manifest.docs.items() if "dup_of" not in e}
+    todo = sorted((set(changed) & live) | (live - have))
+    gone = have - live
+    bm25.update({}, drop=gone)
+    for i in range(0, len(todo), batch):
+        bm25.update({s: manifest.load(s)["chunks"] for s in todo[i : i + batch]})
+    if todo or gone:
+        log_json("bm25_updated", docs=len(todo), dropped=len(gone), chunks=bm25.n)
+    bm25.close()
+
+
+def open_store(manifest: ChunkManifest) -> tuple[StoreWriter | None, EmbeddingCache]:
+    """
+    Writer for the segment store (migrating a pre-store vecs.fp16 once) and
+    the embedding cache. An existing store's header fixes the width; a new
+    store gets no writer yet – embed_docs opens it at the width the API returns.
+    """
+    store = EmbeddingStore(STORE_DIR)
+    if len(store) and EMB_DIMS and store.dim != EMB_DIMS:
+        raise ValueError(f"{STORE_DIR} holds {store.dim}-dim rows but emb_dims is {EMB_DIMS}; move it (and "
+                         f"faiss.index) aside to re-embed at the new width, or unset emb_dims")
+    writer = StoreWriter(STORE_DIR, EMB_MODEL, store.dim) if store.dim else None
+    legacy_vecs, legacy_jsonl = EMB_DIR / "vecs.fp16", EMB_DIR / "chunks.jsonl"
+    if not len(store) and legacy_vecs.exists() and legacy_jsonl.exists():
+        dim = writer.dim if writer else legacy_dim(legacy_vecs)
+        if dim:
+            writer = writer or StoreWriter(STORE_DIR, EMB_MODEL, dim)
+            log_json("store_migrated", rows=import_legacy(writer, legacy_jsonl, legacy_vecs))
+        else:
+            log_json("store_migration_skipped", path=str(legacy_vecs), reason="cannot tell the vector width")
+    cache = EmbeddingCache(EMB_DIR / "emb_cache.sqlite", EMB_KEY)
+    store = EmbeddingStore(STORE_DIR)
+    if len(store) and not len(cache):
+        marked = seed_cache(cache, manifest, store)
+        manifest.save()
+        log_json("emb_cache_seeded", rows=len(store), docs=marked)
+    return writer, cache
+
+
+async def embed_docs(manifest: ChunkManifest, todo: list[str], cache: EmbeddingCache,
+                     writer: StoreWriter | None, batch_tokens: int, batch_items: int = MAX_BATCH_ITEMS,
+                     sched: EmbeddingScheduler | None = None, inflight: int = 4,
+                     ) -> tuple[int, int, EmbeddingScheduler | None, StoreWriter | None]:
+    """
+    Write store rows for `todo` docs, embedding only chunk texts the cache has
+    never seen. Each doc is marked embedded once its segment commits. The
+    scheduler is created on the first cache miss (pass it back in to keep its
+    rate-limit state); without a `writer` (new store) one is opened at the
+    width of the first vectors. Returns (rows written, chunks embedded,
+    scheduler, writer).
+    """
+    dim = writer.dim if writer else None
+    misses: dict[bytes, tuple[str, int]] = {}
+    n_chunks = 0
+    for stem in todo:
+        rec = manifest.load(stem)
+        keys = [chunk_key(c) for c in rec["chunks"]]
+        n_chunks += len(keys)
+        hits = cache.get_many(keys)
+        for key, chunk, ntok in zip(keys, rec["chunks"], rec["tokens"]):
+            if key not in hits:
+                misses.setdefault(key, (chunk, ntok))
+
+    # embed unseen chunk texts straight into the cache
+    if misses:
+        keys = list(misses)
+        texts = [misses[k][0] for k in keys]
+        tokens = [misses[k][1] for k in keys]
+        spans = pack_batches(tokens, batch_tokens, batch_items)
+        batches = [(texts[a:b], sum(tokens[a:b])) for a, b in spans]
+
+        def put(i: int, vecs: list[list[float]]) -> None:
+            nonlocal dim
+            arr = np.asarray(vecs, dtype="float16")
+            dim = dim or arr.shape[1]
+            if arr.shape[1] != dim:
+                raise ValueError(f"{EMB_MODEL} returned dim {arr.shape[1]}, expected {dim}")
+            a, b = spans[i]
+            cache.put_many(zip(keys[a:b], arr))
+
+        if sched is None:
+            sched = EmbeddingScheduler(openai.AsyncOpenAI(max_retries=0), EMB_MODEL, inflight=inflight,
+                                       dimensions=EMB_DIMS)
+        await sched.run(batches, put)
+
+    if writer is None:                        # new store: width of the API's (or the cache's) vectors
+        dim = dim or next((len(v) for stem in todo for v in
+                           cache.get_many([chunk_key(c) for c in manifest.load(stem)["chunks"][:1]]).values()), None)
+        if dim:
+            writer = StoreWriter(STORE_DIR, EMB_MODEL, dim)
+
+    # rows + metadata go in together; a doc is marked once its segment commits
+    pending: list[str] = []
+
+    def commit() -> None:
+        if writer is not None:
+            writer.commit()
+        for stem in pending:
+            manifest.docs[stem].setdefault("embedded", {})[EMB_KEY] = manifest.docs[stem]["sha1"]
+        manifest.save()
+        pending.clear()
+
+    for stem in todo:
+        rec = manifest.load(stem)
+        keys = [chunk_key(c) for c in rec["chunks"]]
+        pending.append(stem)
+        if writer is None:                    # no chunk anywhere in `todo`: nothing to write
+            continue
+        vecs = cache.get_many(keys)
+        writer.append(np.stack([vecs[k] for k in keys]) if keys else np.empty((0, dim)),
+                      [{"doc_sha1": stem, "chunk_id": idx, "chunk_sha1": key.hex(), "text": chunk}
+                       for idx, (key, chunk) in enumerate(zip(keys, rec["chunks"]))])
+        if writer.pending >= COMMIT_ROWS:
+            commit()
+    commit()
+    return n_chunks, len(misses), sched, writer
 
 
 def main() -> None:
     ap = argparse.ArgumentParser()
-    ap.add_argument("-b", "--batch", type=int, default=96)
+    ap.add_argument("-b", "--batch", type=int, default=MAX_BATCH_ITEMS,
+                    help="max chunks per request")
+    ap.add_argument("--batch-tokens", type=int, default=cfg.get("emb_batch_tokens", 64_000),
+                    help="token budget per request")
+    ap.add_argument("--inflight", type=int, default=cfg.get("emb_inflight", 4),
+                    help="concurrent embedding requests")
+    ap.add_argument("-j", "--procs", type=int, default=None,
+                    help="chunking processes (default: all cores)")
+    ap.add_argument("--keep-duplicates", action="store_true",
+                    default=not (cfg.get("neardup") or {}).get("skip", True),
+                    help="embed near-duplicate pages too (they are still clustered in meta/)")
+    ap.add_argument("--metrics", nargs="?", const="", default=cfg.get("metrics_out"), metavar="PATH",
+                    help="log per-stage timings / RSS; also write a .prom or .json report to PATH")
     args = ap.parse_args()
+    metrics.configure(args.metrics)
 
-    # existing vector cache
-    existing = {}
-    jsonl_path = EMB_DIR / "chunks.jsonl"
-    if jsonl_path.exists():
-        for line in jsonl_path.read_text().splitlines():
-            j = json.loads(line)
-            existing[(j["doc_sha1"], j["chunk_id"])] = True
-
-    metas, texts = [], []
-    for md_path in MD_DIR.glob("*.md"):
-        raw = md_path.read_text()
-        sha1 = md_path.stem
-        chunks = dynamic_markdown_split(raw)
-        for idx, chunk in enumerate(chunks):
-            key = (sha1, idx)
-            if key in existing:
-                continue
-            metas.append({"doc_sha1": sha1, "chunk_id": idx, "text": chunk})
-            texts.append(chunk)
-
-    if not texts:
+    # chunk only what changed since the last run
+    manifest = ChunkManifest(CHUNK_DIR)
+    with metrics.stage("chunk") as st:
+        paths = sorted(MD_DIR.glob("*.md"))
+        manifest.forget_missing(p.stem for p in paths)
+        stale = [p for p in paths if not manifest.is_fresh(p)]
+        changed = manifest.update(stale, args.procs)
+        manifest.save()
+        st["docs"], st["rechunked"] = len(paths), len(changed)
+    log_json("chunk_complete", docs=len(paths), rechecked=len(stale), rechunked=len(changed))
+    with metrics.stage("neardup"):
+        update_neardup(manifest, changed, skip=not args.keep_duplicates)
+    with metrics.stage("bm25"):
+        update_bm25(manifest, changed)
+
+    writer, cache = open_store(manifest)
+    # documents whose current chunks have no rows yet; duplicates are never embedded
+    todo = [s for s, e in sorted(manifest.docs.items())
+            if e.get("embedded", {}).get(EMB_KEY) != e["sha1"] and "dup_of" not in e]
+    if not todo:
+        cache.close()
         print("No new chunks to embed.")
+        metrics.finish()
         return
 
-    # allocate / extend memmap
-    dim = 3072 if EMB_MODEL.endswith("large") else 1536
-    mmap_path = EMB_DIR / "vecs.fp16"
-    offset = 0
-    if mmap_path.exists():
-        offset = (mmap_path.stat().st_size // 2) // dim
-    fp = np.memmap(
-        mmap_path,
-        dtype="float16",
-        mode="r+" if mmap_path.exists() else "w+",
-        shape=(offset + len(texts), dim),
-    )
-
-    # embed in batches
-    with open(jsonl_path, "a") as jf:
-        for i in range(0, len(texts), args.batch):
-            batch = texts[i : i + args.batch]
-            vecs = embed_texts(batch)
-            start = offset + i
-            fp[start : start + len(batch)] = np.array(vecs, dtype="float16")
-            for meta in metas[i : i + args.batch]:
-                jf.write(json.dumps(meta) + "\n")
-
-    log_json("embed_complete", new_chunks=len(texts), model=EMB_MODEL)
-    print(f"Embedded {len(texts):,} new chunks → {mmap_path}")
+    with metrics.stage("embed") as st:
+        n_chunks, n_new, sched, writer = asyncio.run(embed_docs(manifest, todo, cache, writer, args.batch_tokens,
+                                                        args.batch, inflight=args.inflight))
+        st["docs"], st["new_chunks"] = len(todo), n_new
+    cache.close()
+
+    log_json("embed_complete", docs=len(todo), chunks=n_chunks, new_chunks=n_new,
+             model=EMB_MODEL, retries=sched.retries if sched else 0)
+    print(f"Embedded {n_new:,} new chunks, wrote {n_chunks:,} rows → {STORE_DIR}")
+    metrics.finish()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,25 +1,85 @@
-
 #!/usr/bin/env python3
+"""
+Keep the URLs of a list whose pages are in one language – without
+downloading anything. The scraper caches each page's language in
+data/meta/{slug}.json (see procore_scraper.lang); pages scraped before that
+are classified from their stored raw HTML (data/raw_html/ or the raw
+archive, see scrape_procore.load_raw) in a process pool and cached back.
+
+--bulk classifies every stored page (pages with no cached language, or
+every page with --force) and exits.
+"""
 from __future__ import annotations
-import argparse, pathlib, concurrent.futures, requests
-from langdetect import detect, LangDetectException
-HEADERS={"User-Agent":"Mozilla/5.0"}
-def is_en(url:str)->bool:
-    try:
-        text = requests.get(url, headers=HEADERS, timeout=15).text[:4000]
-        return detect(text)=="en"
-    except (requests.RequestException,LangDetectException):
-        return False
+import argparse, json, pathlib
+from concurrent.futures import ProcessPoolExecutor
+from procore_scraper.extract import page_lang
+from procore_scraper.utils import canonicalize, slugify, log_json
+from scrape_procore import load_raw, raw_slugs
+
+META_DIR = pathlib.Path("data/meta")
+
+
+def read_meta(slug: str) -> dict:
+    p = META_DIR/f"{slug}.json"
+    return json.loads(p.read_text()) if p.exists() else {}
+
+
+def classify_slug(slug: str) -> tuple[str, str | None, str]:
+    """Worker: slug → (slug, language, source) from its raw HTML."""
+    html = load_raw(slug) or ""
+    return (slug, *page_lang(html, read_meta(slug).get("url")))
+
+
+def classify_all(slugs: list[str], procs: int | None = None) -> dict[str, str | None]:
+    """Classify `slugs` in a process pool and cache the result in meta/."""
+    out: dict[str, str | None] = {}
+    if not slugs:
+        return out
+    with ProcessPoolExecutor(procs) as ex:
+        for slug, lang, source in ex.map(classify_slug, slugs, chunksize=16):
+            meta = read_meta(slug)
+            meta.update(lang=lang, lang_source=source)
+            (META_DIR/f"{slug}.json").write_text(json.dumps(meta, indent=2))
+            out[slug] = lang
+    return out
+
+
 def main():
-    ap=argparse.ArgumentParser()
-    ap.add_argument("infile", type=pathlib.Path)
-    ap.add_argument("-o","--out", default="url_list_english.txt")
-    ap.add_argument("-j","--jobs",type=int, default=8)
-    args=ap.parse_args()
-    urls=[u.strip() for u in args.infile.read_text().splitlines() if u.strip()]
-    with concurrent.futures.ThreadPoolExecutor(max_workers=args.jobs) as ex:
-        english=[u for u,ok in zip(urls, ex.map(is_en, urls)) if ok]
-    pathlib.Path(args.out).write_text("\n".join(sorted(english)))
-    print(f"Kept {len(english)}/{len(urls)} English URLs")
-if __name__=="__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("infile", type=pathlib.Path, nargs="?")
+    ap.add_argument("-o", "--out", default="url_list_english.txt")
+    ap.add_argument("--lang", default="en", help="language to keep")
+    ap.add_argument("-j", "--procs", type=int, default=None, help="classifier processes (default: all cores)")
+    ap.add_argument("--keep-unknown", action="store_true", help="keep URLs that were never scraped")
+    ap.add_argument("--bulk", action="store_true", help="classify every stored page into meta/")
+    ap.add_argument("--force", action="store_true", help="with --bulk: reclassify cached pages too")
+    args = ap.parse_args()
+
+    if args.bulk:
+        slugs = [s for s in sorted(raw_slugs()) if args.force or "lang" not in read_meta(s)]
+        langs = classify_all(slugs, args.procs)
+        counts: dict = {}
+        for lang in langs.values():
+            counts[lang or "unknown"] = counts.get(lang or "unknown", 0) + 1
+        log_json("lang_bulk", pages=len(slugs), **counts)
+        return
+    if args.infile is None:
+        ap.error("infile is required unless --bulk is given")
+
+    urls = [u.strip() for u in args.infile.read_text().splitlines() if u.strip()]
+    slugs = {u: slugify(canonicalize(u)) for u in urls}
+    langs = {s: m.get("lang") for s in set(slugs.values()) if "lang" in (m := read_meta(s))}
+    stored = raw_slugs()
+    missing = sorted(s for s in set(slugs.values()) - langs.keys() if s in stored)
+    langs.update(classify_all(missing, args.procs))
+
+    unknown = {u for u in urls if slugs[u] not in langs}
+    kept = [u for u in urls if (u in unknown and args.keep_unknown)
+            or (u not in unknown and langs[slugs[u]] == args.lang)]
+    pathlib.Path(args.out).write_text("\n".join(sorted(kept)))
+    print(f"Kept {len(kept)}/{len(urls)} {args.lang} URLs "
+          f"({len(missing)} classified from raw HTML, {len(unknown)} never scraped)")
+
+
+if __name__ == "__main__":
     main()
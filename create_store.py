@@ -1,25 +1,27 @@
 # create_store.py
-import openai, os, time
+"""
+Sync data/payload/ (see build_jsonl.py) to an OpenAI vector store: only
+shards that changed since the last sync are uploaded, concurrently, and
+shards that disappeared are removed. The store is created on first run;
+its id is kept in data/payload/uploaded.json.
+"""
+import argparse, asyncio, pathlib, openai
+from procore_scraper.payload import sync_vector_store
 
-openai.api_key = os.getenv("OPENAI_API_KEY")
 
-# 2-A upload the file
-file_id = openai.files.create(
-    file=open("openai_payload.json", "rb"),
-    purpose="assistants"
-).id
-print("file:", file_id)
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--payload", default="data/payload", help="shard directory")
+    ap.add_argument("--store-id", help="sync into this existing vector store")
+    ap.add_argument("--name", default="procore-docs", help="name for a new vector store")
+    ap.add_argument("-c", "--concurrency", type=int, default=8, help="parallel uploads")
+    args = ap.parse_args()
 
-# 2-B create the vector-store
-store = openai.beta.vector_stores.create(
-    name="procore-docs",
-    file_ids=[file_id],
-    metadata={"source": "procore"}
-)
-print("vector_store:", store.id)
+    state = asyncio.run(sync_vector_store(openai.AsyncOpenAI(), pathlib.Path(args.payload),
+                                          args.store_id, args.name, args.concurrency))
+    print("vector_store:", state["vector_store_id"])
+    print(f"✓ ready ({len(state['files'])} shards)")
 
-# 2-C block until indexing finished (optional)
-while store.status != "completed":
-    time.sleep(5)
-    store = openai.beta.vector_stores.retrieve(store.id)
-print("✓ ready") 
\ No newline at end of file
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,55 @@
-
 #!/usr/bin/env python3
+"""
+Collect URLs from each domain's sitemap tree (see procore_scraper.sitemap).
+
+Writes every URL to --out as before, and the URLs that are new or whose
+<lastmod> advanced since the previous run to --changed-out. With --crawl the
+changed URLs (pruned like prune_urls.py) go straight to the async crawler.
+"""
 from __future__ import annotations
-import argparse, pathlib, requests, xml.etree.ElementTree as ET
-
-HEADERS = {"User-Agent": "Mozilla/5.0"}
-
-def fetch(url: str) -> str:
-    r = requests.get(url, headers=HEADERS, timeout=30)
-    r.raise_for_status()
-    return r.text
-
-def parse(url: str, seen: set[str]) -> set[str]:
-    if url in seen: return set()
-    seen.add(url)
-    root = ET.fromstring(fetch(url))
-    ns = {"sm":"http://www.sitemaps.org/schemas/sitemap/0.9"}
-    out = set()
-    for loc in root.findall("sm:sitemap/sm:loc",ns):
-        out |= parse(loc.text.strip(), seen)
-    for loc in root.findall("sm:url/sm:loc",ns):
-        out.add(loc.text.strip())
-    return out
+import argparse, asyncio, pathlib, yaml
+from procore_scraper.sitemap import SitemapState, changed, discover
+
+CFG_PATH = pathlib.Path("config/settings.yaml")
+cfg = yaml.safe_load(CFG_PATH.read_text()) if CFG_PATH.exists() else {}
+
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--domains", nargs="+", required=True)
     ap.add_argument("--out", default="url_list_site.txt")
+    ap.add_argument("--changed-out", default="url_list_changed.txt",
+                    help="URLs that are new or whose lastmod advanced")
+    ap.add_argument("--state", default="data/sitemap_state.json", help="lastmod per URL / sitemap")
+    ap.add_argument("-j", "--concurrency", type=int, default=cfg.get("sitemap_concurrency", 8))
+    ap.add_argument("--full", action="store_true", help="re-read sitemaps whose lastmod has not moved")
+    ap.add_argument("--crawl", action="store_true", help="crawl the changed URLs right away")
     args = ap.parse_args()
-    urls = set()
-    for dom in args.domains:
-        try:
-            urls |= parse(f"https://{dom}/sitemap.xml", set())
-        except Exception as e:
-            print(f"[WARN] {dom}: {e}")
+
+    pathlib.Path(args.state).parent.mkdir(parents=True, exist_ok=True)
+    state = SitemapState(pathlib.Path(args.state))
+    roots = [f"https://{dom}/sitemap.xml" for dom in args.domains]
+    urls, leaves = asyncio.run(discover(roots, state, concurrency=args.concurrency, full=args.full))
+    fresh = changed(state.urls, urls)
+    removed = len(state.urls.keys() - urls.keys())
+
     pathlib.Path(args.out).write_text("\n".join(sorted(urls)))
+    pathlib.Path(args.changed_out).write_text("\n".join(fresh))
     print(f"Wrote {len(urls):,} URLs → {args.out}")
+    print(f"Wrote {len(fresh):,} new/updated URLs → {args.changed_out} ({removed:,} gone)")
+
+    if args.crawl and fresh:
+        from prune_urls import keep
+        from scrape_procore import todo, run_async
+        from procore_scraper.utils import log_json
+        pages = todo([u for u in fresh if keep(u)], refresh=True)
+        stats = asyncio.run(run_async(pages, cfg.get("crawl_concurrency", 32), cfg.get("crawl_host_limits"),
+                                      cfg.get("extract_procs")))
+        log_json("scrape_complete", **stats)
+    # only after a crawl went through, so an aborted one is retried next time
+    state.urls, state.sitemaps = urls, leaves
+    state.save()
+
+
 if __name__ == "__main__":
     main()
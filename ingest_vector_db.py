@@ -7,14 +7,17 @@ Stream the embeddings produced by `chunk_and_embed.py` into either:
 • **FAISS**  – fast, in-RAM flat index (default)  
 • **Qdrant** – HNSW vector DB with filtering & persistence
 
-The script is idempotent: you can run it after every embed pass; it appends
-new vectors and keeps existing ones.
+The script is idempotent: you can run it after every embed pass. FAISS ingest
+is incremental – ``faiss.index.state.json`` records the store rows already
+indexed, so only new rows are added, rows of changed or deleted documents are
+removed by id (``IndexIDMap2``), and an unchanged corpus leaves the index
+untouched. Index, metadata and state are each replaced atomically.
 
 ---------------------------------------------------------------------------
 CLI examples
 ---------------------------------------------------------------------------
 
-# local FAISS (faiss.index + faiss.index.meta.pkl)
+# local FAISS (faiss.index + faiss.index.chunks metadata + .state.json)
 python ingest_vector_db.py --db faiss
 
 # Qdrant running on localhost:6333
@@ -22,16 +25,32 @@ python ingest_vector_db.py --db qdrant --collection procore
 
 # custom HNSW parameters
 python ingest_vector_db.py --db qdrant --hnsw_m 32 --hnsw_ef_construct 512
+
+# approximate FAISS index (flat | fp16 | sq8 | binary | hnsw | ivfpq), then compare them all
+python ingest_vector_db.py --db faiss --index-type ivfpq --nprobe 16
+python ingest_vector_db.py --tune --tune-out tune.json
+
+# int8 codes over the first 512 Matryoshka dims (≈ 1/24 of full fp32);
+# serve_retrieval re-ranks the top candidates against the fp16 store rows
+python ingest_vector_db.py --db faiss --index-type sq8 --dims 512
+# recall vs. bytes/vector for every type at several widths, ± re-scoring
+python ingest_vector_db.py --tune --tune-dims 256 512 1024 0 --tune-rescore 0 4
 """
 
 from __future__ import annotations
 import argparse
 import json
-import pickle
+import math
+import os
 import pathlib
+import time
 import yaml
 import numpy as np
-from typing import List, Tuple
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple
+from procore_scraper import ann, metrics
+from procore_scraper.chunk_meta import ChunkMeta, ChunkMetaWriter
+from procore_scraper.store import EmbeddingStore
+from procore_scraper.utils import log_json
 
 # --------------------------------------------------------------------------- #
 # Config
@@ -39,59 +58,300 @@ from typing import List, Tuple
 CFG = pathlib.Path("config/settings.yaml")
 cfg = yaml.safe_load(CFG.read_text()) if CFG.exists() else {}
 
-DATA_DIR = pathlib.Path("data/embeddings")
-VECS_BIN = DATA_DIR / "vecs.fp16"     # memmap float16 matrix
-META_JL  = DATA_DIR / "chunks.jsonl"  # one JSON per chunk
+DATA_DIR  = pathlib.Path("data/embeddings")
+STORE_DIR = DATA_DIR / "store"         # segment store written by chunk_and_embed
+CHUNK_DIR = pathlib.Path("data/chunks")  # chunk manifest: the set of live documents
+META_DIR  = pathlib.Path("data/meta")    # per-page url / title from scrape_procore
+BLOCK_ROWS = cfg.get("ingest_block_rows", 4096)
+TRAIN_ROWS = cfg.get("faiss_train_rows", 20_000)
 
 
 # --------------------------------------------------------------------------- #
 # Helpers
 # --------------------------------------------------------------------------- #
-def load_embeddings() -> Tuple[np.ndarray, List[dict]]:
-    """Return (vecs[n,d] as float32, meta list)."""
-    vecs = np.memmap(VECS_BIN, dtype="float16", mode="r")
-    meta = [json.loads(l) for l in META_JL.read_text().splitlines()]
-    dim  = vecs.size // len(meta)
-    return np.asarray(vecs, dtype="float32").reshape(len(meta), dim), meta
+def open_store() -> EmbeddingStore:
+    store = EmbeddingStore(STORE_DIR)
+    if not len(store):
+        raise SystemExit(f"no embeddings in {STORE_DIR}; run chunk_and_embed.py first")
+    return store
+
+
+def live_docs() -> Optional[Set[str]]:
+    """Documents still in the corpus, near-duplicates excluded, or None if there is no chunk manifest yet."""
+    path = CHUNK_DIR / "manifest.json"
+    if not path.exists():
+        return None
+    return {s for s, e in json.loads(path.read_text())["docs"].items() if "dup_of" not in e}
+
+
+def new_runs(store: EmbeddingStore, start: int) -> Dict[str, List[int]]:
+    """
+    doc_sha1 → [first_row, n_rows] for rows ≥ start. chunk_and_embed appends a
+    document's rows back to back from chunk 0, so a doc's last run is its
+    current version.
+    """
+    runs: Dict[str, List[int]] = {}
+    for row in range(start, len(store)):
+        j = store.meta(row)
+        doc = j["doc_sha1"]
+        run = runs.get(doc)
+        # chunk 0 starts a new version: a doc re-embedded in back-to-back commits must not merge
+        # with its previous run
+        if run and run[0] + run[1] == row and j["chunk_id"]:
+            run[1] += 1
+        else:
+            runs[doc] = [row, 1]
+    return runs
+
+
+def iter_blocks(store: EmbeddingStore, keep: np.ndarray, start: int,
+                block_rows: int) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    (row ids, float32 vectors) for the rows ≥ start where ``keep[row - start]``
+    is set, at most `block_rows` at a time. Vectors are converted from the
+    store's fp16 into one reused buffer – valid until the next block – and the
+    block's mmap pages are released, so the reader's footprint is set by
+    `block_rows`, not by the corpus size.
+    """
+    buf = np.empty((block_rows, store.dim), dtype="float32")
+    for first, block in store.blocks(block_rows, start):
+        sel = np.flatnonzero(keep[first - start : first - start + len(block)])
+        if not len(sel):
+            continue
+        out = buf[: len(sel)]
+        if len(sel) == len(block):
+            np.copyto(out, block)
+        else:
+            np.copyto(out, block[sel])
+        store.evict(first, len(block))
+        yield sel + first, out
 
 
 # --------------------------------------------------------------------------- #
 # FAISS ingest
 # --------------------------------------------------------------------------- #
-def ingest_faiss(vecs: np.ndarray, meta: List[dict], index_path: str = "faiss.index"):
+def _reserve(faiss, idx, rows: int) -> None:
+    """
+    Pre-size a flat index's code buffer for `rows` more vectors; otherwise
+    every std::vector growth copies the whole index and peaks at ~2× its size.
+    (Shrinking with resize keeps the capacity.)
+    """
+    inner = faiss.downcast_index(idx.index) if isinstance(idx, faiss.IndexIDMap) else idx
+    if rows and isinstance(inner, faiss.IndexFlat):
+        have = inner.ntotal * inner.code_size
+        inner.codes.resize(have + rows * inner.code_size)
+        inner.codes.resize(have)
+
+
+def _replace(path: str, write) -> None:
+    """Call write(tmp_path), fsync, then atomically move tmp over `path`."""
+    tmp = f"{path}.tmp"
+    write(tmp)
+    with open(tmp, "rb") as fh:
+        os.fsync(fh.fileno())
+    os.replace(tmp, path)
+
+
+def _dump(obj):
+    def write(tmp: str) -> None:
+        with open(tmp, "wb") as fh:
+            fh.write(json.dumps(obj).encode())
+    return write
+
+
+def _doc_fields(doc: str) -> dict:
+    p = META_DIR / f"{doc}.json"
+    m = json.loads(p.read_text()) if p.exists() else {}
+    return {"url": m.get("url"), "title": m.get("title")}
+
+
+def write_chunks(path: str, store: EmbeddingStore, docs: Dict[str, List[int]],
+                 prev_docs: Dict[str, List[int]]) -> None:
+    """
+    Write the index's chunk metadata (see chunk_meta). Runs indexed last
+    time are copied from the previous file; only new runs are decoded from
+    the store.
+    """
     try:
-        import faiss                         # standard
-    except ModuleNotFoundError:
-        import importlib
-        faiss = importlib.import_module("faiss_cpu")  # fallback for 1.11 wheels
-    import os
-
-    if pathlib.Path(index_path).exists():
-        idx = faiss.read_index(index_path)
-        idx.add(vecs)
-        old_meta = pickle.loads(open(f"{index_path}.meta.pkl", "rb").read())
-        meta = old_meta + meta
+        old = ChunkMeta(pathlib.Path(path))
+    except (FileNotFoundError, ValueError):
+        old = None
+    w = ChunkMetaWriter(pathlib.Path(path))
+    for doc, (a, n) in sorted(docs.items(), key=lambda kv: kv[1][0]):
+        if old is not None and prev_docs.get(doc) == [a, n] and a in old:
+            for r in range(a, a + n):
+                w.copy(old, r)
+            continue
+        d = w.add_doc(doc, **_doc_fields(doc))
+        for r in range(a, a + n):
+            j = store.meta(r)
+            w.add(r, d, j["chunk_id"], bytes.fromhex(j["chunk_sha1"]), j["text"])
+    w.close()
+
+
+def _chunks_current(path: str) -> bool:
+    try:
+        ChunkMeta(pathlib.Path(path))
+    except (FileNotFoundError, ValueError):
+        return False
+    return True
+
+
+def _same_build(old: dict, new: dict) -> bool:
+    old, new = ann.build_key(old), ann.build_key(new)
+    if new.get("nlist") == 0:                 # auto: whatever was resolved last time
+        old.pop("nlist", None)
+        new.pop("nlist")
+    return old == new
+
+
+def _train(idx, spec: dict, store: EmbeddingStore, keep: np.ndarray, train_rows: int) -> None:
+    rows = np.flatnonzero(keep)
+    pick = np.sort(np.random.default_rng(0).choice(rows, min(train_rows, len(rows)), replace=False))
+    t0 = time.perf_counter()
+    with metrics.timer("faiss_train"):
+        idx.train(ann.prepare(spec, np.stack([store.vector(r) for r in pick.tolist()]).astype("float32")))
+    log_json("faiss_trained", rows=len(pick), seconds=round(time.perf_counter() - t0, 2))
+
+
+def ingest_faiss(store: EmbeddingStore, index_path: str = "faiss.index",
+                 block_rows: int = BLOCK_ROWS, spec: Optional[dict] = None,
+                 rebuild: bool = False, train_rows: int = TRAIN_ROWS):
+    """
+    Bring `index_path` up to date with the store. FAISS ids are global store
+    row ids; the state file maps each document to the row run it is indexed
+    with and records the index spec. A different build spec, an index that
+    disagrees with its state, or a delete on an index type that cannot
+    delete (HNSW) triggers a full rebuild; a changed nprobe / ef_search
+    is just applied. Rows are cut to ``spec["dims"]`` / bit-packed as the
+    index type needs (see ann.prepare); the store keeps them in full.
+    """
+    faiss = ann.import_faiss()
+    spec = dict(spec or ann.make_spec("flat"))
+    state_path, chunks_path = f"{index_path}.state.json", f"{index_path}.chunks"
+    live = live_docs()
+
+    idx, state = None, None
+    if not rebuild and pathlib.Path(index_path).exists() and pathlib.Path(state_path).exists():
+        state = json.loads(pathlib.Path(state_path).read_text())
+        old = state.get("spec", {"type": "flat"})
+        idx = ann.read_index(faiss, index_path, old)
+        if (state.get("dim", store.dim) != store.dim or idx.d != ann.index_dim(old, store.dim)
+                or not _same_build(old, spec)
+                or idx.ntotal != sum(n for _, n in state["docs"].values())):
+            idx = None
+        else:
+            if spec.get("nlist") == 0:
+                spec["nlist"] = old["nlist"]
+            runs = new_runs(store, state["rows"])
+            stale = [d for d in state["docs"] if d in runs or (live is not None and d not in live)]
+            if stale and not ann.supports_remove(spec):
+                idx = None
+    if idx is None:
+        state = {"rows": 0, "docs": {}}
+        runs, stale = new_runs(store, 0), []
+
+    docs: Dict[str, List[int]] = state["docs"]
+    prev_docs = dict(docs)
+    start = state["rows"]
+    keep = np.zeros(len(store) - start, dtype=bool)
+    for doc, (a, n) in runs.items():
+        if live is None or doc in live:
+            keep[a - start : a - start + n] = True
+
+    removed = 0
+    if idx is None:
+        idx = ann.make_index(faiss, spec, store.dim, int(keep.sum()))
+        if spec["type"] == "ivfpq":
+            spec["nlist"] = idx.nlist
+        if ann.needs_training(spec):
+            _train(idx, spec, store, keep, train_rows)
     else:
-        idx = faiss.IndexFlatIP(vecs.shape[1])
-        idx.add(vecs)
+        # drop superseded + deleted runs, and any id about to be re-added
+        drop = [docs.pop(d) for d in stale]
+        ids = np.concatenate([np.arange(a, a + n, dtype="int64") for a, n in drop + list(runs.values())]) \
+            if drop or runs else None
+        if ids is not None and ann.supports_remove(spec):
+            removed = int(idx.remove_ids(ids))
+    ann.set_search_params(faiss, idx, spec)
+
+    for doc, (a, n) in runs.items():
+        if live is None or doc in live:
+            docs[doc] = [a, n]
+    added = 0
+    _reserve(faiss, idx, int(keep.sum()))
+    for ids, vecs in iter_blocks(store, keep, start, block_rows):
+        with metrics.timer("faiss_add"):
+            idx.add_with_ids(ann.prepare(spec, vecs), ids.astype("int64"))
+        added += len(ids)
+
+    if (not added and not removed and state["rows"] == len(store) and state.get("spec") == spec
+            and pathlib.Path(index_path).exists() and _chunks_current(chunks_path)):
+        print(f"[FAISS] up to date: {idx.ntotal:,} vectors in {index_path}")
+        return
+    state["rows"], state["spec"], state["dim"] = len(store), spec, store.dim
+    with metrics.timer("faiss_write"):
+        _replace(index_path, lambda tmp: ann.write_index(faiss, idx, tmp))
+        write_chunks(chunks_path, store, docs, prev_docs)
+    _replace(state_path, _dump(state))
+    pathlib.Path(f"{index_path}.meta.pkl").unlink(missing_ok=True)     # pre-.chunks format
+    log_json("faiss_ingest", added=added, removed=removed, total=int(idx.ntotal), **spec)
+    print(f"[FAISS:{spec['type']}] +{added:,} / -{removed:,} → {idx.ntotal:,} vectors stored in {index_path}")
 
-    faiss.write_index(idx, index_path)
-    pickle.dump(meta, open(f"{index_path}.meta.pkl", "wb"))
-    print(f"[FAISS] {idx.ntotal:,} vectors stored in {index_path}")
+
+def tune_faiss(store: EmbeddingStore, specs: List[dict], k: int, queries: int,
+               max_rows: int, train_rows: int, out: Optional[str] = None,
+               rescore: Sequence[int] = (0,)) -> List[dict]:
+    """
+    Hold out `queries` live rows as queries, index up to `max_rows` others with
+    every spec and print recall@k vs exact full-width search, latency and
+    index size – for lossy specs also with k·`rescore` candidates re-ranked
+    on the full rows.
+    """
+    faiss = ann.import_faiss()
+    live = live_docs()
+    rows: List[int] = []
+    for doc, (a, n) in new_runs(store, 0).items():
+        if live is None or doc in live:
+            rows.extend(range(a, a + n))
+    rng = np.random.default_rng(0)
+    pick = rng.permutation(len(rows))[: max_rows + queries]
+    q_rows = sorted(rows[i] for i in pick[:queries])
+    b_rows = np.array(sorted(rows[i] for i in pick[queries:]), dtype="int64")
+    base = np.empty((len(b_rows), store.dim), dtype="float32")
+    for i, r in enumerate(b_rows.tolist()):
+        base[i] = store.vector(r)
+    qv = np.stack([store.vector(r) for r in q_rows]).astype("float32")
+
+    print(f"{'index':<50} {'rescore':>7} {'recall@' + str(k):>9} {'p50 ms':>8} {'p99 ms':>8} {'B/vec':>8} "
+          f"{'MB':>8} {'build s':>8}")
+
+    def show(r: dict) -> None:
+        label = " ".join(f"{k}={v}" for k, v in r["spec"].items() if k != "type")
+        print(f"{r['spec']['type'] + ' ' + label:<50} {r['rescore'] or '-':>7} {r['recall']:>9.3f} "
+              f"{r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['bytes_per_vector']:>8.0f} {r['bytes'] / 2**20:>8.1f} "
+              f"{r['build_s']:>8.1f}")
+
+    results = ann.tune(faiss, base, b_rows, qv, specs, k=k, train_rows=train_rows, on_result=show,
+                       rescore_factors=rescore)
+    if out:
+        pathlib.Path(out).write_text(json.dumps({"rows": len(b_rows), "queries": len(q_rows), "k": k,
+                                                 "results": results}, indent=1))
+    return results
 
 
 # --------------------------------------------------------------------------- #
 # Qdrant ingest
 # --------------------------------------------------------------------------- #
 def ingest_qdrant(
-    vecs: np.ndarray,
-    meta: List[dict],
+    store: EmbeddingStore,
     host: str,
     port: int,
     collection: str,
     m: int,
     ef_construct: int,
     ef_search: int,
+    block_rows: int = BLOCK_ROWS,
 ):
     from qdrant_client import QdrantClient
 
@@ -99,19 +359,28 @@ def ingest_qdrant(
 
     client.recreate_collection(
         collection,
-        vectors_config=dict(size=vecs.shape[1], distance="Cosine"),
+        vectors_config=dict(size=store.dim, distance="Cosine"),
         hnsw_config=dict(m=m, ef_construct=ef_construct, ef_search=ef_search),
     )
 
-    ids = [f"{m['doc_sha1']}_{m['chunk_id']}" for m in meta]
-    client.upload_collection(
-        collection_name=collection,
-        vectors=vecs,
-        payload=meta,
-        ids=ids,
-        batch_size=256,
-    )
-    print(f"[Qdrant] Upserted {len(meta):,} vectors to {host}:{port}/{collection}")
+    # current version of every live document; point ids are store row ids
+    live = live_docs()
+    keep = np.zeros(len(store), dtype=bool)
+    for doc, (a, n) in new_runs(store, 0).items():
+        if live is None or doc in live:
+            keep[a : a + n] = True
+
+    total = 0
+    for ids, vecs in iter_blocks(store, keep, 0, block_rows):
+        client.upload_collection(
+            collection_name=collection,
+            vectors=vecs,
+            payload=[store.meta(r) for r in ids.tolist()],
+            ids=ids.tolist(),
+            batch_size=256,
+        )
+        total += len(ids)
+    print(f"[Qdrant] Upserted {total:,} vectors to {host}:{port}/{collection}")
 
 
 # --------------------------------------------------------------------------- #
@@ -127,23 +396,67 @@ def main() -> None:
     ap.add_argument("--hnsw_m", type=int, default=cfg.get("hnsw_m", 16))
     ap.add_argument("--hnsw_ef_construct", type=int, default=cfg.get("hnsw_ef_construct", 256))
     ap.add_argument("--hnsw_ef_search", type=int, default=cfg.get("hnsw_ef_search", 64))
+    ap.add_argument("--block-rows", type=int, default=BLOCK_ROWS,
+                    help="rows converted to float32 and sent at a time (bounds peak memory)")
+    ap.add_argument("--index-type", choices=ann.INDEX_TYPES, default=cfg.get("faiss_index_type", "flat"),
+                    help="FAISS index structure (see procore_scraper.ann)")
+    ap.add_argument("--nlist", type=int, default=cfg.get("faiss_nlist"), help="ivfpq lists (0 = auto)")
+    ap.add_argument("--pq-m", type=int, default=cfg.get("faiss_pq_m"), help="ivfpq bytes per vector")
+    ap.add_argument("--nprobe", type=int, default=cfg.get("faiss_nprobe"), help="ivfpq lists probed per query")
+    ap.add_argument("--faiss-hnsw-m", type=int, default=cfg.get("faiss_hnsw_m"), help="hnsw graph degree")
+    ap.add_argument("--ef-search", type=int, default=cfg.get("faiss_ef_search"), help="hnsw search breadth")
+    ap.add_argument("--dims", type=int, default=cfg.get("faiss_dims"),
+                    help="index only the first N (Matryoshka) dimensions; 0 = all")
+    ap.add_argument("--train-rows", type=int, default=TRAIN_ROWS, help="training sample for ivfpq / sq8")
+    ap.add_argument("--rebuild", action="store_true", help="rebuild the FAISS index from scratch")
+    ap.add_argument("--tune", action="store_true",
+                    help="don't ingest; report recall / latency / size for every FAISS index type")
+    ap.add_argument("--tune-k", type=int, default=10)
+    ap.add_argument("--tune-queries", type=int, default=200)
+    ap.add_argument("--tune-rows", type=int, default=50_000, help="max rows indexed while tuning")
+    ap.add_argument("--tune-out", help="also write tuning results as JSON")
+    ap.add_argument("--tune-dims", type=int, nargs="+", default=None,
+                    help="index widths to compare (0 = full; default: --dims)")
+    ap.add_argument("--tune-rescore", type=int, nargs="+", default=[0, 4],
+                    help="re-scoring candidate factors to compare for lossy indexes (0 = off)")
+    ap.add_argument("--metrics", nargs="?", const="", default=cfg.get("metrics_out"), metavar="PATH",
+                    help="log per-stage timings / RSS; also write a .prom or .json report to PATH")
     args = ap.parse_args()
+    metrics.configure(args.metrics)
 
-    vecs, meta = load_embeddings()
-
-    if args.db == "faiss":
-        ingest_faiss(vecs, meta, index_path=args.index_path)
+    store = open_store()
+    params = dict(nlist=args.nlist, pq_m=args.pq_m, nprobe=args.nprobe,
+                  hnsw_m=args.faiss_hnsw_m, ef_search=args.ef_search, dims=args.dims)
+    if args.tune:
+        specs = []
+        for d in args.tune_dims or [args.dims]:
+            for t in ann.INDEX_TYPES:
+                spec = ann.make_spec(t, **dict(params, dims=d))
+                if t == "ivfpq" and d and d % spec["pq_m"]:
+                    spec["pq_m"] = math.gcd(d, spec["pq_m"])     # sub-quantizers must divide the cut
+                specs.append(spec)
+        tune_faiss(store, specs, args.tune_k, args.tune_queries, args.tune_rows,
+                   args.train_rows, args.tune_out, args.tune_rescore)
+    elif args.db == "faiss":
+        with metrics.stage("ingest") as st:
+            ingest_faiss(store, index_path=args.index_path, block_rows=args.block_rows,
+                         spec=ann.make_spec(args.index_type, **params), rebuild=args.rebuild,
+                         train_rows=args.train_rows)
+            st["rows"] = len(store)
     else:
-        ingest_qdrant(
-            vecs,
-            meta,
-            host=args.host,
-            port=args.port,
-            collection=args.collection,
-            m=args.hnsw_m,
-            ef_construct=args.hnsw_ef_construct,
-            ef_search=args.hnsw_ef_search,
-        )
+        with metrics.stage("ingest") as st:
+            ingest_qdrant(
+                store,
+                host=args.host,
+                port=args.port,
+                collection=args.collection,
+                m=args.hnsw_m,
+                ef_construct=args.hnsw_ef_construct,
+                ef_search=args.hnsw_ef_search,
+                block_rows=args.block_rows,
+            )
+            st["rows"] = len(store)
+    metrics.finish()
 
 
 if __name__ == "__main__":
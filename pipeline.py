@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Crawl → extract → chunk → embed → ingest as one streaming run.
+
+    python pipeline.py url_list_full.txt --refresh
+
+Each stage is the same code the single-step scripts run (scrape_procore,
+chunk_and_embed, ingest_vector_db), wired into a DAG by
+procore_scraper.pipeline: URLs stream through prune rules into the crawler,
+fetched pages are extracted in a process pool, and finished pages are
+chunked and embedded in batches while the crawl is still running. The
+FAISS index is updated once at the end.
+
+Per-item state lives in data/pipeline.sqlite. A run that stopped midway
+(crash, Ctrl-C, CI timeout) is resumed by running the same command again –
+finished items are skipped; --new starts over. Without --refresh a page
+already on disk is not fetched again; with it every page is revalidated
+once per run (conditional GET). Failed items are listed at the end and
+retried by the next run.
+
+--until STAGE runs a stage and the stages it depends on, e.g. --until chunk.
+"""
+from __future__ import annotations
+import argparse, asyncio, os, pathlib, sys
+from concurrent.futures import ProcessPoolExecutor
+import scrape_procore as sp
+import chunk_and_embed as ce
+import ingest_vector_db as iv
+from prune_urls import RULES
+from procore_scraper import ann, metrics, pipeline
+from procore_scraper.chunk_cache import ChunkManifest
+from procore_scraper.crawler import HostLimiter, fetch, make_client
+from procore_scraper.extract import extract_page
+from procore_scraper.store import EmbeddingStore
+from procore_scraper.utils import log_json, slugify
+
+cfg = sp.cfg
+STAGES = ("urls", "crawl", "extract", "chunk", "embed", "ingest")
+
+
+def read_urls(paths: list[pathlib.Path]):
+    """Canonical, allowed, deduped URLs, streamed line by line."""
+    def lines():
+        for p in paths:
+            with open(p, encoding="utf-8") as fh:
+                yield from fh
+    for canon in RULES.process(lines()):
+        yield {"url": canon}
+
+
+def page(canon: str, slug: str, meta: dict) -> dict:
+    """Item for a page whose extraction on disk is current."""
+    return {"url": canon, "slug": slug, "raw_sha1": meta.get("raw_sha1"), "sha1": meta.get("sha1")}
+
+
+def build(args: argparse.Namespace, state: pipeline.PipelineState, pool: ProcessPoolExecutor):
+    """The stage list and the HTTP client it crawls with (closed by the caller)."""
+    loop = asyncio.get_running_loop()
+    client = make_client(args.concurrency)
+    limiter = HostLimiter(args.concurrency, cfg.get("crawl_host_limits"))
+    manifest = ChunkManifest(ce.CHUNK_DIR)
+    mlock = asyncio.Lock()           # chunk and embed both rewrite the manifest
+    emb: dict = {"sched": None, "docs": 0, "chunks": 0, "new": 0}
+
+    # -- crawl: conditional GET; unchanged pages pass straight through -------
+    async def crawl(batch: list[dict]) -> list:
+        canon = batch[0]["url"]
+        slug = slugify(canon)
+        prev = sp.read_meta(slug)
+        if prev and not args.refresh and (sp.MD_DIR/f"{slug}.md").exists():
+            return [page(canon, slug, prev)]
+        try:
+            resp = await fetch(client, limiter, canon, headers=sp.cond_headers(prev))
+        except RuntimeError as e:
+            log_json("fetch_error", url=canon, error=str(e))
+            return [e]
+        val = sp.triage(canon, slug, resp, prev, sp.new_stats())
+        if val is None:
+            if resp.status_code not in (200, 304):
+                return [RuntimeError(f"HTTP {resp.status_code}")]
+            return [page(canon, slug, sp.read_meta(slug) or {})]
+        sp.save_raw(slug, canon, resp.text, val["raw_sha1"])
+        return [{"url": canon, "slug": slug, "raw_sha1": val["raw_sha1"], "val": val, "_html": resp.text}]
+
+    # -- extract: process pool; stored raw HTML is the fallback after a resume
+    async def extract(batch: list[dict]) -> list:
+        it = batch[0]
+        slug, prev = it["slug"], sp.read_meta(it["slug"])
+        if "_html" not in it and prev and prev.get("raw_sha1") == it["raw_sha1"] \
+                and (sp.MD_DIR/f"{slug}.md").exists():
+            return [page(it["url"], slug, prev)]
+        html = it.get("_html") or sp.load_raw(slug)
+        if html is None:
+            return [FileNotFoundError(f"no raw HTML for {slug}")]
+        title, md, lang, source = await loop.run_in_executor(pool, extract_page, html, it["url"])
+        sp.write_page(it["url"], slug, title, md, it.get("val") or {"raw_sha1": it["raw_sha1"]}, prev,
+                      dict(lang=lang, lang_source=source))
+        return [page(it["url"], slug, sp.read_meta(slug))]
+
+    # -- chunk (+ near-dup clusters + BM25) ----------------------------------
+    def chunk_sync(batch: list[dict]) -> list:
+        paths = [ce.MD_DIR/f"{it['slug']}.md" for it in batch]
+        stale = [p for p in paths if p.exists() and not manifest.is_fresh(p)]
+        changed = manifest.update(stale, args.procs)
+        manifest.save()
+        ce.update_neardup(manifest, changed, skip=not args.keep_duplicates)
+        ce.update_bm25(manifest, changed)
+        return [{"slug": p.stem, "sha1": manifest.docs[p.stem]["sha1"]} if p.stem in manifest.docs
+                else FileNotFoundError(str(p)) for p in paths]
+
+    async def chunk(batch: list[dict]) -> list:
+        async with mlock:
+            return await asyncio.to_thread(chunk_sync, batch)
+
+    def chunk_finish_sync() -> None:
+        """Markdown deleted since the last run leaves the manifest, clusters and BM25."""
+        before = len(manifest.docs)
+        manifest.forget_missing(p.stem for p in ce.MD_DIR.glob("*.md"))
+        if len(manifest.docs) != before:
+            manifest.save()
+            ce.update_neardup(manifest, [], skip=not args.keep_duplicates)
+            ce.update_bm25(manifest, [])
+
+    async def chunk_finish() -> None:
+        async with mlock:
+            await asyncio.to_thread(chunk_finish_sync)
+
+    # -- embed ---------------------------------------------------------------
+    writer = cache = None
+
+    def unembedded(slugs) -> list[str]:
+        docs = manifest.docs
+        return [s for s in slugs if s in docs and "dup_of" not in docs[s]
+                and docs[s].get("embedded", {}).get(ce.EMB_KEY) != docs[s]["sha1"]]
+
+    async def embed_slugs(todo: list[str]) -> None:
+        """Caller holds mlock."""
+        nonlocal writer, cache
+        if not todo:
+            return
+        if cache is None:
+            writer, cache = ce.open_store(manifest)
+        n, new, emb["sched"], writer = await ce.embed_docs(manifest, todo, cache, writer, args.batch_tokens,
+                                                   sched=emb["sched"], inflight=args.inflight)
+        emb["docs"] += len(todo)
+        emb["chunks"] += n
+        emb["new"] += new
+
+    async def embed(batch: list[dict]) -> list:
+        async with mlock:
+            await embed_slugs(unembedded(it["slug"] for it in batch))
+            docs = manifest.docs
+        return [{"slug": it["slug"], "dup_of": docs[it["slug"]]["dup_of"]} if "dup_of" in docs[it["slug"]]
+                else {"slug": it["slug"]} for it in batch]
+
+    async def embed_finish() -> None:
+        # a page whose canonical changed or went away is no longer a duplicate, but its own sha1 (and so
+        # its chunk / embed fingerprints) did not move: sweep the manifest like chunk_and_embed.py does
+        async with mlock:
+            await embed_slugs(unembedded(list(manifest.docs)))
+        if cache is not None:
+            cache.close()
+        if emb["docs"]:
+            log_json("embed_complete", docs=emb["docs"], chunks=emb["chunks"], new_chunks=emb["new"],
+                     model=ce.EMB_MODEL, retries=emb["sched"].retries if emb["sched"] else 0)
+
+    # -- ingest: once, after everything upstream -----------------------------
+    def ingest_sync() -> dict:
+        store = EmbeddingStore(iv.STORE_DIR)
+        if not len(store):
+            return {"rows": 0}
+        spec = ann.make_spec(cfg.get("faiss_index_type", "flat"), nlist=cfg.get("faiss_nlist"),
+                             pq_m=cfg.get("faiss_pq_m"), nprobe=cfg.get("faiss_nprobe"),
+                             hnsw_m=cfg.get("faiss_hnsw_m"), ef_search=cfg.get("faiss_ef_search"),
+                             dims=cfg.get("faiss_dims"))
+        iv.ingest_faiss(store, index_path=args.index_path, spec=spec)
+        return {"rows": len(store)}
+
+    async def ingest(items: list[dict]) -> dict:
+        return await asyncio.to_thread(ingest_sync)
+
+    crawl_fp = str(state.run) if args.refresh else ""
+    return [
+        pipeline.Stage("urls", source=read_urls(args.url_lists)),
+        pipeline.Stage("crawl", crawl, after=["urls"], key=lambda it: it["url"], fp=lambda it: crawl_fp,
+                       concurrency=args.concurrency),
+        pipeline.Stage("extract", extract, after=["crawl"], key=lambda it: it["slug"],
+                       fp=lambda it: it["raw_sha1"] or "", concurrency=args.procs or os.cpu_count() or 1),
+        pipeline.Stage("chunk", chunk, after=["extract"], key=lambda it: it["slug"],
+                       fp=lambda it: it["sha1"] or "", batch=args.chunk_batch, linger=2.0,
+                       finish=chunk_finish),
+        pipeline.Stage("embed", embed, after=["chunk"], key=lambda it: it["slug"],
+                       fp=lambda it: f"{ce.EMB_KEY}:{it['sha1']}", batch=args.embed_batch, linger=5.0,
+                       finish=embed_finish),
+        pipeline.Stage("ingest", ingest, after=["embed"], barrier=True),
+    ], client
+
+
+async def amain(args: argparse.Namespace) -> int:
+    state = pipeline.PipelineState(args.state)
+    run = state.start(resume=not args.new)
+    log_json("pipeline_start", run=run, resumed=state.resumed, until=args.until)
+    with ProcessPoolExecutor(args.procs) as pool:
+        stages, client = build(args, state, pool)
+        stages = pipeline.upstream(stages, args.until)
+        try:
+            with metrics.stage("pipeline") as st:
+                stats = await pipeline.run(stages, state)
+                st["run"] = run
+        finally:
+            await client.aclose()
+    failed = sum(st["failed"] for st in stats.values())
+    state.finish("complete" if not failed else "partial", stats)
+    for name, st in stats.items():
+        log_json("pipeline_stage", stage=name, **{k: round(v, 1) if isinstance(v, float) else v
+                                                 for k, v in st.items()})
+        for key, error in state.failures(name) if st["failed"] else ():
+            print(f"  {name} failed: {key}: {error}", file=sys.stderr)
+    print(pipeline.report(stats))
+    state.close()
+    sp.close_raw()
+    metrics.finish()
+    return 1 if stats.get("ingest", {}).get("failed") else 0
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("url_lists", type=pathlib.Path, nargs="+")
+    ap.add_argument("--refresh", action="store_true",
+                    help="revalidate pages already on disk (once per run)")
+    ap.add_argument("--new", action="store_true", help="start a new run instead of resuming an unfinished one")
+    ap.add_argument("--until", choices=STAGES, default="ingest", help="last stage to run")
+    ap.add_argument("--state", type=pathlib.Path, default=pathlib.Path("data/pipeline.sqlite"))
+    ap.add_argument("-j", "--concurrency", type=int, default=cfg.get("crawl_concurrency", 32))
+    ap.add_argument("-p", "--procs", type=int, default=cfg.get("extract_procs"),
+                    help="extraction / chunking processes (default: all cores)")
+    ap.add_argument("--chunk-batch", type=int, default=64, help="pages chunked per batch")
+    ap.add_argument("--embed-batch", type=int, default=256, help="pages embedded per batch")
+    ap.add_argument("--batch-tokens", type=int, default=cfg.get("emb_batch_tokens", 64_000))
+    ap.add_argument("--inflight", type=int, default=cfg.get("emb_inflight", 4))
+    ap.add_argument("--keep-duplicates", action="store_true",
+                    default=not (cfg.get("neardup") or {}).get("skip", True))
+    ap.add_argument("--index-path", default="faiss.index")
+    ap.add_argument("--metrics", nargs="?", const="", default=cfg.get("metrics_out"), metavar="PATH",
+                    help="log per-stage timings / RSS; also write a .prom or .json report to PATH")
+    args = ap.parse_args()
+    metrics.configure(args.metrics)
+    sys.exit(asyncio.run(amain(args)))
+
+
+if __name__ == "__main__":
+    main()
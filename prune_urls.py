@@ -1,29 +1,28 @@
-
 #!/usr/bin/env python3
+"""
+Canonicalize, filter and dedupe a URL list in one streaming pass (rules in
+settings.yaml → url_rules; see procore_scraper.urlrules).
+"""
 from __future__ import annotations
-import argparse, pathlib, re, urllib.parse
+import argparse, pathlib, yaml
+from procore_scraper.urlrules import UrlRules
 
-BAD = [
-    re.compile(r"/blog/"),
-    re.compile(r"\.(jpg|jpeg|png|gif|svg|pdf)$"),
-    re.compile(r"login"),
-    re.compile(r"signup"),
-]
+CFG_PATH = pathlib.Path("config/settings.yaml")
+cfg = yaml.safe_load(CFG_PATH.read_text()) if CFG_PATH.exists() else {}
+RULES = UrlRules.from_config(cfg)
 
 def keep(url: str) -> bool:
-    if any(p.search(url) for p in BAD):
-        return False
-    parsed = urllib.parse.urlparse(url)
-    return not parsed.fragment
+    return RULES.allowed(RULES.canonical(url))
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("infile", type=pathlib.Path)
     ap.add_argument("-o","--out", default="url_list_clean.txt")
     args = ap.parse_args()
-    urls = [u.strip() for u in args.infile.read_text().splitlines() if u.strip()]
-    kept = [u for u in urls if keep(u)]
-    pathlib.Path(args.out).write_text("\n".join(sorted(set(kept))))
-    print(f"Pruned {len(urls)-len(kept)} → wrote {len(kept)}")
+    with args.infile.open() as fh:
+        kept = sorted(RULES.process(fh))
+    pathlib.Path(args.out).write_text("\n".join(kept))
+    st = RULES.stats
+    print(f"Pruned {st['excluded']} excluded + {st['duplicate']} duplicates → wrote {len(kept)}")
 if __name__ == "__main__":
     main()
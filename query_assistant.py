@@ -1,41 +1,17 @@
 # query_assistant.py
-import openai, os
-import time
+import asyncio
+from procore_scraper.assistant import AssistantClient
 
-openai.api_key = os.getenv("OPENAI_API_KEY")
 
-# Use the assistant ID from create_assistant.py
-assistant_id = "asst_ueLOB0oOsC8ZQkymnJ3nBkSj"
+async def main():
+    client = AssistantClient()
+    print("Assistant response:")
+    r = await client.ask("What is Procore and what are its main features?",
+                         on_text=lambda t: print(t, end="", flush=True))
+    print(f"\n\nthread: {r['thread_id']}  run: {r['run_id']}  status: {r['status']}")
+    if r["error"]:
+        print("error:", r["error"])
 
-# Create a thread
-thread = openai.beta.threads.create()
-print("thread:", thread.id)
 
-# Add a message to the thread
-message = openai.beta.threads.messages.create(
-    thread_id=thread.id,
-    role="user",
-    content="What is Procore and what are its main features?"
-)
-print("message:", message.id)
-
-# Run the assistant
-run = openai.beta.threads.runs.create(
-    thread_id=thread.id,
-    assistant_id=assistant_id
-)
-print("run:", run.id)
-
-# Wait for completion
-while run.status != "completed":
-    time.sleep(1)
-    run = openai.beta.threads.runs.retrieve(thread_id=thread.id, run_id=run.id)
-    print(f"status: {run.status}")
-
-# Get the response
-messages = openai.beta.threads.messages.list(thread_id=thread.id)
-for msg in messages.data:
-    if msg.role == "assistant":
-        print("\nAssistant response:")
-        print(msg.content[0].text.value)
-        break 
\ No newline at end of file
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Raw HTML archive maintenance and offline re-extraction.
+
+With ``raw_archive.enabled`` in config/settings.yaml the scraper and
+pipeline append fetched HTML to data/raw_archive/ (see
+procore_scraper.archive) instead of writing data/raw_html/{slug}.html.
+
+python raw_archive.py import [--remove]   # move raw_html/ files into the archive
+python raw_archive.py extract [-p 8]      # re-run extraction over every stored page
+python raw_archive.py stats
+python raw_archive.py compact             # drop superseded copies
+python raw_archive.py get SLUG > page.html
+
+``extract`` streams the stored HTML (archive segments in file order, then any
+loose raw_html/ files) through extract_page in a process pool and rewrites
+clean_md/ + meta/ – e.g. after changing the Readability / markdownify
+setup – without fetching anything. Only pages whose Markdown changed get a
+new ``sha1``, so chunk_and_embed re-embeds just those.
+"""
+from __future__ import annotations
+import argparse, json, os, sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import scrape_procore as sp
+from procore_scraper import metrics
+from procore_scraper.extract import extract_page
+from procore_scraper.utils import log_json
+
+VALIDATORS = ("etag", "last_modified", "raw_sha1")
+
+
+def need_archive():
+    arc = sp.raw_archive()
+    if arc is None:
+        sys.exit("raw_archive.enabled is off in config/settings.yaml")
+    return arc
+
+
+def import_files(remove: bool) -> None:
+    arc = need_archive()
+    n = written = 0
+    for p in sorted(sp.RAW_DIR.glob("*.html")):
+        url = (sp.read_meta(p.stem) or {}).get("url", p.stem)
+        written += arc.put(p.stem, url, p.read_text("utf-8", errors="ignore"))
+        n += 1
+        if remove:
+            p.unlink()
+    log_json("archive_import", files=n, written=written, removed=n if remove else 0, **arc.stats())
+
+
+def reextract(procs: int | None) -> None:
+    procs = procs or os.cpu_count() or 1
+    stats = dict.fromkeys(("pages", "changed", "unchanged", "failed"), 0)
+
+    def done(fut, slug, url) -> None:
+        try:
+            title, md, lang, source = fut.result()
+        except Exception as e:
+            log_json("extract_error", url=url, error=str(e))
+            stats["failed"] += 1
+            return
+        prev = sp.read_meta(slug)
+        val = {k: prev[k] for k in VALIDATORS if prev and k in prev}
+        changed = sp.write_page(url, slug, title, md, val, prev, dict(lang=lang, lang_source=source))
+        stats["changed" if changed else "unchanged"] += 1
+
+    with ProcessPoolExecutor(procs) as pool, metrics.stage("reextract") as st:
+        inflight: dict = {}
+        for slug, url, html in sp.iter_raw():
+            stats["pages"] += 1
+            inflight[pool.submit(extract_page, html, url)] = (slug, url)
+            if len(inflight) >= procs * 4:              # bounded: never the whole corpus in RAM
+                ready, _ = wait(inflight, return_when=FIRST_COMPLETED)
+                for fut in ready:
+                    done(fut, *inflight.pop(fut))
+        for fut in list(inflight):
+            done(fut, *inflight.pop(fut))
+        st["pages"] = stats["pages"]
+    log_json("reextract_complete", **stats)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("import", help="move data/raw_html/*.html into the archive")
+    p.add_argument("--remove", action="store_true", help="delete each file once archived")
+    p = sub.add_parser("extract", help="re-extract clean_md/ + meta/ from stored HTML")
+    p.add_argument("-p", "--procs", type=int, default=sp.cfg.get("extract_procs"))
+    p.add_argument("--metrics", nargs="?", const="", default=sp.cfg.get("metrics_out"), metavar="PATH")
+    sub.add_parser("stats")
+    sub.add_parser("compact", help="rewrite live records, dropping superseded copies")
+    p = sub.add_parser("get", help="print one page's archived HTML")
+    p.add_argument("slug")
+    args = ap.parse_args()
+
+    if args.cmd == "import":
+        import_files(args.remove)
+    elif args.cmd == "extract":
+        metrics.configure(args.metrics)
+        reextract(args.procs)
+        metrics.finish()
+    elif args.cmd == "stats":
+        print(json.dumps(need_archive().stats(), indent=2))
+    elif args.cmd == "compact":
+        need_archive().compact()
+    else:
+        html = sp.load_raw(args.slug)
+        if html is None:
+            sys.exit(f"{args.slug}: not stored")
+        sys.stdout.write(html)
+    sp.close_raw()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,66 +1,279 @@
-
 #!/usr/bin/env python3
 from __future__ import annotations
-from bs4 import BeautifulSoup
 from pathlib import Path
-import sys, json, datetime, time, requests
+from concurrent.futures import ProcessPoolExecutor
+import os, json, datetime, time, argparse, asyncio, requests, yaml
+from procore_scraper import metrics
+from procore_scraper.archive import RawArchive
 from procore_scraper.utils import slugify, canonicalize, sha1_text, log_json
-from readability import Document
-import markdownify
+from procore_scraper.extract import extract, extract_page, strip_tags, one_line  # noqa: F401  (re-exported)
 
 DATA_DIR = Path("data")
 RAW_DIR = DATA_DIR/"raw_html"
 MD_DIR = DATA_DIR/"clean_md"
 META_DIR = DATA_DIR/"meta"
+ARCHIVE_DIR = DATA_DIR/"raw_archive"
 for p in (RAW_DIR, MD_DIR, META_DIR): p.mkdir(parents=True, exist_ok=True)
 
+CFG_PATH = Path("config/settings.yaml")
+cfg = yaml.safe_load(CFG_PATH.read_text()) if CFG_PATH.exists() else {}
+
 HEADERS={"User-Agent":"Mozilla/5.0"}
+_archive:tuple[int,RawArchive]|None=None
 
-def fetch(url:str, retry:int=3):
+@metrics.timed("fetch")
+def fetch(url:str, retry:int=3, headers:dict|None=None):
     for i in range(retry):
         try:
-            return requests.get(url, headers=HEADERS, timeout=30)
+            return requests.get(url, headers={**HEADERS, **(headers or {})}, timeout=30)
         except requests.RequestException:
             time.sleep(2**i)
     raise RuntimeError(f"Failed fetch {url}")
 
-def strip_tags(html:str)->str:
-    soup=BeautifulSoup(html,"lxml")
-    for bad in soup(["script","style","noscript","iframe","canvas","svg","nav","header","footer","form","aside"]):
-        bad.decompose()
-    return str(soup)
+def now()->str:
+    return datetime.datetime.utcnow().isoformat()+"Z"
 
-def one_line(md:str,n:int=160)->str:
-    return " ".join(md.split())[:n]
+def read_meta(slug:str)->dict|None:
+    p=META_DIR/f"{slug}.json"
+    return json.loads(p.read_text()) if p.exists() else None
 
-def main():
-    if len(sys.argv)!=2:
-        sys.exit("Usage: python scrape_procore.py url_list_clean.txt")
-    urls=[u.strip() for u in Path(sys.argv[1]).read_text().splitlines() if u.strip()]
-    from tqdm.auto import tqdm
-    for url in tqdm(urls):
+def write_meta(slug:str, meta:dict)->None:
+    (META_DIR/f"{slug}.json").write_text(json.dumps(meta,indent=2))
+
+def validators(headers, html:str)->dict:
+    """HTTP validators + raw-body hash stored in meta/ for the next re-crawl."""
+    return dict(etag=headers.get("etag"), last_modified=headers.get("last-modified"),
+                raw_sha1=sha1_text(html))
+
+def sent_validators(headers)->dict:
+    """ETag / Last-Modified the server sent, e.g. refreshed on a 304 (absent ones left out)."""
+    return {k:v for k,v in (("etag",headers.get("etag")),("last_modified",headers.get("last-modified"))) if v}
+
+def cond_headers(prev:dict|None)->dict:
+    h={}
+    if prev and prev.get("etag"): h["If-None-Match"]=prev["etag"]
+    if prev and prev.get("last_modified"): h["If-Modified-Since"]=prev["last_modified"]
+    return h
+
+def touch(slug:str, prev:dict, val:dict|None=None)->None:
+    """Page revalidated without extraction: refresh validators only."""
+    write_meta(slug, {**prev, **(val or {}), "last_checked":now()})
+
+def write_page(canon:str, slug:str, title:str, md:str, val:dict|None=None, prev:dict|None=None,
+               lang:dict|None=None)->bool:
+    """
+    Write clean_md/ + meta/. The .md file (and `sha1`/`last_changed`) only
+    change when the Markdown itself changed, so downstream stages can key
+    invalidation on `sha1`. `lang` ({lang, lang_source}) is cached in meta/.
+    Returns True if the Markdown changed.
+    """
+    md_path=MD_DIR/f"{slug}.md"
+    sha1=sha1_text(md)
+    changed=prev is None or prev.get("sha1")!=sha1 or not md_path.exists()
+    if changed: md_path.write_text(md,"utf-8")
+    ts=now()
+    meta=dict(
+        url=canon,
+        slug=slug,
+        sha1=sha1,
+        title=title,
+        last_scraped=ts,
+        last_checked=ts,
+        last_changed=ts if changed else prev.get("last_changed",prev.get("last_scraped")),
+        summary=one_line(md),
+        **(val or {}),
+        **(lang or {}),
+        **{k:prev[k] for k in ("dup_of","duplicates") if prev and k in prev}  # owned by chunk_and_embed
+    )
+    write_meta(slug,meta)
+    return changed
+
+def raw_archive()->RawArchive|None:
+    """The raw-HTML archive if `raw_archive.enabled` (opened once per process), else None."""
+    global _archive
+    conf=cfg.get("raw_archive") or {}
+    if not conf.get("enabled"): return None
+    if _archive is None or _archive[0]!=os.getpid():
+        _archive=(os.getpid(),RawArchive(ARCHIVE_DIR,conf.get("codec"),conf.get("level"),
+                                         int(conf.get("segment_mb",256))*2**20))
+    return _archive[1]
+
+def close_raw()->None:
+    global _archive
+    if _archive is not None and _archive[0]==os.getpid(): _archive[1].close()
+    _archive=None
+
+def save_raw(slug:str, canon:str, html:str, raw_sha1:str|None=None)->None:
+    arc=raw_archive()
+    if arc is None: (RAW_DIR/f"{slug}.html").write_text(html,"utf-8",errors="ignore")
+    else: arc.put(slug,canon,html,raw_sha1)
+
+def load_raw(slug:str)->str|None:
+    """Raw HTML for `slug`: the archive first, then raw_html/ (pages saved before it was enabled)."""
+    arc=raw_archive()
+    html=arc.get(slug) if arc is not None else None
+    p=RAW_DIR/f"{slug}.html"
+    if html is None and p.exists(): html=p.read_text("utf-8",errors="ignore")
+    return html
+
+def raw_slugs()->set[str]:
+    arc=raw_archive()
+    return {p.stem for p in RAW_DIR.glob("*.html")}|(set(arc.slugs()) if arc is not None else set())
+
+def iter_raw(slugs=None):
+    """
+    (slug, url, html) for every stored page, or just `slugs`: archive records
+    in file order (one sequential read per segment), then raw_html/ files
+    the archive does not have. The url comes from meta/ for loose files.
+    """
+    arc=raw_archive()
+    want=None if slugs is None else set(slugs)
+    done=set()
+    if arc is not None:
+        for slug,url,html in arc.stream(want):
+            done.add(slug)
+            yield slug,url,html
+    for p in sorted(RAW_DIR.glob("*.html")):
+        if p.stem in done or (want is not None and p.stem not in want): continue
+        yield p.stem,(read_meta(p.stem) or {}).get("url",p.stem),p.read_text("utf-8",errors="ignore")
+
+def save_page(canon:str, slug:str, html:str, val:dict|None=None, prev:dict|None=None)->bool:
+    """raw HTML + clean_md/ + meta/ for one fetched page."""
+    save_raw(slug,canon,html,(val or {}).get("raw_sha1"))
+    title,md,lang,source=extract_page(html,canon)
+    return write_page(canon,slug,title,md,val,prev,dict(lang=lang,lang_source=source))
+
+def todo(urls:list[str], refresh:bool=False)->list[tuple[str,str,dict|None]]:
+    """
+    (canonical url, slug, previous meta) to fetch. Without `refresh` pages
+    already on disk are skipped; with it they are revalidated.
+    """
+    out=[]
+    seen=set()
+    for url in urls:
         canon=canonicalize(url)
+        if canon in seen: continue
+        seen.add(canon)
         slug=slugify(canon)
-        md_path=MD_DIR/f"{slug}.md"
-        if md_path.exists(): continue
-        resp=fetch(canon)
-        if resp.status_code!=200:
-            log_json("fetch_error",url=canon,code=resp.status_code)
-            continue
-        html=resp.text
-        (RAW_DIR/f"{slug}.html").write_text(html,"utf-8",errors="ignore")
-        main_html=Document(strip_tags(html)).summary(html_partial=True)
-        if len(main_html)<180: main_html=html
-        md=markdownify.markdownify(main_html, heading_style="ATX")
-        md_path.write_text(md,"utf-8")
-        meta=dict(
-            url=canon,
-            slug=slug,
-            sha1=sha1_text(md),
-            title=BeautifulSoup(html,"lxml").title.string if BeautifulSoup(html,"lxml").title else "",
-            last_scraped=datetime.datetime.utcnow().isoformat()+"Z",
-            summary=one_line(md)
-        )
-        (META_DIR/f"{slug}.json").write_text(json.dumps(meta,indent=2))
+        if (MD_DIR/f"{slug}.md").exists():
+            if not refresh: continue
+            out.append((canon,slug,read_meta(slug)))
+        else:
+            out.append((canon,slug,None))
+    return out
+
+def triage(canon:str, slug:str, resp, prev:dict|None, stats:dict)->dict|None:
+    """
+    Decide what a response needs. Returns the validators when the page must
+    be (re-)extracted, None when it was handled here (error, 304, same bytes).
+    """
+    if resp.status_code==304 and prev:
+        touch(slug,prev,sent_validators(resp.headers)); stats["not_modified"]+=1   # raw_sha1 kept
+        return None
+    if resp.status_code!=200:
+        log_json("fetch_error",url=canon,code=resp.status_code); stats["failed"]+=1
+        return None
+    val=validators(resp.headers,resp.text)
+    if prev and prev.get("raw_sha1")==val["raw_sha1"]:
+        touch(slug,prev,val); stats["unchanged_raw"]+=1
+        return None
+    return val
+
+def tally(stats:dict, changed:bool, prev:dict|None)->None:
+    stats["new" if prev is None else "changed" if changed else "unchanged_md"]+=1
+
+def new_stats()->dict:
+    return dict.fromkeys(("new","changed","unchanged_md","unchanged_raw","not_modified","failed"),0)
+
+def run_sync(pages:list[tuple[str,str,dict|None]])->dict:
+    from tqdm.auto import tqdm
+    stats=new_stats()
+    for canon,slug,prev in tqdm(pages):
+        resp=fetch(canon,headers=cond_headers(prev))
+        val=triage(canon,slug,resp,prev,stats)
+        if val is None: continue
+        tally(stats,save_page(canon,slug,resp.text,val,prev),prev)
+    return stats
+
+async def run_async(pages:list[tuple[str,str,dict|None]], concurrency:int, host_limits:dict|None=None,
+                    procs:int|None=None)->dict:
+    """
+    Two-stage pipeline: the crawl stage pushes downloaded HTML into a bounded
+    queue; `procs` extractor tasks drain it into a process pool. A full queue
+    back-pressures the crawler instead of buffering the corpus in RAM.
+    """
+    from procore_scraper.crawler import crawl
+    from tqdm.auto import tqdm
+    procs=procs or os.cpu_count() or 1
+    slugs={canon:(slug,prev) for canon,slug,prev in pages}
+    stats=new_stats()
+    bar=tqdm(total=len(pages))
+    queue:asyncio.Queue=asyncio.Queue(maxsize=procs*2)
+    loop=asyncio.get_running_loop()
+
+    async def handle(canon,resp):
+        slug,prev=slugs[canon]
+        val=triage(canon,slug,resp,prev,stats)
+        if val is None:
+            bar.update()
+            return
+        await queue.put((canon,resp.text,val))
+
+    def on_error(canon,e):
+        log_json("fetch_error",url=canon,error=str(e))
+        stats["failed"]+=1
+        bar.update()
+
+    async def extractor(pool):
+        while (item:=await queue.get()) is not None:
+            canon,html,val=item
+            slug,prev=slugs[canon]
+            try:
+                save_raw(slug,canon,html,val["raw_sha1"])
+                title,md,lang,source=await loop.run_in_executor(pool,extract_page,html,canon)
+                tally(stats,write_page(canon,slug,title,md,val,prev,dict(lang=lang,lang_source=source)),prev)
+            except Exception as e:
+                log_json("extract_error",url=canon,error=str(e))
+                stats["failed"]+=1
+            finally:
+                bar.update()
+
+    with ProcessPoolExecutor(procs) as pool:
+        workers=[asyncio.create_task(extractor(pool)) for _ in range(procs)]
+        try:
+            await crawl(slugs, handle, concurrency=concurrency, host_limits=host_limits,
+                        headers_for=lambda canon: cond_headers(slugs[canon][1]), on_error=on_error)
+            for _ in workers: await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for w in workers: w.cancel()
+            bar.close()
+    return stats
+
+def main():
+    ap=argparse.ArgumentParser(usage="python scrape_procore.py url_list_clean.txt [--async] [--refresh]")
+    ap.add_argument("url_list", type=Path)
+    ap.add_argument("--async", dest="use_async", action="store_true",
+                    help="concurrent crawl (global + per-host limits)")
+    ap.add_argument("-j","--concurrency", type=int, default=cfg.get("crawl_concurrency",32))
+    ap.add_argument("--refresh", action="store_true",
+                    help="revalidate pages already on disk (conditional GET + content hash)")
+    ap.add_argument("-p","--procs", type=int, default=cfg.get("extract_procs"),
+                    help="extraction processes for --async (default: all cores)")
+    ap.add_argument("--metrics", nargs="?", const="", default=cfg.get("metrics_out"), metavar="PATH",
+                    help="log per-stage timings / RSS; also write a .prom or .json report to PATH")
+    args=ap.parse_args()
+    metrics.configure(args.metrics)
+    urls=[u.strip() for u in args.url_list.read_text().splitlines() if u.strip()]
+    pages=todo(urls, refresh=args.refresh)
+    with metrics.stage("crawl") as st:
+        if args.use_async:
+            stats=asyncio.run(run_async(pages, args.concurrency, cfg.get("crawl_host_limits"), args.procs))
+        else:
+            stats=run_sync(pages)
+        st["pages"]=len(pages)
+    close_raw()
+    log_json("scrape_complete",**stats)
+    metrics.finish()
 if __name__=="__main__":
     main()
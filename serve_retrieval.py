@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Serve top-k retrieval over the local FAISS index built by ingest_vector_db.py
+(see procore_scraper.retrieval).
+
+# HTTP on localhost:8765
+python serve_retrieval.py
+curl 'localhost:8765/search?q=how+do+I+create+an+RFI&k=5'
+
+# one-off query, no server
+python serve_retrieval.py --query "What is a submittal?"
+
+# offline (deterministic stub embeddings; scores are meaningless)
+python serve_retrieval.py --stub
+"""
+from __future__ import annotations
+import os, json, argparse, asyncio, pathlib, yaml
+from procore_scraper.retrieval import OpenAIEmbedder, Retriever, StubEmbedder, serve
+from procore_scraper.utils import emb_dims
+
+CFG = pathlib.Path("config/settings.yaml")
+cfg = yaml.safe_load(CFG.read_text()) if CFG.exists() else {}
+EMB_MODEL = os.getenv("EMB_MODEL", cfg.get("emb_model", "text-embedding-3-large"))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--index_path", default="faiss.index")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=cfg.get("retrieval_port", 8765))
+    ap.add_argument("-k", type=int, default=5, help="default results per query")
+    ap.add_argument("--max-batch", type=int, default=cfg.get("retrieval_max_batch", 32),
+                    help="queries answered per index.search call")
+    ap.add_argument("--max-wait-ms", type=float, default=cfg.get("retrieval_max_wait_ms", 2.0),
+                    help="how long a query may wait for others to batch with")
+    ap.add_argument("--cache", type=int, default=cfg.get("retrieval_cache", 4096),
+                    help="LRU entries of (query, k) → results")
+    ap.add_argument("--bm25", default="data/chunks/bm25.sqlite",
+                    help="BM25 index for hybrid retrieval (written by chunk_and_embed.py)")
+    ap.add_argument("--no-hybrid", action="store_true", help="vector search only")
+    ap.add_argument("--candidates", type=int, default=cfg.get("retrieval_candidates", 50),
+                    help="vector / BM25 candidates fused per hybrid query")
+    ap.add_argument("--store", default="data/embeddings/store",
+                    help="full-precision rows for re-scoring (written by chunk_and_embed.py)")
+    ap.add_argument("--rescore", type=int, default=cfg.get("retrieval_rescore", 4),
+                    help="re-rank rescore × k candidates of a compact index on the stored rows (0 = off)")
+    ap.add_argument("--stub", action="store_true", help="offline stub embedder")
+    ap.add_argument("--query", help="answer one query and exit")
+    args = ap.parse_args()
+
+    bm25 = None if args.no_hybrid or not pathlib.Path(args.bm25).exists() else args.bm25
+    retriever = Retriever(args.index_path, None, max_batch=args.max_batch,
+                          max_wait_ms=args.max_wait_ms, cache_size=args.cache,
+                          bm25_path=bm25, candidates=args.candidates, store_path=args.store,
+                          rescore=args.rescore)
+    retriever.embedder = StubEmbedder(retriever.dim) if args.stub else \
+        OpenAIEmbedder(EMB_MODEL, dimensions=emb_dims(cfg))
+
+    if args.query:
+        async def once() -> list:
+            async with retriever:
+                return await retriever.search(args.query, args.k)
+        for hit in asyncio.run(once()):
+            print(json.dumps({"score": round(hit["score"], 4), "url": hit.get("url") or hit.get("doc_sha1"),
+                              "chunk_id": hit.get("chunk_id"), "text": hit.get("text", "")[:160]},
+                             ensure_ascii=False))
+        return
+    try:
+        asyncio.run(serve(retriever, args.host, args.port, args.k))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""
+procore_scraper.ann – FAISS index types for the local vector index
+------------------------------------------------------------------
+``spec`` dicts describe an index: ``{"type": "flat" | "fp16" | "sq8" |
+"binary" | "hnsw" | "ivfpq", …parameters}``. Build-time parameters decide the
+structure; ``nprobe`` and ``ef_search`` are query-time knobs that can change
+without a rebuild.
+
+=======  ================================  ======================  ==========
+type     structure                         bytes / vector (3072d)  deletes
+=======  ================================  ======================  ==========
+flat     exhaustive inner product          12 288                  yes
+fp16     exhaustive, half-precision codes  6 144                   yes
+sq8      exhaustive, 8-bit scalar codes    3 072                   yes
+binary   exhaustive Hamming on sign bits   384                     yes
+hnsw     HNSW graph over full vectors      12 288 + graph          rebuild
+ivfpq    inverted lists + product codes    pq_m                    yes
+=======  ================================  ======================  ==========
+
+``dims`` (any type) indexes only the first `dims` components, re-normalised:
+text-embedding-3 vectors are Matryoshka-trained, so a prefix is a usable
+embedding on its own, and every byte count above shrinks by dims / 3072.
+``prepare()`` applies the same cut (and, for binary, the sign packing) to
+stored rows and to queries.
+
+The lossy variants are meant to be searched for more candidates than
+needed and re-ranked against the full-precision rows in the store
+(``rescore``); ``tune`` measures recall both ways next to index size.
+
+Vectors are unit-normalised (OpenAI embeddings), so inner product = cosine.
+Every index is keyed by store row id: IVF stores ids natively, the others
+are wrapped in ``IndexIDMap2`` (``IndexBinaryIDMap2`` for binary).
+"""
+from __future__ import annotations
+import math, time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+INDEX_TYPES  = ("flat", "fp16", "sq8", "binary", "hnsw", "ivfpq")
+SEARCH_KEYS  = ("nprobe", "ef_search")          # query-time only
+DEFAULTS     = {"hnsw": {"hnsw_m": 32, "ef_construction": 200, "ef_search": 64},
+                "ivfpq": {"nlist": 0, "pq_m": 64, "nprobe": 16},
+                "sq8": {}, "fp16": {}, "binary": {}, "flat": {}}
+
+
+def import_faiss():
+    try:
+        import faiss                         # standard
+    except ModuleNotFoundError:
+        import importlib
+        faiss = importlib.import_module("faiss_cpu")  # fallback for 1.11 wheels
+    return faiss
+
+
+def make_spec(index_type: str, **params) -> dict:
+    """
+    Defaults for `index_type`, overridden by any non-None `params` it knows;
+    ``dims`` is kept only when set (0 / None = the store's full width).
+    """
+    spec = {"type": index_type, **DEFAULTS[index_type]}
+    spec.update({k: v for k, v in params.items() if k in spec and v is not None})
+    if params.get("dims"):
+        spec["dims"] = int(params["dims"])
+    return spec
+
+
+def build_key(spec: dict) -> dict:
+    """The part of a spec that fixes the index structure."""
+    return {k: v for k, v in spec.items() if k not in SEARCH_KEYS}
+
+
+def supports_remove(spec: dict) -> bool:
+    return spec["type"] != "hnsw"
+
+
+def needs_training(spec: dict) -> bool:
+    return spec["type"] in ("ivfpq", "sq8")
+
+
+def is_binary(spec: dict) -> bool:
+    return spec["type"] == "binary"
+
+
+def lossy(spec: dict) -> bool:
+    """True when index scores differ from full-width float inner product (worth re-scoring)."""
+    return spec["type"] != "flat" or bool(spec.get("dims"))
+
+
+def index_dim(spec: dict, dim: int) -> int:
+    """Components the index sees for `dim`-wide stored vectors."""
+    return min(spec.get("dims") or dim, dim)
+
+
+def prepare(spec: dict, vecs: np.ndarray) -> np.ndarray:
+    """
+    Rows as the index takes them: the first ``dims`` components,
+    re-normalised, and for binary one sign bit per component, packed.
+    """
+    d = spec.get("dims")
+    if d and d < vecs.shape[1]:
+        vecs = vecs[:, :d]
+        vecs = vecs / np.linalg.norm(vecs, axis=1, keepdims=True).clip(1e-12)
+    if is_binary(spec):
+        return np.packbits(vecs > 0, axis=1)
+    return np.ascontiguousarray(vecs, dtype="float32")
+
+
+def similarity(spec: dict, dim: int, scores: np.ndarray) -> np.ndarray:
+    """Index scores as ≈ cosine: Hamming distance d over n bits → 1 − 2d/n."""
+    if is_binary(spec):
+        return 1.0 - 2.0 * scores.astype("float32") / index_dim(spec, dim)
+    return scores
+
+
+def rescore(query: np.ndarray, cand: np.ndarray, vecs: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Top-k of candidate ids `cand` by exact inner product of `query` with their full rows `vecs`."""
+    s = np.asarray(vecs, dtype="float32") @ np.asarray(query, dtype="float32")
+    top = np.argsort(-s, kind="stable")[:k]
+    return s[top], cand[top]
+
+
+def auto_nlist(rows: int) -> int:
+    """≈4·√n inverted lists, with ≥39 training points per centroid."""
+    return max(1, min(int(4 * math.sqrt(rows)), rows // 39))
+
+
+def make_index(faiss, spec: dict, dim: int, rows: int):
+    """Empty (untrained) index for `spec` over `dim`-wide stored vectors; `rows` sizes auto parameters."""
+    t, ip = spec["type"], faiss.METRIC_INNER_PRODUCT
+    dim = index_dim(spec, dim)
+    if t == "flat":
+        return faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+    if t == "fp16":
+        return faiss.IndexIDMap2(faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_fp16, ip))
+    if t == "sq8":
+        return faiss.IndexIDMap2(faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, ip))
+    if t == "binary":
+        if dim % 8:
+            raise ValueError(f"binary index needs dims divisible by 8, got {dim}")
+        return faiss.IndexBinaryIDMap2(faiss.IndexBinaryFlat(dim))
+    if t == "hnsw":
+        inner = faiss.IndexHNSWFlat(dim, spec["hnsw_m"], ip)
+        inner.hnsw.efConstruction = spec["ef_construction"]
+        return faiss.IndexIDMap2(inner)
+    if t == "ivfpq":
+        if dim % spec["pq_m"]:
+            raise ValueError(f"pq_m={spec['pq_m']} must divide dim={dim}")
+        nlist = spec["nlist"] or auto_nlist(rows)
+        return faiss.IndexIVFPQ(faiss.IndexFlatIP(dim), dim, nlist, spec["pq_m"], 8, ip)
+    raise ValueError(f"unknown index type {t!r}; expected one of {INDEX_TYPES}")
+
+
+def set_search_params(faiss, idx, spec: dict) -> None:
+    inner = faiss.downcast_index(idx.index) if isinstance(idx, faiss.IndexIDMap) else idx
+    if isinstance(inner, faiss.IndexIVF) and "nprobe" in spec:
+        inner.nprobe = spec["nprobe"]
+    if isinstance(inner, faiss.IndexHNSW) and "ef_search" in spec:
+        inner.hnsw.efSearch = spec["ef_search"]
+
+
+def index_bytes(faiss, idx) -> int:
+    if isinstance(idx, faiss.IndexBinary):
+        return int(faiss.serialize_index_binary(idx).size)
+    return int(faiss.serialize_index(idx).size)
+
+
+def read_index(faiss, path: str, spec: dict, flags: int = 0):
+    if is_binary(spec):
+        return faiss.read_index_binary(path, flags)
+    return faiss.read_index(path, flags)
+
+
+def write_index(faiss, idx, path: str) -> None:
+    if isinstance(idx, faiss.IndexBinary):
+        faiss.write_index_binary(idx, path)
+    else:
+        faiss.write_index(idx, path)
+
+
+# ------------------------------------------------------------------- #
+# Tuning
+# ------------------------------------------------------------------- #
+def sweep(spec: dict) -> List[dict]:
+    """Query-time variants of `spec` worth measuring."""
+    if spec["type"] == "ivfpq":
+        return [dict(spec, nprobe=n) for n in (1, 4, 16, 64) if n <= (spec.get("nlist") or 1 << 30)]
+    if spec["type"] == "hnsw":
+        return [dict(spec, ef_search=e) for e in (16, 32, 64, 128, 256)]
+    return [spec]
+
+
+def evaluate(faiss, idx, queries: np.ndarray, truth: np.ndarray, k: int, spec: Optional[dict] = None,
+             full: Optional[Callable[[np.ndarray], np.ndarray]] = None, factor: int = 0) -> Dict[str, float]:
+    """
+    recall@k against `truth` ids plus one-query-at-a-time latency
+    percentiles. With `factor`, k·factor candidates are re-ranked against
+    ``full(ids)`` (their full-precision rows); the latency includes that.
+    """
+    lat: List[float] = []
+    hits = 0
+    qidx = prepare(spec, queries) if spec else queries
+    for q, qi, want in zip(queries, qidx, truth):
+        t0 = time.perf_counter()
+        _, got = idx.search(qi[None], k * factor if factor else k)
+        if factor:
+            cand = got[0][got[0] >= 0]
+            got = rescore(q, cand, full(cand), k)[1][None]
+        lat.append(time.perf_counter() - t0)
+        hits += len(set(got[0].tolist()) & set(want.tolist()))
+    ms = np.array(lat) * 1000
+    return {"recall": hits / truth.size, "p50_ms": float(np.percentile(ms, 50)),
+            "p99_ms": float(np.percentile(ms, 99))}
+
+
+def tune(faiss, base: np.ndarray, ids: np.ndarray, queries: np.ndarray, specs: List[dict],
+         k: int = 10, train_rows: int = 50_000, seed: int = 0,
+         on_result: Optional[Callable[[dict], None]] = None, rescore_factors: Sequence[int] = (0,),
+         ) -> List[dict]:
+    """
+    Build each spec over (`base`, `ids`) and measure it against an exact
+    full-width flat search for `queries`. Returns one result row per
+    query-time variant and re-scoring factor (lossy specs only; 0 = off).
+    """
+    order = np.argsort(ids)
+
+    def full(cand: np.ndarray) -> np.ndarray:
+        return base[order[np.searchsorted(ids, cand, sorter=order)]]
+
+    exact = faiss.IndexFlatIP(base.shape[1])
+    exact.add(base)
+    truth = ids[exact.search(queries, k)[1]]
+    del exact
+
+    results: List[dict] = []
+    rng = np.random.default_rng(seed)
+    for spec in specs:
+        idx = make_index(faiss, spec, base.shape[1], len(base))
+        if spec["type"] == "ivfpq":
+            spec = dict(spec, nlist=idx.nlist)
+        t0 = time.perf_counter()
+        if needs_training(spec):
+            pick = rng.choice(len(base), min(train_rows, len(base)), replace=False)
+            idx.train(prepare(spec, base[np.sort(pick)]))
+        idx.add_with_ids(prepare(spec, base), ids)
+        build_s = time.perf_counter() - t0
+        size = index_bytes(faiss, idx)
+        for variant in sweep(spec):
+            set_search_params(faiss, idx, variant)
+            for factor in rescore_factors if lossy(spec) else (0,):
+                row = {"spec": variant, "rescore": factor, "build_s": round(build_s, 2), "bytes": size,
+                       "bytes_per_vector": round(size / max(1, len(base)), 1),
+                       **evaluate(faiss, idx, queries, truth, k, variant, full, factor)}
+                results.append(row)
+                if on_result:
+                    on_result(row)
+        del idx
+    return results
@@ -0,0 +1,278 @@
+"""
+procore_scraper.archive – append-only WARC archive of raw HTML
+---------------------------------------------------------------
+Replaces one ``raw_html/{slug}.html`` per page with a few large segment
+files plus an offset index::
+
+    raw-00000.warc.zst     WARC/1.1 ``resource`` records, one compressed
+    raw-00001.warc.zst     frame each; a new segment every ``segment_bytes``
+    index.sqlite           slug → (segment, offset, length, raw_sha1, url)
+
+Every record is its own zstd frame (gzip member where ``zstandard`` is not
+installed), so ``get(slug)`` is one ``pread`` and one decompress, while the
+segments stay ordinary ``.warc.zst`` / ``.warc.gz`` files that ``zstdcat``,
+``zcat`` or warcio read as a whole. Segments only grow: a page that changed
+is appended again and the index moves to the new copy. ``compact()`` copies
+the live records into fresh segments and deletes the old ones.
+
+``stream()`` yields the live pages in file order – a sequential read of each
+segment – for re-extraction without re-crawling.
+
+One process writes; any number read. The index is committed after every
+``put``, after the record itself is flushed, so a crash leaves at worst an
+unreferenced record at the end of a segment.
+"""
+from __future__ import annotations
+import base64, gzip, hashlib, os, pathlib, sqlite3, time, uuid, zlib
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from procore_scraper.utils import log_json
+
+CODECS = {"zstd": ".warc.zst", "gzip": ".warc.gz"}
+SEGMENT_BYTES = 256 * 2**20
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+def default_codec() -> str:
+    return "zstd" if _zstd() is not None else "gzip"
+
+
+def _codec_of(name: str) -> str:
+    return next(c for c, ext in CODECS.items() if name.endswith(ext))
+
+
+class RawArchive:
+    def __init__(self, root: pathlib.Path, codec: Optional[str] = None, level: Optional[int] = None,
+                 segment_bytes: int = SEGMENT_BYTES):
+        self.root = pathlib.Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.codec = codec or default_codec()
+        if self.codec not in CODECS:
+            raise ValueError(f"unknown codec {self.codec!r}; have {', '.join(CODECS)}")
+        if self.codec == "zstd" and _zstd() is None:
+            raise RuntimeError("codec 'zstd' needs the zstandard package (pip install zstandard)")
+        self.level = level if level is not None else (10 if self.codec == "zstd" else 6)
+        self.segment_bytes = segment_bytes
+        self.db = sqlite3.connect(str(self.root / "index.sqlite"))
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(
+            "CREATE TABLE IF NOT EXISTS segments (seg INTEGER PRIMARY KEY, name TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS records (slug TEXT PRIMARY KEY, seg INT NOT NULL, off INT NOT NULL,"
+            " len INT NOT NULL, raw_sha1 TEXT NOT NULL, url TEXT, ts TEXT NOT NULL) WITHOUT ROWID;"
+            "CREATE INDEX IF NOT EXISTS records_pos ON records (seg, off);"
+        )
+        self._names: Dict[int, str] = dict(self.db.execute("SELECT seg, name FROM segments"))
+        self._fds: Dict[int, int] = {}
+        self._out = None                      # (seg, file) being appended to
+        self._cctx = None
+
+    # ------------------------------------------------------------------ #
+    # Records
+    # ------------------------------------------------------------------ #
+    def _compress(self, data: bytes) -> bytes:
+        if self.codec == "zstd":
+            if self._cctx is None:
+                self._cctx = _zstd().ZstdCompressor(level=self.level)
+            return self._cctx.compress(data)
+        return gzip.compress(data, self.level, mtime=0)
+
+    @staticmethod
+    def _decompress(codec: str, frame: bytes) -> bytes:
+        if codec == "zstd":
+            z = _zstd()
+            if z is None:
+                raise RuntimeError("this archive has zstd segments; pip install zstandard to read them")
+            return z.ZstdDecompressor().decompress(frame)
+        return zlib.decompress(frame, wbits=31)
+
+    @staticmethod
+    def _record(url: str, html: str) -> bytes:
+        body = html.encode("utf-8", "ignore")
+        digest = base64.b32encode(hashlib.sha1(body).digest()).decode()
+        head = (f"WARC/1.1\r\nWARC-Type: resource\r\nWARC-Record-ID: <urn:uuid:{uuid.uuid4()}>\r\n"
+                f"WARC-Date: {time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())}\r\n"
+                f"WARC-Target-URI: {url}\r\nWARC-Block-Digest: sha1:{digest}\r\n"
+                f"Content-Type: text/html; charset=utf-8\r\nContent-Length: {len(body)}\r\n\r\n")
+        return head.encode() + body + b"\r\n\r\n"
+
+    @staticmethod
+    def _body(record: bytes) -> str:
+        head, _, rest = record.partition(b"\r\n\r\n")
+        n = next(int(line.split(b":", 1)[1]) for line in head.split(b"\r\n")
+                 if line.lower().startswith(b"content-length:"))
+        return rest[:n].decode("utf-8", "ignore")
+
+    # ------------------------------------------------------------------ #
+    # Segments
+    # ------------------------------------------------------------------ #
+    def _new_segment(self) -> int:
+        seg = max(self._names, default=-1) + 1
+        name = f"raw-{seg:05d}{CODECS[self.codec]}"
+        with self.db:
+            self.db.execute("INSERT INTO segments (seg, name) VALUES (?, ?)", (seg, name))
+        self._names[seg] = name
+        return seg
+
+    def _writer(self, need: int):
+        """The segment to append `need` bytes to – the newest one while it has room and our codec."""
+        if self._out is not None and self._out[1].tell() + need <= self.segment_bytes:
+            return self._out
+        self._close_out()
+        last = max(self._names, default=None)
+        if last is None or _codec_of(self._names[last]) != self.codec \
+                or (self.root / self._names[last]).stat().st_size + need > self.segment_bytes:
+            last = self._new_segment()
+        fh = open(self.root / self._names[last], "ab")
+        self._out = (last, fh)
+        return self._out
+
+    def _close_out(self) -> None:
+        if self._out is not None:
+            fh = self._out[1]
+            fh.flush()
+            os.fsync(fh.fileno())
+            fh.close()
+            self._out = None
+
+    def _name(self, seg: int) -> str:
+        if seg not in self._names:            # another process's writer started a segment
+            self._names = dict(self.db.execute("SELECT seg, name FROM segments"))
+        return self._names[seg]
+
+    def _read(self, seg: int, off: int, length: int) -> bytes:
+        if self._out is not None and self._out[0] == seg:
+            self._out[1].flush()
+        fd = self._fds.get(seg)
+        if fd is None:
+            fd = self._fds[seg] = os.open(self.root / self._name(seg), os.O_RDONLY)
+        return os.pread(fd, length, off)
+
+    # ------------------------------------------------------------------ #
+    # API
+    # ------------------------------------------------------------------ #
+    def __len__(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def __contains__(self, slug: str) -> bool:
+        return self.db.execute("SELECT 1 FROM records WHERE slug=?", (slug,)).fetchone() is not None
+
+    def slugs(self) -> List[str]:
+        return [s for s, in self.db.execute("SELECT slug FROM records ORDER BY slug")]
+
+    def raw_sha1(self, slug: str) -> Optional[str]:
+        row = self.db.execute("SELECT raw_sha1 FROM records WHERE slug=?", (slug,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, slug: str, url: str, html: str, raw_sha1: Optional[str] = None) -> bool:
+        """Append `html` for `slug` unless the archived copy has the same hash; True if written."""
+        raw_sha1 = raw_sha1 or hashlib.sha1(html.encode("utf-8", "ignore")).hexdigest()
+        if self.raw_sha1(slug) == raw_sha1:
+            return False
+        frame = self._compress(self._record(url, html))
+        seg, fh = self._writer(len(frame))
+        off = fh.tell()
+        fh.write(frame)
+        fh.flush()                            # record before index entry
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO records (slug, seg, off, len, raw_sha1, url, ts)"
+                            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            (slug, seg, off, len(frame), raw_sha1, url,
+                             time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())))
+        return True
+
+    def get(self, slug: str) -> Optional[str]:
+        row = self.db.execute("SELECT seg, off, len FROM records WHERE slug=?", (slug,)).fetchone()
+        if row is None:
+            return None
+        seg, off, length = row
+        return self._body(self._decompress(_codec_of(self._name(seg)), self._read(seg, off, length)))
+
+    def delete(self, slugs: Iterable[str]) -> int:
+        with self.db:
+            return self.db.executemany("DELETE FROM records WHERE slug=?", ((s,) for s in slugs)).rowcount
+
+    def stream(self, slugs: Optional[Iterable[str]] = None) -> Iterator[Tuple[str, str, str]]:
+        """(slug, url, html) for every live page (or just `slugs`), in file order."""
+        rows = self.db.execute("SELECT slug, url, seg, off, len FROM records ORDER BY seg, off").fetchall()
+        if slugs is not None:
+            want = set(slugs)
+            rows = [r for r in rows if r[0] in want]
+        cur, fh = None, None
+        try:
+            for slug, url, seg, off, length in rows:
+                if seg != cur:
+                    if fh is not None:
+                        fh.close()
+                    if self._out is not None and self._out[0] == seg:
+                        self._out[1].flush()
+                    cur, fh = seg, open(self.root / self._name(seg), "rb", buffering=1 << 20)
+                fh.seek(off)
+                yield slug, url, self._body(self._decompress(_codec_of(self._name(seg)), fh.read(length)))
+        finally:
+            if fh is not None:
+                fh.close()
+
+    def stats(self) -> dict:
+        live, pages = self.db.execute("SELECT COALESCE(SUM(len), 0), COUNT(*) FROM records").fetchone()
+        if self._out is not None:
+            self._out[1].flush()
+        disk = sum((self.root / n).stat().st_size for n in self._names.values() if (self.root / n).exists())
+        return {"pages": pages, "segments": len(self._names), "bytes": disk, "live_bytes": live,
+                "dead_bytes": disk - live}
+
+    def compact(self) -> dict:
+        """Rewrite live records into new segments (in the current codec) and drop the old files."""
+        before = self.stats()
+        self._close_out()
+        old = dict(self._names)
+        moved: List[Tuple[int, int, str]] = []
+        rows = self.db.execute("SELECT slug, seg, off, len FROM records ORDER BY seg, off").fetchall()
+        new_seg: Optional[int] = None
+        fh = None
+        try:
+            for slug, seg, off, length in rows:
+                frame = self._read(seg, off, length)
+                src = _codec_of(old[seg])
+                if src != self.codec:
+                    frame = self._compress(self._decompress(src, frame))
+                if fh is None or fh.tell() + len(frame) > self.segment_bytes:
+                    if fh is not None:
+                        fh.flush()
+                        os.fsync(fh.fileno())
+                        fh.close()
+                    new_seg = self._new_segment()
+                    fh = open(self.root / self._names[new_seg], "wb")
+                moved.append((new_seg, fh.tell(), slug))
+                fh.write(frame)
+        finally:
+            if fh is not None:
+                fh.flush()
+                os.fsync(fh.fileno())
+                fh.close()
+        with self.db:
+            self.db.executemany("UPDATE records SET seg=?, off=? WHERE slug=?", moved)
+            self.db.executemany("DELETE FROM segments WHERE seg=?", ((s,) for s in old))
+        for seg, name in old.items():
+            fd = self._fds.pop(seg, None)
+            if fd is not None:
+                os.close(fd)
+            del self._names[seg]
+            (self.root / name).unlink(missing_ok=True)
+        after = self.stats()
+        log_json("archive_compacted", pages=after["pages"], bytes_before=before["bytes"], bytes_after=after["bytes"],
+                 segments=after["segments"])
+        return after
+
+    def close(self) -> None:
+        self._close_out()
+        for fd in self._fds.values():
+            os.close(fd)
+        self._fds.clear()
+        self.db.close()
@@ -0,0 +1,139 @@
+"""
+procore_scraper.assistant – async, streaming client for the Procore Assistant
+-----------------------------------------------------------------------------
+* Runs are streamed (``runs.create(stream=True)``) instead of polled:
+  answer text arrives as ``thread.message.delta`` events, and the run ends on
+  its terminal event – ``completed``, ``failed``, ``cancelled``, ``expired``
+  or ``incomplete`` – so a dead run can never spin forever.
+* A session keeps its thread: follow-up questions in the same session are
+  added to the same thread (one run at a time, as the API requires) and the
+  assistant sees the conversation so far.
+* ``ask_many`` answers any number of questions with at most ``concurrency``
+  runs in flight.
+* Every answer reports time to first token and total latency.
+
+Works with any ``openai.AsyncOpenAI`` client – point ``OPENAI_BASE_URL`` at a
+local fake of the threads / messages / runs endpoints to exercise it offline.
+"""
+from __future__ import annotations
+import asyncio, os, time
+from typing import Callable, Dict, List, Optional, Sequence
+import openai
+from procore_scraper.utils import log_json
+
+ASSISTANT_ID = os.getenv("ASSISTANT_ID", "asst_ueLOB0oOsC8ZQkymnJ3nBkSj")   # create_assistant.py
+TERMINAL     = {"thread.run.completed": "completed", "thread.run.failed": "failed",
+                "thread.run.cancelled": "cancelled", "thread.run.expired": "expired",
+                "thread.run.incomplete": "incomplete"}
+
+
+class AssistantClient:
+    def __init__(self, client: Optional[openai.AsyncOpenAI] = None, assistant_id: str = ASSISTANT_ID,
+                 concurrency: int = 4, run_timeout: float = 120.0):
+        self.client = client or openai.AsyncOpenAI()
+        self.assistant_id = assistant_id
+        self.run_timeout = run_timeout
+        self._sem = asyncio.Semaphore(max(1, concurrency))
+        self._threads: Dict[str, str] = {}             # session → thread id
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def thread_for(self, session: Optional[str]) -> str:
+        """Thread id for `session` (created on first use); None → a fresh thread."""
+        if session is not None and session in self._threads:
+            return self._threads[session]
+        thread = await self.client.beta.threads.create()
+        if session is not None:
+            self._threads[session] = thread.id
+        return thread.id
+
+    def end_session(self, session: str) -> None:
+        self._threads.pop(session, None)
+        self._locks.pop(session, None)
+
+    # ------------------------------------------------------------------ #
+    async def ask(self, question: str, session: Optional[str] = None,
+                  on_text: Optional[Callable[[str], None]] = None) -> dict:
+        """
+        Answer `question`, streaming text pieces to `on_text` as they arrive.
+        Returns {"question", "answer", "status", "error", "ttft_s", "total_s",
+        "thread_id", "run_id"}; status is the run's terminal state, or
+        "timeout" when ``run_timeout`` passed first (the run is cancelled).
+        """
+        if session is None:
+            async with self._sem:
+                return await self._ask(question, None, on_text)
+        # queue on the session first so waiting follow-ups don't hold pool slots
+        async with self._locks.setdefault(session, asyncio.Lock()):
+            async with self._sem:
+                return await self._ask(question, session, on_text)
+
+    async def _ask(self, question: str, session: Optional[str],
+                   on_text: Optional[Callable[[str], None]]) -> dict:
+        t0 = time.perf_counter()
+        out = {"question": question, "answer": "", "status": None, "error": None,
+               "ttft_s": None, "total_s": None, "thread_id": None, "run_id": None}
+        parts: List[str] = []
+        try:
+            out["thread_id"] = thread_id = await self.thread_for(session)
+            await self.client.beta.threads.messages.create(thread_id=thread_id, role="user", content=question)
+            await asyncio.wait_for(self._stream(thread_id, out, parts, t0, on_text), self.run_timeout)
+        except asyncio.TimeoutError:
+            out["status"], out["error"] = "timeout", f"no terminal event after {self.run_timeout}s"
+            if out["run_id"]:
+                try:
+                    await self.client.beta.threads.runs.cancel(out["run_id"], thread_id=out["thread_id"])
+                except openai.APIError:
+                    pass
+        except openai.APIError as e:
+            out["status"], out["error"] = "error", str(e)
+        out["answer"] = "".join(parts)
+        out["total_s"] = round(time.perf_counter() - t0, 3)
+        if out["status"] != "completed" and session is not None:
+            self.end_session(session)          # a thread with a stuck run can't take new messages
+        log_json("assistant_answer", status=out["status"], ttft_s=out["ttft_s"], total_s=out["total_s"],
+                 chars=len(out["answer"]))
+        return out
+
+    async def _stream(self, thread_id: str, out: dict, parts: List[str], t0: float,
+                      on_text: Optional[Callable[[str], None]]) -> None:
+        stream = await self.client.beta.threads.runs.create(
+            thread_id=thread_id, assistant_id=self.assistant_id, stream=True)
+        async with stream:
+            async for ev in stream:
+                if ev.event == "thread.run.created":
+                    out["run_id"] = ev.data.id
+                elif ev.event == "thread.message.delta":
+                    for block in ev.data.delta.content or ():
+                        text = getattr(getattr(block, "text", None), "value", None)
+                        if not text:
+                            continue
+                        if out["ttft_s"] is None:
+                            out["ttft_s"] = round(time.perf_counter() - t0, 3)
+                        parts.append(text)
+                        if on_text:
+                            on_text(text)
+                elif ev.event in TERMINAL:
+                    out["status"] = TERMINAL[ev.event]
+                    err = getattr(ev.data, "last_error", None)
+                    if err:
+                        out["error"] = f"{err.code}: {err.message}"
+                    elif out["status"] == "incomplete" and ev.data.incomplete_details:
+                        out["error"] = ev.data.incomplete_details.reason
+                    break
+                elif ev.event == "thread.run.requires_action":
+                    # no function tools are configured; don't leave the run waiting
+                    await self.client.beta.threads.runs.cancel(ev.data.id, thread_id=thread_id)
+                    out["status"], out["error"] = "cancelled", "run requested a tool call"
+                    break
+                elif ev.event == "error":
+                    out["status"], out["error"] = "error", ev.data.message
+                    break
+            else:
+                out["status"], out["error"] = "error", "stream ended without a terminal event"
+
+    # ------------------------------------------------------------------ #
+    async def ask_many(self, questions: Sequence[str],
+                       sessions: Optional[Sequence[Optional[str]]] = None) -> List[dict]:
+        """Answers in question order; at most ``concurrency`` runs at a time."""
+        sessions = sessions or [None] * len(questions)
+        return list(await asyncio.gather(*(self.ask(q, s) for q, s in zip(questions, sessions))))
@@ -0,0 +1,143 @@
+"""
+procore_scraper.bm25 – on-disk BM25 inverted index over chunk texts
+-------------------------------------------------------------------
+Procore docs are full of exact identifiers (``/rest/v1.0/rfis``,
+``project_id``, tool names) that embeddings blur. This is a plain BM25
+index over the same chunks ``dynamic_markdown_split`` emits, kept next to
+the chunk manifest and updated at chunk time.
+
+Postings are keyed by chunk sha1 (the key the embedding cache uses), so a
+chunk shared by several pages is indexed once, and re-chunking a page only
+touches the chunks that actually changed. One SQLite file::
+
+    chunk   (key → length, refcount)
+    posting (term, key → tf, chunk length)     WITHOUT ROWID
+    doc     (doc, key)                         which docs hold which chunks
+
+Identifiers are indexed whole *and* split, so ``/rest/v1.0/rfis`` matches
+the exact path as well as ``rfis``.
+"""
+from __future__ import annotations
+import math, pathlib, re, sqlite3
+from collections import Counter
+from typing import Dict, Iterable, List, Sequence, Tuple
+from procore_scraper.emb_cache import chunk_key
+
+K1, B = 1.2, 0.75
+_COMPOUND_RE = re.compile(r"[A-Za-z0-9_]+(?:[./:\-][A-Za-z0-9_]+)*")
+_PART_RE     = re.compile(r"[A-Za-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    out: List[str] = []
+    for m in _COMPOUND_RE.finditer(text.lower()):
+        tok = m.group()
+        out.append(tok)
+        parts = _PART_RE.findall(tok)
+        if len(parts) > 1 or (parts and parts[0] != tok):
+            out.extend(parts)
+    return out
+
+
+class BM25Index:
+    def __init__(self, path: pathlib.Path, check_same_thread: bool = True):
+        self.db = sqlite3.connect(str(path), check_same_thread=check_same_thread)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(
+            "CREATE TABLE IF NOT EXISTS chunk (key BLOB PRIMARY KEY, len INT NOT NULL,"
+            " refs INT NOT NULL) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS posting (term TEXT NOT NULL, key BLOB NOT NULL,"
+            " tf INT NOT NULL, dl INT NOT NULL, PRIMARY KEY (term, key)) WITHOUT ROWID;"
+            "CREATE INDEX IF NOT EXISTS posting_key ON posting (key);"
+            "CREATE TABLE IF NOT EXISTS doc (doc TEXT NOT NULL, key BLOB NOT NULL,"
+            " PRIMARY KEY (doc, key)) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS stats (k TEXT PRIMARY KEY, v INT NOT NULL);"
+        )
+        self._load_stats()
+
+    def _load_stats(self) -> None:
+        s = dict(self.db.execute("SELECT k, v FROM stats"))
+        self.n, self.total_len = s.get("n", 0), s.get("total_len", 0)
+
+    def docs(self) -> set:
+        return {d for (d,) in self.db.execute("SELECT DISTINCT doc FROM doc")}
+
+    # ------------------------------------------------------------------ #
+    # Updates
+    # ------------------------------------------------------------------ #
+    def _add_chunk(self, key: bytes, text: str) -> None:
+        if self.db.execute("UPDATE chunk SET refs = refs + 1 WHERE key=?", (key,)).rowcount:
+            return
+        tf = Counter(tokenize(text))
+        dl = sum(tf.values())
+        self.db.execute("INSERT INTO chunk (key, len, refs) VALUES (?, ?, 1)", (key, dl))
+        self.db.executemany("INSERT INTO posting (term, key, tf, dl) VALUES (?, ?, ?, ?)",
+                            ((t, key, c, dl) for t, c in tf.items()))
+        self.n += 1
+        self.total_len += dl
+
+    def _drop_chunk(self, key: bytes) -> None:
+        row = self.db.execute("SELECT len, refs FROM chunk WHERE key=?", (key,)).fetchone()
+        if row is None:
+            return
+        if row[1] > 1:
+            self.db.execute("UPDATE chunk SET refs = refs - 1 WHERE key=?", (key,))
+            return
+        self.db.execute("DELETE FROM chunk WHERE key=?", (key,))
+        self.db.execute("DELETE FROM posting WHERE key=?", (key,))
+        self.n -= 1
+        self.total_len -= row[0]
+
+    def _sync_doc(self, doc: str, chunks: Sequence[str]) -> None:
+        new = {chunk_key(c): c for c in chunks}
+        old = {k for (k,) in self.db.execute("SELECT key FROM doc WHERE doc=?", (doc,))}
+        for key in old - new.keys():
+            self._drop_chunk(key)
+        self.db.executemany("DELETE FROM doc WHERE doc=? AND key=?", ((doc, k) for k in old - new.keys()))
+        for key in new.keys() - old:
+            self._add_chunk(key, new[key])
+            self.db.execute("INSERT INTO doc (doc, key) VALUES (?, ?)", (doc, key))
+
+    def update(self, docs: Dict[str, Sequence[str]], drop: Iterable[str] = ()) -> None:
+        """Re-index `docs` (doc → its current chunks) and forget `drop`; one transaction."""
+        with self.db:
+            for doc in drop:
+                self._sync_doc(doc, ())
+            for doc, chunks in docs.items():
+                self._sync_doc(doc, chunks)
+            self.db.executemany("INSERT OR REPLACE INTO stats (k, v) VALUES (?, ?)",
+                                (("n", self.n), ("total_len", self.total_len)))
+
+    # ------------------------------------------------------------------ #
+    # Query
+    # ------------------------------------------------------------------ #
+    def search(self, query: str, k: int = 10, max_df: float = 0.5) -> List[Tuple[bytes, float]]:
+        """
+        Top-k (chunk key, BM25 score). Terms in more than `max_df` of all
+        chunks carry almost no weight and are skipped rather than scanned.
+        """
+        if not self.n:
+            return []
+        avgdl = self.total_len / self.n
+        scores: Dict[bytes, float] = {}
+        for term in set(tokenize(query)):
+            (df,) = self.db.execute("SELECT COUNT(*) FROM posting WHERE term=?", (term,)).fetchone()
+            if not df or (self.n >= 100 and df > max_df * self.n):
+                continue
+            idf = math.log(1 + (self.n - df + 0.5) / (df + 0.5))
+            for key, tf, dl in self.db.execute("SELECT key, tf, dl FROM posting WHERE term=?", (term,)):
+                scores[key] = scores.get(key, 0.0) + idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * dl / avgdl))
+        return sorted(scores.items(), key=lambda kv: -kv[1])[:k]
+
+    def close(self) -> None:
+        self.db.close()
+
+
+def rrf(rankings: Sequence[Sequence[int]], k: int, c: int = 60) -> List[Tuple[int, float]]:
+    """Reciprocal rank fusion of several ranked id lists → top-k (id, score)."""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, id_ in enumerate(ranking):
+            scores[id_] = scores.get(id_, 0.0) + 1.0 / (c + rank + 1)
+    return sorted(scores.items(), key=lambda kv: -kv[1])[:k]
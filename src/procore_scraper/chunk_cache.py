@@ -0,0 +1,109 @@
+"""
+procore_scraper.chunk_cache – persistent chunk manifest
+-------------------------------------------------------
+``manifest.json`` maps every Markdown stem to the stat fingerprint
+(size, mtime_ns) and content sha1 it was last chunked at; the chunks and
+their token counts live next to it in ``{sha1}-{params}.json``.
+
+* Unchanged stat  → the file is never opened.
+* Changed stat    → the file is hashed; only a new hash is re-tokenized.
+* Entries are only valid for the splitter parameters recorded in the
+  manifest (CHUNK_TARGET / CHUNK_MAX / OVERLAP_TOKENS / encoding); changing
+  any of them starts a fresh cache.
+
+Re-chunking runs in a ``ProcessPoolExecutor``, handed out in batches.
+"""
+from __future__ import annotations
+import hashlib, json, os, pathlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+from procore_scraper import splitters
+from procore_scraper.utils import sha1_text
+
+Job    = Tuple[str, Optional[str]]
+Result = Tuple[str, int, int, str, Optional[dict]]
+
+
+def params_key() -> str:
+    return (f"{splitters.CHUNK_TARGET}-{splitters.CHUNK_MAX}-"
+            f"{splitters.OVERLAP_TOKENS}-{splitters.enc.name}")
+
+
+def chunk_doc(job: Job) -> Result:
+    """Worker: (path, previous sha1) → (path, size, mtime_ns, sha1, chunk record | None)."""
+    path, old_sha1 = job
+    st = os.stat(path)
+    raw = pathlib.Path(path).read_text()
+    sha1 = sha1_text(raw)
+    if sha1 == old_sha1:                       # touched, not edited
+        return path, st.st_size, st.st_mtime_ns, sha1, None
+    chunks, counts, total = splitters.split_with_tokens(raw)
+    return path, st.st_size, st.st_mtime_ns, sha1, {"chunks": chunks, "tokens": counts, "doc_tokens": total}
+
+
+def _write_atomic(path: pathlib.Path, text: str) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(text)
+    os.replace(tmp, path)
+
+
+class ChunkManifest:
+    def __init__(self, root: pathlib.Path):
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.path = root / "manifest.json"
+        self.params = params_key()
+        self._tag = hashlib.sha1(self.params.encode()).hexdigest()[:8]
+        data = json.loads(self.path.read_text()) if self.path.exists() else {}
+        self.docs: Dict[str, dict] = data.get("docs", {}) if data.get("params") == self.params else {}
+
+    # ------------------------------------------------------------------ #
+    def is_fresh(self, path: pathlib.Path) -> bool:
+        e = self.docs.get(path.stem)
+        if e is None:
+            return False
+        st = path.stat()
+        return e["size"] == st.st_size and e["mtime_ns"] == st.st_mtime_ns
+
+    def blob(self, sha1: str) -> pathlib.Path:
+        return self.root / f"{sha1}-{self._tag}.json"
+
+    def load(self, stem: str) -> dict:
+        """{"chunks": [...], "tokens": [...], "doc_tokens": n} for a manifest entry."""
+        return json.loads(self.blob(self.docs[stem]["sha1"]).read_text())
+
+    # ------------------------------------------------------------------ #
+    def update(self, paths: Iterable[pathlib.Path], procs: Optional[int] = None,
+               batch: int = 16) -> List[str]:
+        """
+        Re-check `paths` (normally the ones `is_fresh` rejected) in a process
+        pool. Returns the stems whose content changed (or are new).
+        """
+        jobs = [(str(p), self.docs.get(p.stem, {}).get("sha1")) for p in paths]
+        if not jobs:
+            return []
+        changed: List[str] = []
+        with ProcessPoolExecutor(procs) as ex:
+            for path, size, mtime_ns, sha1, rec in ex.map(chunk_doc, jobs, chunksize=batch):
+                stem = pathlib.Path(path).stem
+                entry = dict(self.docs.get(stem, {}), size=size, mtime_ns=mtime_ns, sha1=sha1)
+                if rec is not None:
+                    if not self.blob(sha1).exists():
+                        _write_atomic(self.blob(sha1), json.dumps(rec))
+                    entry.update(n=len(rec["chunks"]), doc_tokens=rec["doc_tokens"])
+                    changed.append(stem)
+                self.docs[stem] = entry
+        return changed
+
+    def forget_missing(self, stems: Iterable[str]) -> None:
+        """Drop entries for Markdown files that no longer exist."""
+        keep = set(stems)
+        for stem in [s for s in self.docs if s not in keep]:
+            del self.docs[stem]
+
+    def save(self) -> None:
+        _write_atomic(self.path, json.dumps({"params": self.params, "docs": self.docs}))
+        live = {self.blob(e["sha1"]).name for e in self.docs.values()}
+        for p in self.root.glob("*-*.json"):
+            if p.name not in live:
+                p.unlink()
@@ -0,0 +1,167 @@
+"""
+procore_scraper.chunk_meta – mmap'd, lazily decoded chunk metadata
+------------------------------------------------------------------
+Replaces the pickled ``{id: dict}`` next to a FAISS index. One file::
+
+    b"PCMETA\\x00\\x02"        magic + format version
+    u32 + JSON header        row / doc counts and section offsets
+    text blob                chunk texts, UTF-8, back to back
+    doc blob                 one JSON object per document (doc_sha1, url, title)
+    ids       n × i64        FAISS ids (store row ids), ascending
+    rows      n × record     doc index, chunk_id, chunk_sha1, text offset/length
+    doc_offs  (d + 1) × u64  offsets into the doc blob
+    keys      n × 20 bytes   chunk sha1s, sorted          ┐ chunk sha1 → ids
+    by_key    n × u32        row positions in that order  ┘ (BM25 hits)
+
+Opening maps the file and reads the header – nothing else – so start-up time
+and RSS don't depend on corpus size. ``get(id)`` binary-searches ``ids`` and
+decodes only that row.
+"""
+from __future__ import annotations
+import json, mmap, os, pathlib, struct
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+
+MAGIC   = b"PCMETA\x00\x02"
+_HEAD   = 4096                     # header area reserved at the front
+ROW     = np.dtype([("doc", "<u4"), ("chunk_id", "<u4"), ("chunk_sha1", "S20"),
+                    ("text_off", "<u8"), ("text_len", "<u4")])
+
+
+def _sha1(r) -> bytes:
+    # numpy "S" fields drop trailing NULs on read
+    return bytes(r["chunk_sha1"]).ljust(20, b"\0")
+
+
+class ChunkMeta:
+    def __init__(self, path: pathlib.Path):
+        self.path = pathlib.Path(path)
+        with open(self.path, "rb") as fh:
+            self._mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:8] != MAGIC:
+            raise ValueError(f"{path}: not a chunk metadata file")
+        (hlen,) = struct.unpack_from("<I", self._mm, 8)
+        h = json.loads(self._mm[12 : 12 + hlen])
+        self.rows, self.ndocs = h["rows"], h["docs"]
+        self._text, self._docs = h["text"], h["doc_blob"]
+        self.ids = np.frombuffer(self._mm, "<i8", self.rows, h["ids"])
+        self._rows = np.frombuffer(self._mm, ROW, self.rows, h["rows_off"])
+        self._doc_offs = np.frombuffer(self._mm, "<u8", self.ndocs + 1, h["doc_offs"])
+        self._keys = np.frombuffer(self._mm, "S20", self.rows, h["keys"])
+        self._by_key = np.frombuffer(self._mm, "<u4", self.rows, h["by_key"])
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def __contains__(self, id_: int) -> bool:
+        return self._pos(id_) is not None
+
+    def _pos(self, id_: int) -> Optional[int]:
+        i = int(np.searchsorted(self.ids, id_))
+        return i if i < self.rows and self.ids[i] == id_ else None
+
+    def ids_for_key(self, key: bytes) -> List[int]:
+        """Ids of every row whose chunk sha1 is `key` (identical chunks on several pages)."""
+        a = int(np.searchsorted(self._keys, key, "left"))
+        b = int(np.searchsorted(self._keys, key, "right"))
+        return sorted(int(self.ids[p]) for p in self._by_key[a:b])
+
+    def doc(self, d: int) -> dict:
+        a, b = int(self._doc_offs[d]), int(self._doc_offs[d + 1])
+        return json.loads(self._mm[self._docs + a : self._docs + b])
+
+    def text_bytes(self, pos: int) -> bytes:
+        r = self._rows[pos]
+        a = self._text + int(r["text_off"])
+        return self._mm[a : a + int(r["text_len"])]
+
+    def text(self, pos: int) -> str:
+        return self.text_bytes(pos).decode("utf-8")
+
+    def row(self, pos: int) -> dict:
+        r = self._rows[pos]
+        return {**self.doc(int(r["doc"])), "chunk_id": int(r["chunk_id"]),
+                "chunk_sha1": _sha1(r).hex(), "text": self.text(pos)}
+
+    def get(self, id_: int, default=None):
+        pos = self._pos(id_)
+        return default if pos is None else self.row(pos)
+
+    def get_many(self, ids: Iterable[int]) -> Dict[int, dict]:
+        return {i: m for i in ids if (m := self.get(int(i))) is not None}
+
+
+class ChunkMetaWriter:
+    """Streams rows (ascending id) to ``path.tmp``; ``close()`` publishes atomically."""
+
+    def __init__(self, path: pathlib.Path):
+        self.path = pathlib.Path(path)
+        self._tmp = self.path.with_name(self.path.name + ".tmp")
+        self._fh = open(self._tmp, "wb")
+        self._fh.write(b"\0" * _HEAD)
+        self._text_len = 0
+        self._ids: List[int] = []
+        self._rows: List[tuple] = []
+        self._docs: List[bytes] = []
+        self._doc_idx: Dict[str, int] = {}
+        self._copied: Dict[int, int] = {}       # source doc index → ours
+
+    def add_doc(self, doc_sha1: str, **fields) -> int:
+        """Index of `doc_sha1` in the doc table (first call's fields win)."""
+        d = self._doc_idx.get(doc_sha1)
+        if d is None:
+            d = self._doc_idx[doc_sha1] = len(self._docs)
+            self._docs.append(json.dumps({"doc_sha1": doc_sha1, **fields}, ensure_ascii=False).encode())
+        return d
+
+    def add(self, id_: int, doc: int, chunk_id: int, chunk_sha1: bytes, text) -> None:
+        if self._ids and id_ <= self._ids[-1]:
+            raise ValueError(f"ids must ascend: {id_} after {self._ids[-1]}")
+        data = text if isinstance(text, bytes) else text.encode("utf-8")
+        self._fh.write(data)
+        self._ids.append(id_)
+        self._rows.append((doc, chunk_id, chunk_sha1, self._text_len, len(data)))
+        self._text_len += len(data)
+
+    def copy(self, src: ChunkMeta, id_: int) -> None:
+        """Copy row `id_` from a previous file without decoding its text."""
+        pos = src._pos(id_)
+        if pos is None:
+            raise KeyError(id_)
+        r = src._rows[pos]
+        d = int(r["doc"])
+        if d not in self._copied:
+            self._copied[d] = self.add_doc(**src.doc(d))
+        self.add(id_, self._copied[d], int(r["chunk_id"]), _sha1(r), src.text_bytes(pos))
+
+    def close(self) -> None:
+        fh = self._fh
+        h = {"rows": len(self._ids), "docs": len(self._docs), "text": _HEAD,
+             "doc_blob": _HEAD + self._text_len}
+        for d in self._docs:
+            fh.write(d)
+        doc_offs = np.zeros(len(self._docs) + 1, "<u8")
+        np.cumsum([len(d) for d in self._docs], out=doc_offs[1:])
+        pos = h["doc_blob"] + int(doc_offs[-1])
+        pad = -pos % 8
+        fh.write(b"\0" * pad)
+        h["ids"] = pos + pad
+        ids = np.asarray(self._ids, "<i8")
+        rows = np.array(self._rows, dtype=ROW)
+        h["rows_off"] = h["ids"] + ids.nbytes
+        h["doc_offs"] = h["rows_off"] + rows.nbytes
+        order = np.argsort(rows["chunk_sha1"], kind="stable").astype("<u4")
+        h["keys"] = h["doc_offs"] + doc_offs.nbytes
+        h["by_key"] = h["keys"] + 20 * len(order)
+        fh.write(ids.tobytes())
+        fh.write(rows.tobytes())
+        fh.write(doc_offs.tobytes())
+        fh.write(rows["chunk_sha1"][order].tobytes())
+        fh.write(order.tobytes())
+        hb = json.dumps(h).encode()
+        fh.seek(0)
+        fh.write(MAGIC + struct.pack("<I", len(hb)) + hb)
+        fh.flush()
+        os.fsync(fh.fileno())
+        fh.close()
+        os.replace(self._tmp, self.path)
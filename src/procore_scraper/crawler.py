@@ -0,0 +1,145 @@
+"""
+procore_scraper.crawler – async, concurrency-bounded fetch engine
+-----------------------------------------------------------------
+* One pooled ``httpx.AsyncClient`` (HTTP/2 when ``h2`` is installed).
+* A global in-flight limit plus per-host limits (suffix match, so
+  ``www.procore.com`` shares the ``procore.com`` budget).
+* Same retry policy as ``scrape_procore.fetch``: 3 tries, 1s/2s/4s back-off on
+  transport errors; HTTP status codes are returned, not raised.
+
+Every request goes to the URL exactly as given, so the engine can be pointed
+at a local stand-in server (``http://127.0.0.1:…``) or handed a client built on
+``httpx.MockTransport``.
+"""
+from __future__ import annotations
+import asyncio, contextlib, urllib.parse
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, Mapping, Optional
+import httpx
+from procore_scraper import metrics
+
+HEADERS = {"User-Agent": "Mozilla/5.0"}
+
+DEFAULT_CONCURRENCY = 32
+DEFAULT_HOST_LIMIT  = 4
+DEFAULT_HOST_LIMITS = {
+    "developers.procore.com": 8,
+    "support.procore.com":    8,
+    "procore.com":            4,
+}
+
+Handler = Callable[[str, httpx.Response], Awaitable[None]]
+
+
+# ------------------------------------------------------------------- #
+# Limits
+# ------------------------------------------------------------------- #
+class HostLimiter:
+    """Global semaphore + one semaphore per host."""
+
+    def __init__(self, concurrency: int = DEFAULT_CONCURRENCY,
+                 host_limits: Optional[Mapping[str, int]] = None,
+                 default_host_limit: int = DEFAULT_HOST_LIMIT):
+        self._global = asyncio.Semaphore(concurrency)
+        self._limits = dict(DEFAULT_HOST_LIMITS if host_limits is None else host_limits)
+        self._default = default_host_limit
+        self._hosts: Dict[str, asyncio.Semaphore] = {}
+
+    def _bucket(self, host: str) -> str:
+        """Most specific configured suffix of `host`, else `host` itself."""
+        parts = host.split(".")
+        for i in range(len(parts) - 1):
+            cand = ".".join(parts[i:])
+            if cand in self._limits:
+                return cand
+        return host
+
+    @contextlib.asynccontextmanager
+    async def slot(self, url: str) -> AsyncIterator[None]:
+        host = (urllib.parse.urlsplit(url).hostname or "").lower()
+        bucket = self._bucket(host)
+        sem = self._hosts.get(bucket)
+        if sem is None:
+            sem = self._hosts[bucket] = asyncio.Semaphore(self._limits.get(bucket, self._default))
+        # host first, so a throttled host never sits on a global slot
+        async with sem:
+            async with self._global:
+                yield
+
+
+# ------------------------------------------------------------------- #
+# Client / fetch
+# ------------------------------------------------------------------- #
+def make_client(concurrency: int = DEFAULT_CONCURRENCY, timeout: float = 30.0,
+                **kw) -> httpx.AsyncClient:
+    try:
+        import h2  # noqa: F401
+        http2 = True
+    except ImportError:
+        http2 = False
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    return httpx.AsyncClient(http2=http2, headers=HEADERS, timeout=timeout,
+                             limits=limits, follow_redirects=True, **kw)
+
+
+@metrics.timed("fetch")
+async def fetch(client: httpx.AsyncClient, limiter: HostLimiter, url: str,
+                retry: int = 3, headers: Optional[Mapping[str, str]] = None) -> httpx.Response:
+    for i in range(retry):
+        try:
+            async with limiter.slot(url):
+                resp = await client.get(url, headers=headers)
+            metrics.count("fetch_bytes", len(resp.content))
+            return resp
+        except httpx.HTTPError:
+            await asyncio.sleep(2**i)      # back-off outside the slot
+    raise RuntimeError(f"Failed fetch {url}")
+
+
+# ------------------------------------------------------------------- #
+async def crawl(urls: Iterable[str], handle: Handler, *,
+                concurrency: int = DEFAULT_CONCURRENCY,
+                host_limits: Optional[Mapping[str, int]] = None,
+                timeout: float = 30.0,
+                retry: int = 3,
+                client: Optional[httpx.AsyncClient] = None,
+                headers_for: Optional[Callable[[str], Mapping[str, str]]] = None,
+                on_error: Optional[Callable[[str, Exception], None]] = None) -> None:
+    """
+    Fetch every URL and await ``handle(url, response)`` for each one.
+
+    At most ``4 × concurrency`` tasks exist at a time, so memory stays flat no
+    matter how long `urls` is. `headers_for(url)` adds per-request headers
+    (e.g. ``If-None-Match`` for re-crawls).
+    """
+    limiter = HostLimiter(concurrency, host_limits)
+    own = client is None
+    client = client or make_client(concurrency, timeout)
+
+    async def one(url: str) -> None:
+        try:
+            resp = await fetch(client, limiter, url, retry,
+                               headers_for(url) if headers_for else None)
+            await handle(url, resp)
+        except Exception as e:                     # one bad page never kills the crawl
+            if on_error is None:
+                raise
+            on_error(url, e)
+
+    window = max(1, concurrency * 4)
+    pending: set = set()
+    try:
+        for url in urls:
+            if len(pending) >= window:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    t.result()
+            pending.add(asyncio.ensure_future(one(url)))
+        if pending:
+            for t in await asyncio.gather(*pending, return_exceptions=True):
+                if isinstance(t, BaseException):
+                    raise t
+    finally:
+        for t in pending:
+            t.cancel()
+        if own:
+            await client.aclose()
@@ -0,0 +1,59 @@
+"""
+procore_scraper.emb_cache – content-addressed embedding cache
+-------------------------------------------------------------
+One SQLite table keyed by ``(model, sha1(chunk_text))`` holding each vector as
+a float16 blob. Identical chunks – across pages, re-runs, splitter tweaks or
+re-ordered chunk ids – are embedded once per model, and lookups hit the
+primary-key index instead of a dict built from all of ``chunks.jsonl``.
+"""
+from __future__ import annotations
+import hashlib, pathlib, sqlite3
+from typing import Dict, Iterable, Tuple
+import numpy as np
+
+_SQL_VARS = 500          # stay well under SQLite's bound-parameter limit
+
+
+def chunk_key(text: str) -> bytes:
+    """20-byte sha1 of a chunk's text (same digest as utils.sha1_text)."""
+    return hashlib.sha1(text.encode("utf-8", "ignore")).digest()
+
+
+class EmbeddingCache:
+    def __init__(self, path: pathlib.Path, model: str):
+        self.model = model
+        self.db = sqlite3.connect(str(path))
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS emb ("
+            " model TEXT NOT NULL, key BLOB NOT NULL, vec BLOB NOT NULL,"
+            " PRIMARY KEY (model, key)) WITHOUT ROWID"
+        )
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM emb WHERE model=?", (self.model,)).fetchone()[0]
+
+    def get_many(self, keys: Iterable[bytes]) -> Dict[bytes, np.ndarray]:
+        keys = list(dict.fromkeys(keys))
+        out: Dict[bytes, np.ndarray] = {}
+        for i in range(0, len(keys), _SQL_VARS):
+            part = keys[i : i + _SQL_VARS]
+            rows = self.db.execute(
+                f"SELECT key, vec FROM emb WHERE model=? AND key IN ({','.join('?' * len(part))})",
+                (self.model, *part),
+            )
+            for key, vec in rows:
+                out[key] = np.frombuffer(vec, dtype="float16")
+        return out
+
+    def put_many(self, items: Iterable[Tuple[bytes, np.ndarray]]) -> None:
+        """Insert and commit – each call is durable on its own."""
+        with self.db:
+            self.db.executemany(
+                "INSERT OR IGNORE INTO emb (model, key, vec) VALUES (?, ?, ?)",
+                ((self.model, k, np.asarray(v, dtype="float16").tobytes()) for k, v in items),
+            )
+
+    def close(self) -> None:
+        self.db.close()
@@ -0,0 +1,209 @@
+"""
+procore_scraper.embedder – concurrent, rate-limit-aware embedding scheduler
+---------------------------------------------------------------------------
+* Batches are packed by token budget (the splitter already knows each chunk's
+  token count), capped at the API's per-request input limit.
+* Up to `inflight` requests run at once; a 429 halves the window, every
+  success widens it again by one (AIMD).
+* ``x-ratelimit-remaining-*`` / ``x-ratelimit-reset-*`` headers gate new
+  requests before the server has to refuse them; ``retry-after`` is honoured.
+* 429 / 5xx / connection errors are retried with jittered exponential
+  back-off. Results are delivered strictly in batch order, so the caller can
+  append rows without gaps or duplicates.
+
+Works with any ``openai.AsyncOpenAI`` client – point ``OPENAI_BASE_URL`` at a
+local fake ``/v1/embeddings`` endpoint to exercise it offline.
+"""
+from __future__ import annotations
+import asyncio, random, re, time
+from typing import Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+import openai
+from procore_scraper import metrics
+from procore_scraper.utils import log_json
+
+MAX_BATCH_ITEMS  = 2048      # OpenAI per-request input limit
+MAX_BATCH_TOKENS = 300_000   # OpenAI per-request token limit
+
+Batch = Tuple[List[str], int]            # (texts, total tokens)
+
+
+# ------------------------------------------------------------------- #
+# Packing
+# ------------------------------------------------------------------- #
+def pack_batches(tokens: Sequence[int], max_tokens: int,
+                 max_items: int = MAX_BATCH_ITEMS) -> List[Tuple[int, int]]:
+    """
+    Contiguous (start, end) ranges over `tokens` whose sums stay ≤ max_tokens
+    and lengths ≤ max_items. An item larger than the budget gets its own batch.
+    """
+    out: List[Tuple[int, int]] = []
+    start, acc = 0, 0
+    for i, n in enumerate(tokens):
+        if i > start and (acc + n > max_tokens or i - start >= max_items):
+            out.append((start, i))
+            start, acc = i, 0
+        acc += n
+    if start < len(tokens):
+        out.append((start, len(tokens)))
+    return out
+
+
+# ------------------------------------------------------------------- #
+# Rate-limit headers
+# ------------------------------------------------------------------- #
+_DUR_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_UNIT   = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """OpenAI reset strings ("20ms", "1s", "6m0s") or plain seconds → seconds."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        parts = _DUR_RE.findall(value)
+        return sum(float(n) * _UNIT[u] for n, u in parts) if parts else None
+
+
+def retry_after(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    if not headers:
+        return None
+    ms = headers.get("retry-after-ms")
+    if ms:
+        try:
+            return float(ms) / 1000
+        except ValueError:
+            pass
+    return parse_duration(headers.get("retry-after"))
+
+
+class RateLimits:
+    """Last known request/token budget, spent optimistically as batches go out."""
+
+    def __init__(self) -> None:
+        self.tokens: Optional[float] = None
+        self.requests: Optional[float] = None
+        self.tokens_reset = self.requests_reset = 0.0
+
+    def update(self, headers: Mapping[str, str]) -> None:
+        now = time.monotonic()
+        for kind in ("tokens", "requests"):
+            left = headers.get(f"x-ratelimit-remaining-{kind}")
+            reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+            if left is not None:
+                try:
+                    setattr(self, kind, float(left))
+                except ValueError:                # a malformed header must not fail a good response
+                    pass
+            if reset is not None:
+                setattr(self, f"{kind}_reset", now + reset)
+
+    def delay(self, ntok: int) -> float:
+        """Seconds to hold a batch of `ntok` tokens before sending it."""
+        now, wait = time.monotonic(), 0.0
+        if self.tokens is not None and self.tokens < ntok and self.tokens_reset > now:
+            wait = self.tokens_reset - now
+        if self.requests is not None and self.requests < 1 and self.requests_reset > now:
+            wait = max(wait, self.requests_reset - now)
+        return wait
+
+    def spend(self, ntok: int) -> None:
+        if self.tokens is not None:
+            self.tokens -= ntok
+        if self.requests is not None:
+            self.requests -= 1
+
+
+# ------------------------------------------------------------------- #
+# Scheduler
+# ------------------------------------------------------------------- #
+class EmbeddingScheduler:
+    def __init__(self, client: openai.AsyncOpenAI, model: str, inflight: int = 4,
+                 max_retries: int = 6, base_delay: float = 1.0, dimensions: Optional[int] = None):
+        self.client, self.model = client, model
+        self.extra = {"dimensions": dimensions} if dimensions else {}
+        self.max_inflight = self.limit = max(1, inflight)
+        self.max_retries, self.base_delay = max_retries, base_delay
+        self.limits = RateLimits()
+        self.retries = 0
+        self._active = 0
+        self._cond: Optional[asyncio.Condition] = None
+
+    async def _acquire(self) -> None:
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._active < self.limit)
+            self._active += 1
+
+    async def _release(self) -> None:
+        async with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    async def embed(self, texts: List[str], ntok: int) -> List[List[float]]:
+        """One batch, retried until it succeeds or retries run out."""
+        for attempt in range(self.max_retries + 1):
+            while (wait := self.limits.delay(ntok)) > 0:
+                await asyncio.sleep(wait)
+            await self._acquire()
+            headers, status = None, None
+            try:
+                self.limits.spend(ntok)
+                with metrics.timer("embed_request"):
+                    raw = await self.client.embeddings.with_raw_response.create(
+                        model=self.model, input=texts, **self.extra)
+                metrics.count("embed_tokens", ntok)
+                self.limits.update(raw.headers)
+                self.limit = min(self.max_inflight, self.limit + 1)
+                data = sorted(raw.parse().data, key=lambda d: d.index)
+                return [d.embedding for d in data]
+            except openai.APIStatusError as e:
+                status, headers = e.status_code, e.response.headers
+                if status != 429 and status < 500:
+                    raise
+                self.limits.update(headers)
+            except openai.APIConnectionError:
+                pass
+            finally:
+                await self._release()
+            if attempt == self.max_retries:
+                break
+            if status == 429:
+                self.limit = max(1, self.limit // 2)
+            delay = retry_after(headers) or self.base_delay * 2**attempt * (0.5 + random.random())
+            self.retries += 1
+            log_json("embed_retry", attempt=attempt + 1, status=status, delay=round(delay, 2),
+                     inflight_limit=self.limit)
+            await asyncio.sleep(delay)
+        raise RuntimeError(f"embedding batch failed after {self.max_retries} retries")
+
+    async def run(self, batches: Sequence[Batch],
+                  on_batch: Callable[[int, List[List[float]]], None]) -> None:
+        """
+        Embed every batch, calling ``on_batch(i, vectors)`` strictly in order.
+        At most ``4 × inflight`` batches are dispatched ahead of the oldest
+        unfinished one, which bounds buffered results.
+        """
+        self._cond = asyncio.Condition()
+        done: Dict[int, List[List[float]]] = {}
+
+        async def one(i: int) -> None:
+            done[i] = await self.embed(*batches[i])
+
+        window = 4 * self.max_inflight
+        tasks: set = set()
+        nxt = sent = 0
+        try:
+            while nxt < len(batches):
+                while sent < len(batches) and sent < nxt + window:
+                    tasks.add(asyncio.ensure_future(one(sent)))
+                    sent += 1
+                finished, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for t in finished:
+                    t.result()
+                while nxt in done:
+                    on_batch(nxt, done.pop(nxt))
+                    nxt += 1
+        finally:
+            for t in tasks:
+                t.cancel()
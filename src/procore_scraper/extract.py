@@ -0,0 +1,89 @@
+"""
+procore_scraper.extract – HTML → Markdown, one parse per page
+-------------------------------------------------------------
+The page is parsed once with lxml; the title is read from that tree, the
+boilerplate tags are dropped in place and the same tree is handed to
+Readability (which accepts an element and skips its own parse).
+``extract_page`` also reads the page language (see lang) off that tree,
+falling back to the extracted text.
+
+Everything here is a plain top-level function so it pickles cleanly into a
+``ProcessPoolExecutor`` worker.
+"""
+from __future__ import annotations
+from typing import Optional, Tuple
+import lxml.html
+import markdownify
+from readability import Document
+from procore_scraper import metrics
+from procore_scraper.lang import classify, from_markup
+
+BAD_TAGS = ("script", "style", "noscript", "iframe", "canvas", "svg",
+            "nav", "header", "footer", "form", "aside")
+MIN_MAIN_HTML = 180     # shorter Readability output → fall back to the raw page
+
+
+def parse(html: str) -> lxml.html.HtmlElement:
+    return lxml.html.document_fromstring(html.encode("utf-8", "replace"),
+                                         parser=lxml.html.HTMLParser(encoding="utf-8"))
+
+
+def title_of(doc: lxml.html.HtmlElement) -> str:
+    t = doc.find(".//title")
+    return (t.text or "").strip() if t is not None else ""
+
+
+def strip_tree(doc: lxml.html.HtmlElement) -> lxml.html.HtmlElement:
+    for bad in list(doc.iter(*BAD_TAGS)):
+        bad.drop_tree()
+    return doc
+
+
+@metrics.timed("strip_tags")
+def strip_tags(html: str) -> str:
+    return lxml.html.tostring(strip_tree(parse(html)), encoding="unicode")
+
+
+def one_line(md: str, n: int = 160) -> str:
+    return " ".join(md.split())[:n]
+
+
+def _markdown(doc: lxml.html.HtmlElement, html: str) -> str:
+    with metrics.timer("readability"):
+        main_html = Document(strip_tree(doc)).summary(html_partial=True)
+    if len(main_html) < MIN_MAIN_HTML:
+        main_html = html
+    with metrics.timer("markdownify"):
+        return markdownify.markdownify(main_html, heading_style="ATX")
+
+
+def extract(html: str) -> Tuple[str, str]:
+    """Return (title, markdown) for one raw HTML page."""
+    if not html.strip():
+        return "", ""
+    doc = parse(html)
+    return title_of(doc), _markdown(doc, html)
+
+
+def extract_page(html: str, url: Optional[str] = None) -> Tuple[str, str, Optional[str], str]:
+    """(title, markdown, language, language source) for one raw HTML page."""
+    if not html.strip():
+        return "", "", None, "empty"
+    doc = parse(html)
+    title = title_of(doc)
+    lang, source = from_markup(doc, url)       # before Readability rewrites the tree
+    md = _markdown(doc, html)
+    if lang is None:
+        lang, source = classify(None, url, md)
+    return title, md, lang, source
+
+
+def page_lang(html: str, url: Optional[str] = None) -> Tuple[Optional[str], str]:
+    """Language of an already-scraped page: markup and URL first, extraction only if needed."""
+    if not html.strip():
+        return None, "empty"
+    doc = parse(html)
+    lang, source = classify(doc, url, "")
+    if lang is None:
+        lang, source = classify(None, None, _markdown(doc, html))
+    return lang, source
@@ -0,0 +1,130 @@
+"""
+procore_scraper.lang – page language from markup, URL, then text
+----------------------------------------------------------------
+Cheapest evidence first; the first signal that names a language wins:
+
+1. ``<link rel="alternate" hreflang>`` pointing at the page itself
+2. ``<html lang>`` (or ``<meta http-equiv="content-language">``)
+3. a locale in the URL – ``/fr-ca/…``, ``es.procore.com``, ``?lang=de``
+4. the extracted text: writing system for CJK / Cyrillic / …, otherwise
+   stopword counts for the Latin-script languages Procore publishes in
+5. ``langdetect`` (seeded, so repeatable) when the stopword vote is too close
+
+Only the primary subtag is kept (``en-US`` → ``en``). ``classify`` returns
+``(lang, source)``; ``source`` names the signal that decided.
+"""
+from __future__ import annotations
+import re, urllib.parse
+from collections import Counter
+from typing import Optional, Tuple
+import lxml.html
+from procore_scraper.utils import canonicalize
+
+# locales a path segment or subdomain may name (ambiguous codes like id/my left out)
+LOCALES = frozenset("en es fr de pt it nl ja zh ko ru pl sv da fi nb no tr cs hu ro ar he th vi uk el".split())
+_LOCALE_RE = re.compile(r"^([a-z]{2})(?:[-_][a-z]{2,4})?$")
+_WORD_RE   = re.compile(r"[a-zà-öø-ÿ]+")
+TEXT_CHARS = 5000       # classifier only looks at the start of the page
+MIN_WORDS  = 20         # below this, langdetect is a coin toss
+
+STOPWORDS = {
+    "en": "the and of to in is for that with on are this you be by as from or can your".split(),
+    "es": "el la de que y en los las del por para con una un es se al como más su".split(),
+    "fr": "le la les de des et en un une du pour est que dans sur avec par au vous pas".split(),
+    "de": "der die das und den von zu mit ist für auf dem nicht ein eine sie im werden sich".split(),
+    "pt": "o a de que e do da em um uma para com os no na não por mais as dos".split(),
+    "it": "il di che la e per un una del della in con non sono le si al gli dei".split(),
+    "nl": "de het een van en in is op te dat voor met zijn niet aan er ook als".split(),
+}
+_VOTES: dict = {}
+for _lang, _words in STOPWORDS.items():
+    for _w in _words:
+        _VOTES.setdefault(_w, []).append(_lang)
+
+SCRIPTS = (("ja", re.compile(r"[぀-ヿ]")),          # kana before Han: Japanese uses both
+           ("ko", re.compile(r"[가-힯]")),
+           ("zh", re.compile(r"[一-鿿]")),
+           ("ru", re.compile(r"[Ѐ-ӿ]")),
+           ("ar", re.compile(r"[؀-ۿ]")),
+           ("he", re.compile(r"[֐-׿]")),
+           ("th", re.compile(r"[฀-๿]")),
+           ("el", re.compile(r"[Ͱ-Ͽ]")))
+
+
+def primary(tag: Optional[str]) -> Optional[str]:
+    tag = (tag or "").strip().lower().replace("_", "-")
+    p = tag.split("-", 1)[0]
+    return p if re.fullmatch(r"[a-z]{2,3}", p) else None
+
+
+# ------------------------------------------------------------------- #
+# Signals
+# ------------------------------------------------------------------- #
+def from_markup(doc: lxml.html.HtmlElement, url: Optional[str] = None) -> Tuple[Optional[str], str]:
+    if url:
+        canon = canonicalize(url)
+        for link in doc.iterfind(".//link[@hreflang]"):
+            href = link.get("href") or ""
+            if link.get("hreflang") != "x-default" and href and canonicalize(urllib.parse.urljoin(url, href)) == canon:
+                if (lang := primary(link.get("hreflang"))):
+                    return lang, "hreflang"
+    if (lang := primary(doc.get("lang") or doc.get("{http://www.w3.org/XML/1998/namespace}lang"))):
+        return lang, "html_lang"
+    for meta in doc.iterfind(".//meta[@http-equiv]"):
+        if meta.get("http-equiv", "").lower() == "content-language":
+            if (lang := primary(meta.get("content"))):
+                return lang, "content_language"
+    return None, ""
+
+
+def from_url(url: str) -> Optional[str]:
+    parts = urllib.parse.urlsplit(url.lower())
+    q = urllib.parse.parse_qs(parts.query)
+    for key in ("lang", "locale", "hl"):
+        if key in q and (lang := primary(q[key][0])) in LOCALES:
+            return lang
+    seg = parts.path.strip("/").split("/", 1)[0]
+    host = (parts.hostname or "").split(".", 1)[0]
+    for cand in (seg, host):
+        m = _LOCALE_RE.match(cand)
+        if m and m.group(1) in LOCALES:
+            return m.group(1)
+    return None
+
+
+def from_text(text: str) -> Tuple[Optional[str], str]:
+    text = text[:TEXT_CHARS]
+    for lang, pat in SCRIPTS:
+        if len(pat.findall(text)) >= 20:
+            return lang, "script"
+    words = _WORD_RE.findall(text.lower())
+    votes: Counter = Counter()
+    for w in words:
+        for lang in _VOTES.get(w, ()):
+            votes[lang] += 1
+    ranked = votes.most_common(2)
+    if ranked and ranked[0][1] >= 5 and (len(ranked) == 1 or ranked[0][1] >= 2 * ranked[1][1]):
+        return ranked[0][0], "stopwords"
+    if len(words) < MIN_WORDS:                 # too little text for a statistical guess
+        return (ranked[0][0], "stopwords") if ranked else (None, "unknown")
+    try:
+        from langdetect import DetectorFactory, detect, LangDetectException
+    except ImportError:
+        return (ranked[0][0], "stopwords") if ranked else (None, "unknown")
+    DetectorFactory.seed = 0
+    try:
+        return primary(detect(text)), "langdetect"
+    except LangDetectException:
+        return None, "unknown"
+
+
+# ------------------------------------------------------------------- #
+def classify(doc: Optional[lxml.html.HtmlElement], url: Optional[str], text: str) -> Tuple[Optional[str], str]:
+    """(language, deciding signal) for one page; `text` is its extracted Markdown."""
+    if doc is not None:
+        lang, source = from_markup(doc, url)
+        if lang:
+            return lang, source
+    if url and (lang := from_url(url)):
+        return lang, "url"
+    return from_text(text)
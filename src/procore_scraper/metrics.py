@@ -0,0 +1,315 @@
+"""
+procore_scraper.metrics – timers, counters and RSS for the pipeline stages
+--------------------------------------------------------------------------
+Off unless a CLI passes ``--metrics [PATH]`` (see ``configure``) or
+``PROCORE_METRICS=1`` is set. While off, ``timed`` / ``timer`` cost one
+flag check and ``count`` / ``observe`` return immediately.
+
+* ``timed(name)`` / ``timer(name)`` – durations into a histogram
+  (log₂ buckets from 0.5 ms); works on sync and async functions.
+* ``count(name, n)`` – counters (pages, bytes, tokens …).
+* ``stage(name)`` – wall / CPU time, RSS at start, end and sampled peak, and
+  what every timer and counter did in between. Logged as ``stage_metrics``.
+
+Hot spots timed in the pipeline: ``fetch``, ``strip_tags``, ``readability``
+(``Document.summary``), ``markdownify``, ``safe_split``, ``split_doc``,
+``minhash``, ``embed_request`` (one embeddings API call in
+EmbeddingScheduler – the path every embedding takes), ``faiss_train``,
+``faiss_add`` and ``faiss_write``.
+* ``finish()`` – logs a ``metrics`` summary and writes the report to PATH:
+  Prometheus textfile format for ``*.prom``, JSON otherwise.
+
+Process-pool workers (extraction, chunking) – forked, spawned or from a
+forkserver – inherit the switch and the configuring process's pid through
+the environment and spill their numbers to a spool directory when they exit;
+the parent folds them in, so ``strip_tags`` or ``_safe_split`` timings are
+not lost in the workers.
+"""
+from __future__ import annotations
+import functools, inspect, json, os, pathlib, resource, tempfile, threading, time
+from typing import Any, Callable, Dict, List, Optional
+from procore_scraper.utils import log_json
+
+ENV, SPOOL_ENV, OWNER_ENV = "PROCORE_METRICS", "PROCORE_METRICS_SPOOL", "PROCORE_METRICS_OWNER"
+BOUNDS = [0.0005 * 2**i for i in range(20)]            # 0.5 ms … ~4.4 min
+SAMPLE_S = 0.25
+
+_on = os.environ.get(ENV) == "1"
+_out: Optional[str] = None
+# pid whose numbers live here; a spawned worker re-imports us under its own pid, so compare with the owner's
+_pid = os.getpid() if os.environ.get(OWNER_ENV, str(os.getpid())) == str(os.getpid()) else -1
+_lock = threading.Lock()
+_hists: Dict[str, dict] = {}
+_counts: Dict[str, float] = {}
+_peaks: Dict[str, int] = {}            # active stage → peak RSS seen by the sampler
+_stages: List[dict] = []
+_sampler: Optional[threading.Thread] = None
+
+
+def enabled() -> bool:
+    return _on
+
+
+# ------------------------------------------------------------------- #
+# Memory
+# ------------------------------------------------------------------- #
+def rss() -> int:
+    """Current resident set size in bytes (peak so far where /proc is missing)."""
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+def _sample() -> None:
+    while _on:
+        cur = rss()
+        with _lock:
+            for name, peak in _peaks.items():
+                if cur > peak:
+                    _peaks[name] = cur
+        time.sleep(SAMPLE_S)
+
+
+# ------------------------------------------------------------------- #
+# Recording
+# ------------------------------------------------------------------- #
+def _local() -> None:
+    """First record in a pool worker: drop any inherited (forked) numbers, spill ours at exit."""
+    global _pid
+    if os.getpid() != _pid:
+        import multiprocessing.util
+        _pid = os.getpid()
+        _hists.clear()
+        _counts.clear()
+        _peaks.clear()
+        _stages.clear()
+        multiprocessing.util.Finalize(None, _spill, exitpriority=100)
+
+
+def _spill() -> None:
+    spool = os.environ.get(SPOOL_ENV)
+    if spool and (_hists or _counts):
+        path = pathlib.Path(spool) / f"{os.getpid()}.json"
+        path.write_text(json.dumps({"hists": _hists, "counts": _counts}))
+
+
+def count(name: str, n: float = 1) -> None:
+    if not _on:
+        return
+    if os.getpid() != _pid:
+        _local()
+    with _lock:
+        _counts[name] = _counts.get(name, 0) + n
+
+
+def observe(name: str, seconds: float) -> None:
+    if not _on:
+        return
+    if os.getpid() != _pid:
+        _local()
+    with _lock:
+        h = _hists.get(name)
+        if h is None:
+            h = _hists[name] = {"n": 0, "sum": 0.0, "max": 0.0, "buckets": [0] * (len(BOUNDS) + 1)}
+        h["n"] += 1
+        h["sum"] += seconds
+        h["max"] = max(h["max"], seconds)
+        i = 0
+        while i < len(BOUNDS) and seconds > BOUNDS[i]:
+            i += 1
+        h["buckets"][i] += 1
+
+
+class timer:
+    """``with timer("faiss_add"): ...`` – records nothing while metrics are off."""
+    __slots__ = ("name", "t0")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self) -> "timer":
+        self.t0 = time.perf_counter() if _on else 0.0
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if _on and self.t0:
+            observe(self.name, time.perf_counter() - self.t0)
+
+
+def timed(name: str) -> Callable:
+    """Decorator form of ``timer`` for sync and async functions."""
+    def wrap(fn: Callable) -> Callable:
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*a, **kw):
+                if not _on:
+                    return await fn(*a, **kw)
+                t0 = time.perf_counter()
+                try:
+                    return await fn(*a, **kw)
+                finally:
+                    observe(name, time.perf_counter() - t0)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*a, **kw):
+            if not _on:
+                return fn(*a, **kw)
+            t0 = time.perf_counter()
+            try:
+                return fn(*a, **kw)
+            finally:
+                observe(name, time.perf_counter() - t0)
+        return wrapper
+    return wrap
+
+
+# ------------------------------------------------------------------- #
+# Aggregation
+# ------------------------------------------------------------------- #
+def snapshot() -> Dict[str, Any]:
+    """This process's numbers plus everything pool workers have spilled so far."""
+    with _lock:
+        hists = {k: dict(v, buckets=list(v["buckets"])) for k, v in _hists.items()}
+        counts = dict(_counts)
+    spool = os.environ.get(SPOOL_ENV)
+    for path in sorted(pathlib.Path(spool).glob("*.json")) if spool else ():
+        try:
+            other = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        for k, v in other["counts"].items():
+            counts[k] = counts.get(k, 0) + v
+        for k, v in other["hists"].items():
+            h = hists.setdefault(k, {"n": 0, "sum": 0.0, "max": 0.0, "buckets": [0] * (len(BOUNDS) + 1)})
+            h["n"] += v["n"]
+            h["sum"] += v["sum"]
+            h["max"] = max(h["max"], v["max"])
+            h["buckets"] = [a + b for a, b in zip(h["buckets"], v["buckets"])]
+    return {"hists": hists, "counts": counts}
+
+
+def quantile(h: dict, q: float) -> float:
+    """Upper bucket bound below which a fraction `q` of observations fall."""
+    need, seen = q * h["n"], 0
+    for i, c in enumerate(h["buckets"]):
+        seen += c
+        if seen >= need and c:
+            return min(BOUNDS[i], h["max"]) if i < len(BOUNDS) else h["max"]
+    return h["max"]
+
+
+def summary(snap: Dict[str, Any]) -> Dict[str, dict]:
+    return {k: {"n": h["n"], "total_s": round(h["sum"], 3), "mean_ms": round(1e3 * h["sum"] / h["n"], 2),
+                "p50_ms": round(1e3 * quantile(h, 0.5), 2), "p95_ms": round(1e3 * quantile(h, 0.95), 2),
+                "max_ms": round(1e3 * h["max"], 2)}
+            for k, h in sorted(snap["hists"].items()) if h["n"]}
+
+
+class stage:
+    """
+    ``with stage("chunk") as st: ...; st["items"] = n`` – wall / CPU / RSS
+    for the block plus the timer and counter deltas it caused. Extra keys set
+    on ``st`` are logged with it.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.fields: Dict[str, Any] = {}
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self.fields[key] = value
+
+    def __enter__(self) -> "stage":
+        if _on:
+            self.t0, self.c0, self.r0 = time.perf_counter(), time.process_time(), rss()
+            self.before = snapshot()
+            with _lock:
+                _peaks[self.name] = self.r0
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if not _on:
+            return
+        after, r1 = snapshot(), rss()
+        with _lock:
+            peak = max(_peaks.pop(self.name, r1), r1)
+        timers = {}
+        for k, h in after["hists"].items():
+            b = self.before["hists"].get(k, {"n": 0, "sum": 0.0})
+            if h["n"] > b["n"]:
+                timers[k] = {"n": h["n"] - b["n"], "total_s": round(h["sum"] - b["sum"], 3)}
+        counts = {k: v - self.before["counts"].get(k, 0) for k, v in after["counts"].items()
+                  if v != self.before["counts"].get(k, 0)}
+        rec = dict(stage=self.name, wall_s=round(time.perf_counter() - self.t0, 3),
+                   cpu_s=round(time.process_time() - self.c0, 3), rss_start_mb=round(self.r0 / 2**20, 1),
+                   rss_peak_mb=round(peak / 2**20, 1), rss_end_mb=round(r1 / 2**20, 1),
+                   **self.fields, timers=timers, counts=counts)
+        _stages.append(rec)
+        log_json("stage_metrics", **rec)
+
+
+# ------------------------------------------------------------------- #
+# Switch / report
+# ------------------------------------------------------------------- #
+def configure(out: Optional[str]) -> None:
+    """
+    Turn metrics on when `out` is not None (``""`` = log only) or
+    $PROCORE_METRICS=1. Pool workers started afterwards inherit the switch.
+    """
+    global _on, _out, _pid, _sampler
+    if out is None and not _on:
+        return
+    _on, _out = True, out or None
+    _pid = os.getpid()
+    os.environ[ENV] = "1"
+    os.environ[OWNER_ENV] = str(_pid)
+    os.environ.setdefault(SPOOL_ENV, tempfile.mkdtemp(prefix="procore-metrics-"))
+    if _sampler is None:
+        _sampler = threading.Thread(target=_sample, name="rss-sampler", daemon=True)
+        _sampler.start()
+
+
+def _prometheus(snap: Dict[str, Any], peak_rss: int, child_rss: int) -> str:
+    lines: List[str] = []
+    for k, h in sorted(snap["hists"].items()):
+        m = "procore_" + k.replace(".", "_").replace("-", "_") + "_seconds"
+        lines += [f"# TYPE {m} histogram"]
+        cum = 0
+        for bound, c in zip(BOUNDS, h["buckets"]):
+            cum += c
+            lines.append(f'{m}_bucket{{le="{bound:g}"}} {cum}')
+        lines += [f'{m}_bucket{{le="+Inf"}} {h["n"]}', f"{m}_sum {h['sum']:.6f}", f"{m}_count {h['n']}"]
+    for k, v in sorted(snap["counts"].items()):
+        m = "procore_" + k.replace(".", "_").replace("-", "_") + "_total"
+        lines += [f"# TYPE {m} counter", f"{m} {v:g}"]
+    lines.append("# TYPE procore_stage_wall_seconds gauge")
+    lines += [f'procore_stage_wall_seconds{{stage="{s["stage"]}"}} {s["wall_s"]}' for s in _stages]
+    lines.append("# TYPE procore_stage_rss_peak_bytes gauge")
+    lines += [f'procore_stage_rss_peak_bytes{{stage="{s["stage"]}"}} {int(s["rss_peak_mb"] * 2**20)}'
+              for s in _stages]
+    lines += ["# TYPE procore_peak_rss_bytes gauge", f"procore_peak_rss_bytes {peak_rss}",
+              "# TYPE procore_children_peak_rss_bytes gauge", f"procore_children_peak_rss_bytes {child_rss}"]
+    return "\n".join(lines) + "\n"
+
+
+def finish() -> Optional[Dict[str, Any]]:
+    """Log the run's summary and write the report, if metrics are on."""
+    if not _on:
+        return None
+    snap = snapshot()
+    scale = 1 if os.uname().sysname == "Darwin" else 1024
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    child = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+    report = {"timers": summary(snap), "counts": snap["counts"], "stages": list(_stages),
+              "peak_rss_mb": round(peak / 2**20, 1), "children_peak_rss_mb": round(child / 2**20, 1)}
+    log_json("metrics", **report)
+    if _out:
+        text = _prometheus(snap, peak, child) if _out.endswith(".prom") else json.dumps(report, indent=2)
+        tmp = pathlib.Path(_out + ".tmp")
+        tmp.write_text(text)
+        os.replace(tmp, _out)                 # textfile collectors must never see a partial file
+    return report
@@ -0,0 +1,182 @@
+"""
+procore_scraper.neardup – near-duplicate pages via MinHash + LSH
+----------------------------------------------------------------
+Locale variants, versioned docs and the same article on two Procore sites
+differ in a few lines of boilerplate. Each page is reduced to a MinHash
+signature over word shingles; pages whose estimated Jaccard similarity
+reaches ``threshold`` form a cluster around one canonical page.
+
+* ``perms`` multiply-shift hashes over 64-bit shingle hashes, vectorised
+  with numpy.
+* LSH: the signature is cut into ``bands`` bands. Two pages become
+  candidates when any band matches exactly, which is one primary-key lookup
+  per band, so inserting a page costs the same however large the corpus is.
+  Candidates are then verified on the full signature.
+* Clusters are stars: every duplicate is similar to the canonical itself,
+  not just to some other member. The first page seen stays canonical. When
+  a canonical changes or disappears, its members are re-assigned.
+
+Everything lives in one SQLite file next to the chunk manifest::
+
+    sig   (doc → signature)                    NULL for pages with no text
+    band  (band, bucket, doc)                  WITHOUT ROWID
+    dup   (doc → canonical, similarity)
+"""
+from __future__ import annotations
+import hashlib, json, pathlib, re, sqlite3, zlib
+from typing import Dict, Iterable, List, Optional, Set
+import numpy as np
+from procore_scraper import metrics
+
+_WORD_RE = re.compile(r"\w+")
+_BLOCK   = 4096          # shingles hashed per numpy block
+
+
+class NearDupIndex:
+    def __init__(self, path: pathlib.Path, threshold: float = 0.85, shingle: int = 5,
+                 perms: int = 128, bands: int = 16, seed: int = 1):
+        if perms % bands:
+            raise ValueError(f"bands={bands} must divide perms={perms}")
+        self.threshold, self.shingle, self.perms, self.bands = threshold, shingle, perms, bands
+        self.rows = perms // bands
+        rng = np.random.default_rng(seed)
+        self._a = (rng.integers(1, 2**63, perms, dtype=np.uint64) << np.uint64(1)) | np.uint64(1)
+        self._b = rng.integers(0, 2**63, perms, dtype=np.uint64)
+        self.db = sqlite3.connect(str(path))
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(
+            "CREATE TABLE IF NOT EXISTS params (k TEXT PRIMARY KEY, v TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS sig (doc TEXT PRIMARY KEY, sig BLOB);"
+            "CREATE TABLE IF NOT EXISTS band (band INT NOT NULL, bucket BLOB NOT NULL, doc TEXT NOT NULL,"
+            " PRIMARY KEY (band, bucket, doc)) WITHOUT ROWID;"
+            "CREATE INDEX IF NOT EXISTS band_doc ON band (doc);"
+            "CREATE TABLE IF NOT EXISTS dup (doc TEXT PRIMARY KEY, canonical TEXT NOT NULL, sim REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS dup_canonical ON dup (canonical);"
+        )
+        params = json.dumps({"shingle": shingle, "perms": perms, "bands": bands, "seed": seed,
+                             "threshold": threshold})
+        row = self.db.execute("SELECT v FROM params WHERE k='params'").fetchone()
+        if row is None or row[0] != params:              # signatures from other settings don't compare
+            with self.db:
+                self.db.executescript("DELETE FROM sig; DELETE FROM band; DELETE FROM dup;")
+                self.db.execute("INSERT OR REPLACE INTO params (k, v) VALUES ('params', ?)", (params,))
+
+    # ------------------------------------------------------------------ #
+    # Signatures
+    # ------------------------------------------------------------------ #
+    @metrics.timed("minhash")
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """uint32 MinHash of `text`'s word shingles (None when there are no words)."""
+        words = _WORD_RE.findall(text.lower())
+        if not words:
+            return None
+        ids = np.fromiter((zlib.crc32(w.encode()) for w in words), dtype=np.uint64, count=len(words))
+        k = min(self.shingle, len(ids))
+        n = len(ids) - k + 1
+        h = np.zeros(n, dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            for j in range(k):
+                h = h * np.uint64(0x100000001B3) + ids[j : j + n]
+            h = np.unique(h)
+            sig = np.full(self.perms, np.iinfo(np.uint64).max, dtype=np.uint64)
+            for i in range(0, len(h), _BLOCK):
+                x = h[i : i + _BLOCK]
+                np.minimum(sig, (self._a[:, None] * x[None, :] + self._b[:, None]).min(axis=1), out=sig)
+        return (sig >> np.uint64(32)).astype(np.uint32)
+
+    @staticmethod
+    def similarity(a: np.ndarray, b: np.ndarray) -> float:
+        return float(np.mean(a == b))
+
+    def _buckets(self, sig: np.ndarray) -> List[bytes]:
+        r = self.rows
+        return [hashlib.blake2b(sig[i * r : (i + 1) * r].tobytes(), digest_size=8).digest()
+                for i in range(self.bands)]
+
+    def _sig(self, doc: str) -> Optional[np.ndarray]:
+        row = self.db.execute("SELECT sig FROM sig WHERE doc=?", (doc,)).fetchone()
+        return None if row is None or row[0] is None else np.frombuffer(row[0], dtype=np.uint32)
+
+    # ------------------------------------------------------------------ #
+    # Queries
+    # ------------------------------------------------------------------ #
+    def docs(self) -> Set[str]:
+        return {d for (d,) in self.db.execute("SELECT doc FROM sig")}
+
+    def duplicates(self) -> Dict[str, str]:
+        """{duplicate: canonical} for every clustered page."""
+        return dict(self.db.execute("SELECT doc, canonical FROM dup"))
+
+    def candidates(self, sig: np.ndarray) -> Set[str]:
+        out: Set[str] = set()
+        for band, bucket in enumerate(self._buckets(sig)):
+            out.update(d for (d,) in self.db.execute(
+                "SELECT doc FROM band WHERE band=? AND bucket=?", (band, bucket)))
+        return out
+
+    # ------------------------------------------------------------------ #
+    # Updates
+    # ------------------------------------------------------------------ #
+    def _assign(self, doc: str, sig: np.ndarray, skip: Set[str]) -> None:
+        """
+        Attach `doc` to the most similar canonical of its LSH candidates, if
+        close enough. Pages in `skip` (not placed yet) are neither canonicals
+        nor members, and a canonical must not itself be a duplicate – so
+        clusters stay stars and never form cycles.
+        """
+        best, best_sim = None, self.threshold
+        for cand in self.candidates(sig) - {doc} - skip:
+            row = self.db.execute("SELECT canonical FROM dup WHERE doc=?", (cand,)).fetchone()
+            canon = row[0] if row else cand
+            if canon == doc or canon in skip or \
+                    self.db.execute("SELECT 1 FROM dup WHERE doc=?", (canon,)).fetchone() is not None:
+                continue
+            other = self._sig(canon)
+            sim = self.similarity(sig, other) if other is not None else 0.0
+            if sim >= best_sim and (best is None or sim > best_sim or canon < best):
+                best, best_sim = canon, sim
+        if best is not None:
+            self.db.execute("INSERT OR REPLACE INTO dup (doc, canonical, sim) VALUES (?, ?, ?)",
+                            (doc, best, round(best_sim, 4)))
+
+    def _remove(self, doc: str) -> List[str]:
+        """Forget `doc`; returns the pages that were clustered under it (now unassigned)."""
+        members = [d for (d,) in self.db.execute("SELECT doc FROM dup WHERE canonical=?", (doc,))]
+        self.db.execute("DELETE FROM dup WHERE canonical=? OR doc=?", (doc, doc))
+        self.db.execute("DELETE FROM band WHERE doc=?", (doc,))
+        self.db.execute("DELETE FROM sig WHERE doc=?", (doc,))
+        return members
+
+    def update(self, texts: Dict[str, str], drop: Iterable[str] = ()) -> None:
+        """
+        (Re-)insert `texts` (doc → current text) and forget `drop`, in one
+        transaction. Pages orphaned by a changed or removed canonical are
+        re-assigned first, in doc order; then new pages, in doc order.
+        """
+        with self.db:
+            orphans: Set[str] = set()
+            for doc in set(drop) | texts.keys():
+                orphans.update(self._remove(doc))
+            orphans -= set(drop) | texts.keys()
+            sigs = {doc: self.signature(text) for doc, text in texts.items()}
+            pending = set(sigs)
+            unplaced = set(orphans)              # the first orphan left over becomes the new canonical
+            for doc in sorted(orphans):
+                unplaced.discard(doc)
+                sig = self._sig(doc)
+                if sig is not None:
+                    self._assign(doc, sig, pending | unplaced)
+            for doc in sorted(sigs):
+                sig = sigs[doc]
+                pending.discard(doc)
+                self.db.execute("INSERT INTO sig (doc, sig) VALUES (?, ?)",
+                                (doc, None if sig is None else sig.tobytes()))
+                if sig is None:
+                    continue
+                self._assign(doc, sig, pending)
+                self.db.executemany("INSERT INTO band (band, bucket, doc) VALUES (?, ?, ?)",
+                                    ((b, k, doc) for b, k in enumerate(self._buckets(sig))))
+
+    def close(self) -> None:
+        self.db.close()
@@ -0,0 +1,191 @@
+"""
+procore_scraper.payload – sharded, incremental OpenAI vector-store payload
+--------------------------------------------------------------------------
+The corpus goes to ``data/payload/`` as JSON Lines shards of bounded size,
+one ``{"text", "metadata": {sha1, filename, tokens}}`` object per line, plus
+``shards.json`` listing them.
+
+* Token counts come from the chunk manifest (see chunk_cache) for every file
+  it has seen at its current stat; only the rest is tokenized.
+* Shard boundaries are content-defined: documents are taken in stem order
+  and a shard ends after a stem whose hash hits 1 in ``avg_docs`` (or before
+  a document that would push it past ``max_bytes``). Adding, editing or
+  removing a page changes its own shard, not every shard after it.
+* A shard's key is the sha1 over its (stem, content sha1) pairs and its file
+  is named after the key, so an unchanged shard is neither read nor
+  rewritten.
+
+``sync_vector_store`` pushes the difference to an OpenAI vector store: new
+shards are uploaded concurrently and attached in file batches, then shards
+that left the payload are detached and deleted. ``uploaded.json`` records
+which file id backs which shard.
+"""
+from __future__ import annotations
+import asyncio, hashlib, json, os, pathlib
+from typing import Dict, List, Optional, Tuple
+import openai
+from procore_scraper import splitters
+from procore_scraper.chunk_cache import ChunkManifest
+from procore_scraper.utils import log_json, sha1_text
+
+MAX_SHARD_BYTES = 4_000_000
+AVG_SHARD_DOCS  = 64
+BATCH_FILES     = 500           # file ids per vector-store file batch
+
+Doc = Tuple[str, int, str, Optional[int]]      # (stem, bytes, content sha1, tokens | None)
+
+
+def _read_json(path: pathlib.Path) -> dict:
+    return json.loads(path.read_text()) if path.exists() else {}
+
+
+def _write_json(path: pathlib.Path, obj: dict) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(obj, indent=1))
+    os.replace(tmp, path)
+
+
+# ------------------------------------------------------------------- #
+# Build
+# ------------------------------------------------------------------- #
+def scan(md_dir: pathlib.Path, manifest: ChunkManifest) -> List[Doc]:
+    """Every Markdown file in stem order; files the manifest knows are not opened."""
+    docs: List[Doc] = []
+    for p in sorted(md_dir.glob("*.md")):
+        e = manifest.docs.get(p.stem)
+        if e is not None and "doc_tokens" in e and manifest.is_fresh(p):
+            docs.append((p.stem, e["size"], e["sha1"], e["doc_tokens"]))
+        else:
+            docs.append((p.stem, p.stat().st_size, sha1_text(p.read_text()), None))
+    return docs
+
+
+def _cut(stem: str, avg_docs: int) -> bool:
+    return int(hashlib.sha1(stem.encode()).hexdigest()[:8], 16) % avg_docs == 0
+
+
+def plan_shards(docs: List[Doc], max_bytes: int = MAX_SHARD_BYTES,
+                avg_docs: int = AVG_SHARD_DOCS) -> List[List[Doc]]:
+    """Split stem-ordered `docs` at content-defined boundaries, ≤ ~max_bytes each."""
+    shards: List[List[Doc]] = []
+    cur: List[Doc] = []
+    size = 0
+    for d in docs:
+        if cur and size + d[1] > max_bytes:
+            shards.append(cur)
+            cur, size = [], 0
+        cur.append(d)
+        size += d[1]
+        if _cut(d[0], avg_docs):
+            shards.append(cur)
+            cur, size = [], 0
+    if cur:
+        shards.append(cur)
+    return shards
+
+
+def shard_key(docs: List[Doc]) -> str:
+    return hashlib.sha1("".join(f"{stem}\0{sha1}\n" for stem, _, sha1, _ in docs).encode()).hexdigest()
+
+
+def _write_shard(path: pathlib.Path, md_dir: pathlib.Path, docs: List[Doc]) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("w", encoding="utf-8") as fh:
+        for stem, _, sha1, tokens in docs:
+            text = (md_dir / f"{stem}.md").read_text()
+            if tokens is None:
+                tokens = len(splitters.enc.encode(text))
+            fh.write(json.dumps({"text": text, "metadata": {"sha1": sha1, "filename": f"{stem}.md",
+                                                            "tokens": tokens}}, ensure_ascii=False))
+            fh.write("\n")
+    os.replace(tmp, path)
+
+
+def build(md_dir: pathlib.Path, out_dir: pathlib.Path, manifest: ChunkManifest,
+          max_bytes: int = MAX_SHARD_BYTES, avg_docs: int = AVG_SHARD_DOCS) -> Tuple[List[dict], List[str]]:
+    """
+    Bring `out_dir` in line with `md_dir`. Returns (all shards as listed in
+    shards.json, names of the shards written this run).
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    shards: List[dict] = []
+    written: List[str] = []
+    for group in plan_shards(scan(md_dir, manifest), max_bytes, avg_docs):
+        key = shard_key(group)
+        path = out_dir / f"{key[:16]}.jsonl"
+        if not path.exists():
+            _write_shard(path, md_dir, group)
+            written.append(path.name)
+        shards.append({"name": path.name, "sha1": key, "docs": len(group), "first": group[0][0],
+                       "last": group[-1][0], "bytes": path.stat().st_size})
+    _write_json(out_dir / "shards.json", {"shards": shards})
+    live = {s["name"] for s in shards}
+    for p in out_dir.glob("*.jsonl"):
+        if p.name not in live:
+            p.unlink()
+    return shards, written
+
+
+# ------------------------------------------------------------------- #
+# Upload
+# ------------------------------------------------------------------- #
+async def sync_vector_store(client: openai.AsyncOpenAI, out_dir: pathlib.Path,
+                            store_id: Optional[str] = None, name: str = "procore-docs",
+                            concurrency: int = 8) -> dict:
+    """
+    Make the vector store hold exactly the shards in ``shards.json``.
+    Uploads land in ``pending`` first and move to ``files`` once their batch
+    has been attached, so an interrupted run picks up where it stopped
+    instead of re-uploading or leaking files.
+    """
+    state_path = out_dir / "uploaded.json"
+    state = _read_json(state_path)
+    if store_id and state.get("vector_store_id") != store_id:
+        state = {"vector_store_id": store_id}
+    if not state.get("vector_store_id"):
+        vs = await client.vector_stores.create(name=name, metadata={"source": "procore"})
+        state = {"vector_store_id": vs.id}
+        log_json("vector_store_created", id=vs.id)
+    vs_id = state["vector_store_id"]
+    files: Dict[str, str] = state.setdefault("files", {})
+    pending: Dict[str, str] = state.setdefault("pending", {})
+    _write_json(state_path, state)
+
+    want = {s["name"] for s in _read_json(out_dir / "shards.json").get("shards", [])}
+    sem = asyncio.Semaphore(concurrency)
+
+    async def upload(shard: str) -> None:
+        async with sem:
+            # file_search takes .txt but not .jsonl; the content is the same
+            with (out_dir / shard).open("rb") as fh:
+                f = await client.files.create(file=(f"procore-{shard[:-6]}.txt", fh), purpose="assistants")
+        pending[shard] = f.id
+        _write_json(state_path, state)
+
+    async def drop(file_id: str, attached: bool) -> None:
+        async with sem:
+            try:
+                if attached:
+                    await client.vector_stores.files.delete(file_id, vector_store_id=vs_id)
+                await client.files.delete(file_id)
+            except openai.NotFoundError:
+                pass
+
+    await asyncio.gather(*(upload(s) for s in sorted(want - files.keys() - pending.keys())))
+    todo = sorted(s for s in pending if s in want)
+    for i in range(0, len(todo), BATCH_FILES):
+        names = todo[i : i + BATCH_FILES]
+        batch = await client.vector_stores.file_batches.create_and_poll(
+            vector_store_id=vs_id, file_ids=[pending[s] for s in names])
+        if batch.status != "completed" or batch.file_counts.failed:
+            raise RuntimeError(f"file batch {batch.id}: {batch.status}, {batch.file_counts.failed} failed")
+        for s in names:
+            files[s] = pending.pop(s)
+        _write_json(state_path, state)
+
+    gone = [(files.pop(s), True) for s in sorted(files.keys() - want)]
+    gone += [(pending.pop(s), False) for s in sorted(pending.keys() - want)]
+    await asyncio.gather(*(drop(f, attached) for f, attached in gone))
+    _write_json(state_path, state)
+    log_json("vector_store_synced", id=vs_id, uploaded=len(todo), removed=len(gone), shards=len(files))
+    return state
@@ -0,0 +1,270 @@
+"""
+procore_scraper.pipeline – stage DAG with per-item state in SQLite
+------------------------------------------------------------------
+A pipeline is a list of ``Stage``s, each naming the stages it consumes
+(``after``). Stages run concurrently as asyncio tasks joined by bounded
+queues: a page is chunked while the crawl is still fetching others, and a
+slow stage back-pressures the ones feeding it instead of buffering.
+
+The state file records every (stage, item key) outcome::
+
+    runs  (id → started, finished, status, summary)
+    items (stage, key → fp, status, output, error, run, ts)
+
+An item already ``done`` at the same fingerprint (``fp``, e.g. the content
+sha1 it was processed at) is skipped and its recorded output is passed on,
+so a re-run – or a resumed run after a crash – only does the missing work.
+Outcomes are committed after every batch. Output keys starting with ``_``
+(e.g. fetched HTML) are passed downstream but never stored.
+
+Stage kinds:
+
+* source  – ``source`` is an iterable of items; nothing is recorded.
+* items   – ``fn(batch) -> results``, up to ``batch`` items per call
+  (waiting at most ``linger`` s to fill one) and ``concurrency`` calls in
+  flight. Each result is the output dict, None (done, nothing to pass on)
+  or an Exception (failed; retried on the next run).
+* barrier – ``barrier=True``: ``fn`` is called once with everything that
+  arrived, after all upstream stages have finished (e.g. the index build).
+
+``finish()``, if given, runs after a stage's last item and before its
+consumers hear that their input is complete. ``fn`` and ``finish`` may be
+sync or async.
+"""
+from __future__ import annotations
+import asyncio, inspect, json, pathlib, sqlite3, time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from procore_scraper import metrics
+from procore_scraper.utils import log_json
+
+_END = object()
+STATS = ("processed", "skipped", "failed", "emitted")
+
+
+def _now() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+
+async def _maybe_await(value: Any) -> Any:
+    return await value if inspect.isawaitable(value) else value
+
+
+# ------------------------------------------------------------------- #
+# State
+# ------------------------------------------------------------------- #
+class PipelineState:
+    def __init__(self, path: pathlib.Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(path))
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(
+            "CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY AUTOINCREMENT, started TEXT NOT NULL,"
+            " finished TEXT, status TEXT, summary TEXT);"
+            "CREATE TABLE IF NOT EXISTS items (stage TEXT NOT NULL, key TEXT NOT NULL, fp TEXT NOT NULL,"
+            " status TEXT NOT NULL, output TEXT, error TEXT, run INT NOT NULL, ts TEXT NOT NULL,"
+            " PRIMARY KEY (stage, key)) WITHOUT ROWID;"
+        )
+        self.run: Optional[int] = None
+        self.resumed = False
+
+    def start(self, resume: bool = True) -> int:
+        """Open a run: the last one if it never finished (and `resume`), else a new one."""
+        row = self.db.execute("SELECT id, finished FROM runs ORDER BY id DESC LIMIT 1").fetchone()
+        with self.db:
+            if resume and row is not None and row[1] is None:
+                self.run, self.resumed = row[0], True
+            else:
+                if row is not None and row[1] is None:
+                    self.db.execute("UPDATE runs SET finished=?, status='abandoned' WHERE id=?", (_now(), row[0]))
+                self.run = self.db.execute("INSERT INTO runs (started) VALUES (?)", (_now(),)).lastrowid
+        return self.run
+
+    def finish(self, status: str, summary: Dict[str, dict]) -> None:
+        with self.db:
+            self.db.execute("UPDATE runs SET finished=?, status=?, summary=? WHERE id=?",
+                            (_now(), status, json.dumps(summary), self.run))
+
+    def done(self, stage: str, key: str, fp: str) -> Tuple[bool, Optional[dict]]:
+        """(True, recorded output) if `key` is done at `fp` in `stage`."""
+        row = self.db.execute("SELECT output FROM items WHERE stage=? AND key=? AND fp=? AND status='done'",
+                              (stage, key, fp)).fetchone()
+        if row is None:
+            return False, None
+        return True, json.loads(row[0]) if row[0] is not None else None
+
+    def record(self, stage: str, key: str, fp: str, result: Any) -> None:
+        if isinstance(result, BaseException):
+            status, output, error = "failed", None, f"{type(result).__name__}: {result}"
+        else:
+            status, error = "done", None
+            output = None if result is None else json.dumps({k: v for k, v in result.items()
+                                                             if not k.startswith("_")})
+        self.db.execute("INSERT OR REPLACE INTO items (stage, key, fp, status, output, error, run, ts)"
+                        " VALUES (?, ?, ?, ?, ?, ?, ?, ?)", (stage, key, fp, status, output, error, self.run, _now()))
+
+    def commit(self) -> None:
+        self.db.commit()
+
+    def failures(self, stage: str, limit: int = 10) -> List[Tuple[str, str]]:
+        return self.db.execute("SELECT key, error FROM items WHERE stage=? AND status='failed' AND run=?"
+                               " ORDER BY ts DESC LIMIT ?", (stage, self.run, limit)).fetchall()
+
+    def close(self) -> None:
+        self.db.close()
+
+
+# ------------------------------------------------------------------- #
+# Stages
+# ------------------------------------------------------------------- #
+class Stage:
+    def __init__(self, name: str, fn: Optional[Callable] = None, *, after: Sequence[str] = (),
+                 source: Optional[Iterable[dict]] = None,
+                 key: Callable[[dict], str] = lambda item: item["key"],
+                 fp: Callable[[dict], str] = lambda item: "",
+                 batch: int = 1, linger: float = 0.5, concurrency: int = 1,
+                 barrier: bool = False, finish: Optional[Callable] = None):
+        if (source is None) == (fn is None):
+            raise ValueError(f"stage {name!r} needs exactly one of fn / source")
+        if source is None and not after:
+            raise ValueError(f"stage {name!r} has no input")
+        self.name, self.fn, self.after, self.source = name, fn, tuple(after), source
+        self.key, self.fp = key, fp
+        self.batch, self.linger, self.concurrency = max(1, batch), linger, max(1, concurrency)
+        self.barrier, self.finish = barrier, finish
+
+
+def upstream(stages: Sequence[Stage], until: str) -> List[Stage]:
+    """`until` and every stage it depends on, in their original order."""
+    by_name = {s.name: s for s in stages}
+    if until not in by_name:
+        raise ValueError(f"unknown stage {until!r}; have {', '.join(by_name)}")
+    need, todo = set(), [until]
+    while todo:
+        name = todo.pop()
+        if name not in need:
+            need.add(name)
+            todo.extend(by_name[name].after)
+    return [s for s in stages if s.name in need]
+
+
+async def run(stages: Sequence[Stage], state: PipelineState, queue_size: int = 256) -> Dict[str, dict]:
+    """Run the DAG to completion; returns per-stage counters (+ busy seconds)."""
+    names = [s.name for s in stages]
+    consumers: Dict[str, List[str]] = {n: [] for n in names}
+    for s in stages:
+        for dep in s.after:
+            if dep not in consumers:
+                raise ValueError(f"stage {s.name!r} is after unknown stage {dep!r}")
+            if names.index(dep) >= names.index(s.name):
+                raise ValueError(f"stage {s.name!r} must come after {dep!r}")
+            consumers[dep].append(s.name)
+    queues = {s.name: asyncio.Queue(queue_size) for s in stages if s.after}
+    stats = {n: dict(dict.fromkeys(STATS, 0), busy_s=0.0) for n in names}
+
+    async def emit(stage: Stage, item: dict) -> None:
+        stats[stage.name]["emitted"] += 1
+        for c in consumers[stage.name]:
+            await queues[c].put(item)
+
+    async def call(stage: Stage, batch: List[dict], keys: List[Tuple[str, str]]) -> None:
+        st = stats[stage.name]
+        t0 = time.perf_counter()
+        try:
+            results = await _maybe_await(stage.fn(batch))
+            results = [results] if stage.barrier else list(results)
+            if len(results) != len(keys):
+                raise RuntimeError(f"{stage.name} returned {len(results)} results for {len(keys)} items")
+        except Exception as e:                   # the whole batch fails; the run goes on
+            log_json("stage_error", stage=stage.name, items=len(batch), error=f"{type(e).__name__}: {e}")
+            results = [e] * len(keys)
+        dt = time.perf_counter() - t0
+        st["busy_s"] += dt
+        metrics.observe(f"stage.{stage.name}", dt)
+        metrics.count(f"stage.{stage.name}.items", len(keys))
+        for (key, fp), res in zip(keys, results):
+            state.record(stage.name, key, fp, res)
+            if isinstance(res, BaseException):
+                st["failed"] += 1
+            else:
+                st["processed"] += 1
+        state.commit()
+        for res in results:
+            if isinstance(res, dict):
+                await emit(stage, res)
+
+    async def drive(stage: Stage) -> None:
+        st = stats[stage.name]
+        if stage.source is not None:
+            for item in stage.source:
+                await emit(stage, item)
+        else:
+            q, ends = queues[stage.name], 0
+            sem = asyncio.Semaphore(stage.concurrency)
+            tasks: set = set()
+            batch: List[dict] = []
+            keys: List[Tuple[str, str]] = []
+
+            async def launch() -> None:
+                nonlocal batch, keys
+                if not batch:
+                    return
+                await sem.acquire()                  # full: stop reading, upstream queues fill up
+                task = asyncio.ensure_future(call(stage, batch, keys))
+                task.add_done_callback(lambda _t: sem.release())
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                batch, keys = [], []
+
+            while ends < len(stage.after):
+                try:
+                    if batch and not stage.barrier:
+                        item = await asyncio.wait_for(q.get(), stage.linger)
+                    else:
+                        item = await q.get()
+                except asyncio.TimeoutError:
+                    await launch()
+                    continue
+                if item is _END:
+                    ends += 1
+                    continue
+                if stage.barrier:
+                    batch.append(item)
+                    continue
+                key, fp = stage.key(item), stage.fp(item)
+                hit, output = state.done(stage.name, key, fp)
+                if hit:
+                    st["skipped"] += 1
+                    if output is not None:
+                        await emit(stage, output)
+                    continue
+                batch.append(item)
+                keys.append((key, fp))
+                if len(batch) >= stage.batch:
+                    await launch()
+            if stage.barrier:
+                await call(stage, batch, [("*", "")])
+            else:
+                await launch()
+            while tasks:
+                await asyncio.gather(*list(tasks))
+        if stage.finish is not None:
+            await _maybe_await(stage.finish())
+        for c in consumers[stage.name]:
+            await queues[c].put(_END)
+
+    tasks = [asyncio.ensure_future(drive(s)) for s in stages]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for t in tasks:
+            t.cancel()
+    return stats
+
+
+def report(stats: Dict[str, dict]) -> str:
+    lines = [f"{'stage':10s} {'processed':>10s} {'skipped':>10s} {'failed':>8s} {'emitted':>10s} {'busy_s':>8s}"]
+    for name, st in stats.items():
+        lines.append(f"{name:10s} {st['processed']:10,d} {st['skipped']:10,d} {st['failed']:8,d}"
+                     f" {st['emitted']:10,d} {st['busy_s']:8.1f}")
+    return "\n".join(lines)
@@ -0,0 +1,345 @@
+"""
+procore_scraper.retrieval – local top-k retrieval over the FAISS index
+---------------------------------------------------------------------
+* The index written by ``ingest_vector_db.py`` is opened memory-mapped (flat
+  and SQ codes are served straight from the page cache), and so is its chunk
+  metadata (see chunk_meta), decoded only for returned hits – start-up cost
+  does not grow with the corpus.
+* Concurrent queries are micro-batched: whatever arrives within
+  ``max_wait_ms`` (up to ``max_batch``) is embedded in one request and
+  answered by one ``index.search`` call, run off the event loop.
+* An LRU cache maps (query, k, hybrid) → results; repeated questions skip
+  both the embedding call and the search.
+* Compact indexes (fp16 / int8 / binary codes, Matryoshka ``dims``; see
+  ann) are searched for ``rescore`` × k candidates, which are re-ranked by
+  exact inner product with their full fp16 rows, read from the memory-mapped
+  embedding store – RAM holds only the codes, precision comes from disk.
+* With a BM25 index (see bm25) results are hybrid: vector and lexical
+  candidate lists are fused by reciprocal rank, so exact identifiers
+  (endpoint paths, field names) surface without asking for a larger k.
+* The embedder is pluggable – ``OpenAIEmbedder`` for real use,
+  ``StubEmbedder`` (deterministic, offline) for tests and benchmarks.
+
+``serve()`` exposes a Retriever over a tiny JSON-over-HTTP API::
+
+    GET  /search?q=…&k=5[&hybrid=0] → {"query", "results": [{id, score, …meta}]}
+    POST /search {"query"|"queries", "k", "hybrid"}
+    GET  /stats
+"""
+from __future__ import annotations
+import asyncio, hashlib, json, pathlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Protocol, Sequence, Tuple
+from urllib.parse import parse_qs, urlsplit
+import numpy as np
+from procore_scraper import ann
+from procore_scraper.bm25 import BM25Index, rrf
+from procore_scraper.chunk_meta import ChunkMeta
+from procore_scraper.store import EmbeddingStore
+from procore_scraper.utils import log_json
+
+
+# ------------------------------------------------------------------- #
+# Embedders
+# ------------------------------------------------------------------- #
+class Embedder(Protocol):
+    async def embed(self, texts: Sequence[str]) -> np.ndarray: ...
+
+
+class OpenAIEmbedder:
+    def __init__(self, model: str, client=None, dimensions: Optional[int] = None):
+        import openai
+        self.model = model
+        self.client = client or openai.AsyncOpenAI()
+        self.extra = {"dimensions": dimensions} if dimensions else {}   # must match the store's width
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        resp = await self.client.embeddings.create(model=self.model, input=list(texts), **self.extra)
+        data = sorted(resp.data, key=lambda d: d.index)
+        return np.asarray([d.embedding for d in data], dtype="float32")
+
+
+class StubEmbedder:
+    """Deterministic unit vectors seeded by sha1(text) – no network, no model."""
+
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    def vector(self, text: str) -> np.ndarray:
+        seed = int.from_bytes(hashlib.sha1(text.encode("utf-8", "ignore")).digest()[:8], "little")
+        v = np.random.default_rng(seed).standard_normal(self.dim).astype("float32")
+        return v / np.linalg.norm(v)
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        return np.stack([self.vector(t) for t in texts])
+
+
+# ------------------------------------------------------------------- #
+# Retriever
+# ------------------------------------------------------------------- #
+class LRUCache:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._d: "OrderedDict[tuple, list]" = OrderedDict()
+        self.hits = self.misses = 0
+
+    def get(self, key: tuple) -> Optional[list]:
+        hit = self._d.get(key)
+        if hit is None:
+            self.misses += 1
+            return None
+        self._d.move_to_end(key)
+        self.hits += 1
+        return hit
+
+    def put(self, key: tuple, value: list) -> None:
+        if self.maxsize <= 0:
+            return
+        self._d[key] = value
+        self._d.move_to_end(key)
+        while len(self._d) > self.maxsize:
+            self._d.popitem(last=False)
+
+
+def load_state(index_path: str) -> dict:
+    """The ingest state next to the index (spec, store width); {} for indexes built before it existed."""
+    p = pathlib.Path(f"{index_path}.state.json")
+    return json.loads(p.read_text()) if p.exists() else {}
+
+
+def load_index(index_path: str, spec: Optional[dict] = None):
+    """faiss.index memory-mapped where the index type allows it."""
+    faiss = ann.import_faiss()
+    # not IO_FLAG_MMAP_IFC: combined with these, faiss 1.15 refuses IVF indexes
+    flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+    return ann.read_index(faiss, index_path, spec or {"type": "flat"}, flags)
+
+
+def load_meta(index_path: str) -> ChunkMeta:
+    return ChunkMeta(pathlib.Path(f"{index_path}.chunks"))
+
+
+Pending = Tuple[str, int, bool, asyncio.Future]
+
+
+class Retriever:
+    def __init__(self, index_path: str, embedder: Embedder, *, max_batch: int = 32,
+                 max_wait_ms: float = 2.0, cache_size: int = 4096,
+                 bm25_path: Optional[str] = None, candidates: int = 50,
+                 store_path: Optional[str] = None, rescore: int = 0):
+        state = load_state(index_path)
+        self.spec = state.get("spec", {"type": "flat"})
+        self.index = load_index(index_path, self.spec)
+        self.dim = state.get("dim") or self.index.d           # query width (store rows, before any cut)
+        self.meta = load_meta(index_path)
+        # re-rank on full rows only where the index scores are approximate
+        self.store, self.rescore = None, 0
+        if rescore and ann.lossy(self.spec):
+            store = EmbeddingStore(pathlib.Path(store_path)) if store_path else None
+            if store is None or not len(store) or store.dim != self.dim:
+                log_json("rescore_disabled", index=self.spec, store=store_path,
+                         reason="no store" if store is None or not len(store)
+                         else f"store dim {store.dim} != index input dim {self.dim}")
+            else:
+                self.store, self.rescore = store, rescore
+        self.embedder = embedder
+        # queried only from the executor thread, one batch at a time
+        self.lexical = BM25Index(pathlib.Path(bm25_path), check_same_thread=False) if bm25_path else None
+        self.candidates = candidates
+        self.max_batch, self.max_wait = max_batch, max_wait_ms / 1000
+        self.cache = LRUCache(cache_size)
+        self.batches = self.queries = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> "Retriever":
+        self._queue = asyncio.Queue()
+        self._task = asyncio.ensure_future(self._batcher())
+        return self
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def __aenter__(self) -> "Retriever":
+        return await self.start()
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    # ------------------------------------------------------------------ #
+    async def search(self, query: str, k: int = 5, hybrid: bool = True) -> List[dict]:
+        """
+        Top-k chunks for `query`: [{"id", "score", **chunk metadata}]. Hybrid
+        results (when a BM25 index is loaded) are RRF-scored and also carry
+        ``vector_rank`` / ``bm25_rank``.
+        """
+        if not 1 <= k <= self.index.ntotal:               # checked here: a bad k would fail its whole batch
+            raise ValueError(f"k must be in 1..{int(self.index.ntotal)}, got {k}")
+        hybrid = hybrid and self.lexical is not None
+        key = (query.strip(), k, hybrid)
+        self.queries += 1
+        hit = self.cache.get(key)
+        if hit is not None:
+            return hit
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put((key[0], k, hybrid, fut))
+        return await fut
+
+    def stats(self) -> dict:
+        return {"queries": self.queries, "batches": self.batches, "cache_hits": self.cache.hits,
+                "cache_size": len(self.cache._d), "ntotal": int(self.index.ntotal),
+                "index": self.spec, "rescore": self.rescore}
+
+    # ------------------------------------------------------------------ #
+    async def _batcher(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch: List[Pending] = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                wait = deadline - loop.time()
+                if wait <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), wait))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._run(batch)
+            except Exception as e:
+                for *_, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+
+    def _rescored(self, vecs: np.ndarray, ids: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        out_s = np.full((len(ids), k), -np.inf, dtype="float32")
+        out_i = np.full((len(ids), k), -1, dtype="int64")
+        for i, (q, row) in enumerate(zip(vecs, ids)):
+            cand = row[row >= 0]
+            if len(cand):
+                s, top = ann.rescore(q, cand, np.stack([self.store.vector(int(r)) for r in cand]), k)
+                out_s[i, : len(top)], out_i[i, : len(top)] = s, top
+        return out_s, out_i
+
+    def _search(self, vecs: np.ndarray, kmax: int, lexical: List[str]):
+        scores, ids = self.index.search(ann.prepare(self.spec, vecs), kmax * (self.rescore or 1))
+        if self.rescore:
+            scores, ids = self._rescored(vecs, ids, kmax)
+        else:
+            scores = ann.similarity(self.spec, self.dim, scores)
+        lex = {q: [i for key, _ in self.lexical.search(q, self.candidates)
+                   for i in self.meta.ids_for_key(key)[:1]] for q in lexical}
+        return scores, ids, lex
+
+    def _hit(self, id_: int, score: float, **extra) -> dict:
+        return {"id": id_, "score": score, **extra, **self.meta.get(id_, {})}
+
+    async def _run(self, batch: List[Pending]) -> None:
+        texts = list(dict.fromkeys(q for q, *_ in batch))
+        vecs = np.ascontiguousarray(await self.embedder.embed(texts), dtype="float32")
+        kmax = max(max(self.candidates, k) if h else k for _, k, h, _ in batch)
+        lexical = list(dict.fromkeys(q for q, _, h, _ in batch if h))
+        scores, ids, lex = await asyncio.get_running_loop().run_in_executor(
+            None, self._search, vecs, kmax, lexical)
+        self.batches += 1
+        row = {q: i for i, q in enumerate(texts)}
+        for q, k, hybrid, fut in batch:
+            i = row[q]
+            found = [(int(j), float(s)) for s, j in zip(scores[i], ids[i]) if j >= 0]
+            if hybrid:
+                vec_rank = {j: r for r, (j, _) in enumerate(found)}
+                lex_rank = {j: r for r, j in enumerate(lex[q])}
+                hits = [self._hit(j, s, vector_rank=vec_rank.get(j), bm25_rank=lex_rank.get(j))
+                        for j, s in rrf([[j for j, _ in found], lex[q]], k)]
+            else:
+                hits = [self._hit(j, s) for j, s in found[:k]]
+            self.cache.put((q, k, hybrid), hits)
+            if not fut.done():
+                fut.set_result(hits)
+
+
+# ------------------------------------------------------------------- #
+# HTTP
+# ------------------------------------------------------------------- #
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error"}
+
+
+def _flag(value) -> bool:
+    """hybrid=… from a query string or JSON body: "0" / "false" / false are off."""
+    if isinstance(value, str):
+        return value.strip().lower() not in ("0", "false", "no", "off", "")
+    return bool(value)
+
+
+async def _handle(retriever: Retriever, default_k: int,
+                  reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            headers: Dict[str, str] = {}
+            while (h := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                name, _, value = h.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            status, payload = 200, None
+            try:
+                parts = line.decode("latin-1").split()
+                if len(parts) != 3:
+                    headers["connection"] = "close"            # framing unknown: answer and hang up
+                    raise ValueError(f"malformed request line {line[:80]!r}")
+                method, target, _ = parts
+                body = await reader.readexactly(int(headers.get("content-length", 0) or 0))
+                url = urlsplit(target)
+                if url.path == "/stats":
+                    payload = retriever.stats()
+                elif url.path == "/search" and method == "GET":
+                    qs = parse_qs(url.query)
+                    q, k = qs["q"][0], int(qs.get("k", [default_k])[0])
+                    hybrid = _flag(qs.get("hybrid", ["1"])[0])
+                    payload = {"query": q, "results": await retriever.search(q, k, hybrid)}
+                elif url.path == "/search" and method == "POST":
+                    req = json.loads(body or b"{}")
+                    k, hybrid = int(req.get("k", default_k)), _flag(req.get("hybrid", True))
+                    if "queries" in req:
+                        res = await asyncio.gather(*(retriever.search(q, k, hybrid) for q in req["queries"]))
+                        payload = {"results": [{"query": q, "results": r} for q, r in zip(req["queries"], res)]}
+                    else:
+                        payload = {"query": req["query"],
+                                   "results": await retriever.search(req["query"], k, hybrid)}
+                else:
+                    status, payload = 404, {"error": f"no route {method} {url.path}"}
+            except (KeyError, ValueError, TypeError) as e:
+                status, payload = 400, {"error": f"bad request: {e}"}
+            except (ConnectionError, asyncio.IncompleteReadError):
+                raise
+            except Exception as e:                          # embedder / faiss: answer instead of dropping
+                log_json("retrieval_error", error=repr(e))
+                status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+
+            data = json.dumps(payload, ensure_ascii=False).encode()
+            writer.write(f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: application/json\r\n"
+                         f"Content-Length: {len(data)}\r\n\r\n".encode() + data)
+            await writer.drain()
+            if headers.get("connection", "").lower() == "close":
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(retriever: Retriever, host: str = "127.0.0.1", port: int = 8765,
+                default_k: int = 5) -> None:
+    async with retriever:
+        server = await asyncio.start_server(
+            lambda r, w: _handle(retriever, default_k, r, w), host, port)
+        log_json("retrieval_listening", host=host, port=port, ntotal=int(retriever.index.ntotal))
+        async with server:
+            await server.serve_forever()
@@ -0,0 +1,224 @@
+"""
+procore_scraper.sitemap – concurrent, streaming sitemap discovery
+-----------------------------------------------------------------
+* Sitemaps are fetched by a pool of workers over the crawler's pooled client
+  and per-host limits (see crawler); child sitemaps of an index are queued
+  as they are parsed, not after the index has been read.
+* Bodies are parsed while they download (``XMLPullParser`` fed chunk by
+  chunk, gunzipped on the fly for ``.xml.gz``), and each ``<url>`` element
+  is dropped once read, so a 50 000-URL sitemap never sits in memory.
+* The state file remembers every URL's ``<lastmod>`` and which sitemap
+  listed it, plus each leaf sitemap's own ``<lastmod>`` from its index. A
+  leaf whose ``<lastmod>`` has not moved is not fetched again; its URLs
+  carry over. ``changed()`` is then the URLs that are new or whose
+  ``<lastmod>`` advanced.
+
+When any sitemap fails to download, every URL not re-read this run keeps
+its previous entry, so a transient error never looks like mass deletion.
+"""
+from __future__ import annotations
+import asyncio, datetime, json, os, pathlib, zlib
+import xml.etree.ElementTree as ET
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import httpx
+from procore_scraper.crawler import HostLimiter, make_client
+from procore_scraper.utils import log_json
+
+Entry = Tuple[str, str, Optional[str]]       # ("url" | "sitemap", loc, lastmod)
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+class SitemapParser:
+    """Incremental ``<urlset>`` / ``<sitemapindex>`` parser: feed bytes, get entries."""
+
+    def __init__(self) -> None:
+        self._p = ET.XMLPullParser(("start", "end"))
+        self._z: Optional["zlib._Decompress"] = None
+        self._head = b""                      # until we know whether it is gzip
+        self._root: Optional[ET.Element] = None
+        self.kind: Optional[str] = None       # "urlset" | "sitemapindex"
+
+    def feed(self, data: bytes) -> List[Entry]:
+        if self._head is not None:
+            data = self._head + data
+            if len(data) < 2:
+                self._head = data
+                return []
+            self._head = None
+            if data[:2] == b"\x1f\x8b":
+                self._z = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self._p.feed(self._z.decompress(data) if self._z else data)
+        return self._drain()
+
+    def close(self) -> List[Entry]:
+        if self._head:
+            self._p.feed(self._head)
+        if self._z:
+            self._p.feed(self._z.flush())
+        self._p.close()
+        return self._drain()
+
+    def _drain(self) -> List[Entry]:
+        out: List[Entry] = []
+        for ev, el in self._p.read_events():
+            if ev == "start":
+                if self._root is None:
+                    self._root, self.kind = el, _local(el.tag)
+                continue
+            tag = _local(el.tag)
+            if tag not in ("url", "sitemap"):
+                continue
+            loc = lastmod = None
+            for child in el:
+                name = _local(child.tag)
+                if name == "loc":
+                    loc = (child.text or "").strip()
+                elif name == "lastmod":
+                    lastmod = (child.text or "").strip() or None
+            if loc:
+                out.append((tag, loc, lastmod))
+            self._root.clear()                # entries are direct children of the root
+        return out
+
+
+def parse_lastmod(value: Optional[str]) -> Optional[float]:
+    """W3C datetime (date only, or with time and zone) → POSIX seconds; naive = UTC."""
+    if not value:
+        return None
+    try:
+        d = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if d.tzinfo is None:
+        d = d.replace(tzinfo=datetime.timezone.utc)
+    return d.timestamp()
+
+
+def advanced(old: Optional[str], new: Optional[str]) -> bool:
+    a, b = parse_lastmod(old), parse_lastmod(new)
+    return b is not None and (a is None or b > a)
+
+
+# ------------------------------------------------------------------- #
+# State
+# ------------------------------------------------------------------- #
+class SitemapState:
+    """``{"urls": {loc: [lastmod, sitemap]}, "sitemaps": {leaf sitemap: lastmod}}`` on disk."""
+
+    def __init__(self, path: pathlib.Path):
+        self.path = pathlib.Path(path)
+        data = json.loads(self.path.read_text()) if self.path.exists() else {}
+        self.urls: Dict[str, list] = data.get("urls", {})
+        self.sitemaps: Dict[str, Optional[str]] = data.get("sitemaps", {})
+
+    def save(self) -> None:
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps({"sitemaps": self.sitemaps, "urls": self.urls}))
+        os.replace(tmp, self.path)
+
+
+def changed(prev: Dict[str, list], urls: Dict[str, list]) -> List[str]:
+    """URLs that are new in `urls` or whose lastmod advanced since `prev`."""
+    return sorted(loc for loc, (lm, _) in urls.items()
+                  if loc not in prev or advanced(prev[loc][0], lm))
+
+
+# ------------------------------------------------------------------- #
+# Discovery
+# ------------------------------------------------------------------- #
+async def _read(client: httpx.AsyncClient, limiter: HostLimiter, url: str,
+                on_entry, retry: int = 3) -> str:
+    """Stream-parse one sitemap, calling ``on_entry(entry)``; returns its root tag."""
+    for i in range(retry):
+        parser = SitemapParser()
+        try:
+            async with limiter.slot(url):
+                async with client.stream("GET", url) as resp:
+                    resp.raise_for_status()
+                    async for chunk in resp.aiter_bytes():
+                        for e in parser.feed(chunk):
+                            on_entry(e)
+                    for e in parser.close():
+                        on_entry(e)
+            return parser.kind or ""
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code < 500 or i == retry - 1:
+                raise
+        except httpx.TransportError:
+            if i == retry - 1:
+                raise
+        await asyncio.sleep(2**i)
+    raise RuntimeError(f"Failed fetch {url}")
+
+
+async def discover(roots: Iterable[str], state: SitemapState, *, concurrency: int = 8,
+                   client: Optional[httpx.AsyncClient] = None,
+                   full: bool = False) -> Tuple[Dict[str, list], Dict[str, Optional[str]]]:
+    """
+    Walk every sitemap reachable from `roots`. Returns (urls, leaf sitemaps)
+    in the state's format; `state` itself is not modified. With `full`, leaf
+    sitemaps are fetched even when their lastmod has not moved.
+    """
+    own = client is None
+    client = client or make_client(concurrency)
+    limiter = HostLimiter(concurrency)
+    urls: Dict[str, list] = {}
+    leaves: Dict[str, Optional[str]] = {}
+    kept: Set[str] = set()                    # leaves carried over from the state
+    read: Set[str] = set()                    # sitemaps read in full this run
+    seen: Set[str] = set()
+    queue: asyncio.Queue = asyncio.Queue()
+    for r in roots:
+        if r not in seen:
+            seen.add(r)
+            queue.put_nowait((r, None))
+    stats = dict.fromkeys(("fetched", "skipped", "failed"), 0)
+
+    async def worker() -> None:
+        while True:
+            sm, lastmod = await queue.get()
+            try:
+                if not full and lastmod and state.sitemaps.get(sm) == lastmod:
+                    kept.add(sm)
+                    leaves[sm] = lastmod
+                    stats["skipped"] += 1
+                    continue
+
+                def on_entry(e: Entry) -> None:
+                    kind, loc, lm = e
+                    if kind == "sitemap":
+                        if loc not in seen:
+                            seen.add(loc)
+                            queue.put_nowait((loc, lm))
+                    else:
+                        urls.setdefault(loc, [lm, sm])
+
+                if await _read(client, limiter, sm, on_entry) == "urlset":
+                    leaves[sm] = lastmod
+                read.add(sm)
+                stats["fetched"] += 1
+            except Exception as e:                # one bad sitemap never kills discovery
+                log_json("sitemap_error", url=sm, error=str(e))
+                stats["failed"] += 1
+                if sm in state.sitemaps:
+                    kept.add(sm)
+                    leaves[sm] = state.sitemaps[sm]
+            finally:
+                queue.task_done()
+
+    workers = [asyncio.ensure_future(worker()) for _ in range(max(1, concurrency))]
+    try:
+        await queue.join()
+    finally:
+        for w in workers:
+            w.cancel()
+        if own:
+            await client.aclose()
+    for loc, (lm, sm) in state.urls.items():
+        if sm in kept or (stats["failed"] and sm not in read):
+            urls.setdefault(loc, [lm, sm])
+    log_json("sitemaps_read", urls=len(urls), **stats)
+    return urls, leaves
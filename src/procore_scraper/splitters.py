@@ -7,11 +7,15 @@ Smart, recursion-safe chunker tuned for Procore docs.
 * Never splits inside fenced  ``` code blocks.
 * Recurses until every chunk ≤ CHUNK_MAX tokens.
 * Guaranteed progress: if the smart split fails, falls back to 50/50.
+* Linear time: each section is tokenized once, paragraph groups are counted
+  incrementally and the overlap is sliced from token arrays already in hand.
 """
 
 from __future__ import annotations
-from typing import List
-import re, tiktoken
+from collections import deque
+from typing import List, Tuple
+import re, regex, tiktoken
+from procore_scraper import metrics
 
 # ------------------------------------------------------------------- #
 # Constants
@@ -19,6 +23,25 @@ import re, tiktoken
 _HEAD_RE         = re.compile(r"^(#{2,6}\s+.+)", re.M)
 _CODE_FENCE_RE   = re.compile(r"```")
 enc              = tiktoken.encoding_for_model("gpt-4o-mini")
+# o200k_base's pre-tokenizer, as defined in tiktoken_ext.openai_public.
+_O200K_PAT       = "|".join([
+    r"""[^\r\n\p{L}\p{N}]?[\p{Lu}\p{Lt}\p{Lm}\p{Lo}\p{M}]*[\p{Ll}\p{Lm}\p{Lo}\p{M}]+(?i:'s|'t|'re|'ve|'m|'ll|'d)?""",
+    r"""[^\r\n\p{L}\p{N}]?[\p{Lu}\p{Lt}\p{Lm}\p{Lo}\p{M}]+[\p{Ll}\p{Lm}\p{Lo}\p{M}]*(?i:'s|'t|'re|'ve|'m|'ll|'d)?""",
+    r"""\p{N}{1,3}""",
+    r""" ?[^\s\p{L}\p{N}]+[\r\n/]*""",
+    r"""\s*[\r\n]+""",
+    r"""\s+(?!\S)""",
+    r"""\s+""",
+])
+# Positions that end a pre-token piece whatever follows them: a letter then a
+# space, or a newline then a char that is neither whitespace nor "/". Derived
+# by hand from _O200K_PAT and only valid for it – ``_pat_str`` is private to
+# tiktoken, so when it is missing or differs (another encoding, a tiktoken
+# upgrade) groups are re-encoded whole instead of by their unstable tail.
+_RESYNC_RE       = regex.compile(r"(?<=[A-Za-z])(?= )|(?<=[\r\n])(?=[^\s/])", regex.REVERSE)
+_INCREMENTAL     = getattr(enc, "_pat_str", None) == _O200K_PAT
+_PIECE_RE        = regex.compile(_O200K_PAT)     # tiktoken's pre-tokenizer
+_TAIL_MAX        = 256     # chars; longer tails are trimmed with a piece scan
 
 CHUNK_TARGET     = 320     # ideal size
 CHUNK_MAX        = 360     # hard upper size
@@ -44,57 +67,134 @@ def _split_headers(md: str) -> List[str]:
     return parts
 
 
-def _safe_split(section: str) -> List[str]:
+def _tail_start(text: str) -> int:
     """
-    Recursively split `section` until every piece ≤ CHUNK_MAX tokens.
+    Offset into `text` before which its tokens are final.
 
-    Pass 1  paragraph grouping outside code fences.  
-    Pass 2  if still oversize, hard-split token stream at midpoint.
+    BPE never merges across pre-token pieces, and appending a blank line plus
+    the next paragraph can only re-shape the last piece. Everything before the
+    last guaranteed piece boundary therefore keeps its tokens; only
+    ``text[offset:]`` has to be re-encoded on the next append.
     """
-    if _toklen(section) <= CHUNK_MAX:
-        return [section]
+    m = _RESYNC_RE.search(text)
+    pos = m.start() if m else 0
+    if len(text) - pos <= _TAIL_MAX:
+        return pos
+    last = deque(_PIECE_RE.finditer(text, pos), maxlen=2)
+    return last[0].start() if len(last) == 2 else pos
 
-    # ----- Pass 1 : smart paragraph split -----
-    paras = section.split("\n\n")
-    out, buf, in_code = [], [], False
-    for para in paras:
+
+def _group_paragraphs(section: str) -> List[Tuple[str, List[int]]]:
+    """
+    Pass 1 of `_safe_split`: greedily group paragraphs (outside code fences)
+    until a group reaches CHUNK_TARGET tokens.
+
+    The group's token array is kept exactly equal to the encoding of the joined
+    group by re-encoding only its unstable tail plus the new paragraph, so the
+    pass is linear in the section length and yields each chunk's tokens.
+    Without a known pre-tokenizer (see ``_RESYNC_RE``) the group is re-encoded
+    whole on every append.
+    """
+    out: List[Tuple[str, List[int]]] = []
+    in_code = False
+    start = pos = 0                # char offsets of the open group / next paragraph
+    nbuf = tail_tok = 0
+    toks: List[int] = []
+    tail = ""
+
+    def emit(raw: str) -> None:
+        chunk = raw.strip()
+        out.append((chunk, toks if chunk == raw else enc.encode_ordinary(chunk)))
+
+    for para in section.split("\n\n"):
+        end = pos + len(para)
         if _CODE_FENCE_RE.search(para):
             in_code = not in_code
-        buf.append(para)
-        if (not in_code) and _toklen("\n\n".join(buf)) >= CHUNK_TARGET:
-            out.append("\n\n".join(buf).strip())
-            buf = []
-    if buf:
-        out.append("\n\n".join(buf).strip())
+        if _INCREMENTAL:
+            text = tail + "\n\n" + para if nbuf else para
+            if tail_tok:
+                del toks[-tail_tok:]
+            toks.extend(enc.encode_ordinary(text))
+            tail = text[_tail_start(text):]
+            tail_tok = len(enc.encode_ordinary(tail))
+        else:
+            toks = enc.encode_ordinary(section[start:end])
+        nbuf += 1
+        if (not in_code) and len(toks) >= CHUNK_TARGET:
+            emit(section[start:end])
+            start, nbuf, tail_tok, tail, toks = end + 2, 0, 0, "", []
+        pos = end + 2
+    if nbuf:
+        emit(section[start:])
+    return out
+
+
+def _split(section: str, tokens: List[int]) -> List[Tuple[str, List[int]]]:
+    """`_safe_split` on a pre-tokenized section; yields (chunk, tokens)."""
+    if len(tokens) <= CHUNK_MAX:
+        return [(section, tokens)]
+
+    # ----- Pass 1 : smart paragraph split -----
+    # (children are substrings of an already-encoded section, so the special
+    # token check `enc.encode` does has passed; encode_ordinary from here on)
+    out = _group_paragraphs(section)
 
     # ----- Pass 2 : fallback 50/50 if no progress -----
-    if len(out) == 1 and _toklen(out[0]) > CHUNK_MAX:
-        tokens = enc.encode(section)
+    if len(out) == 1 and len(out[0][1]) > CHUNK_MAX:
         mid = len(tokens) // 2
         left, right = enc.decode(tokens[:mid]), enc.decode(tokens[mid:])
-        out = [left, right]
+        out = [(left, enc.encode_ordinary(left)), (right, enc.encode_ordinary(right))]
 
     # Recurse on any child that’s still too big
-    final: List[str] = []
-    for chunk in out:
-        final.extend(_safe_split(chunk) if _toklen(chunk) > CHUNK_MAX else [chunk])
+    final: List[Tuple[str, List[int]]] = []
+    for chunk, toks in out:
+        final.extend(_split(chunk, toks) if len(toks) > CHUNK_MAX else [(chunk, toks)])
     return final
 
 
+@metrics.timed("safe_split")
+def _safe_split(section: str) -> List[str]:
+    """
+    Recursively split `section` until every piece ≤ CHUNK_MAX tokens.
+
+    Pass 1  paragraph grouping outside code fences.  
+    Pass 2  if still oversize, hard-split token stream at midpoint.
+    """
+    return [chunk for chunk, _ in _split(section, enc.encode(section))]
+
+
 # ------------------------------------------------------------------- #
-def dynamic_markdown_split(md: str) -> List[str]:
-    """Public API – returns a list of overlapped chunks."""
+@metrics.timed("split_doc")
+def split_with_tokens(md: str) -> Tuple[List[str], List[int], int]:
+    """
+    `dynamic_markdown_split` plus token bookkeeping the split already paid for:
+    per-chunk token counts (overlap + chunk, within a few tokens of exact)
+    and the document's total token count. Sections start on a newline followed
+    by ``#``, a guaranteed pre-token boundary, so the section counts sum to
+    ``len(enc.encode(md))`` exactly.
+    """
     sections = _split_headers(md)
-    chunks: List[str] = []
+    chunks: List[Tuple[str, List[int]]] = []
+    total = 0
     for sec in sections:
-        chunks.extend(_safe_split(sec))
+        toks = enc.encode(sec)
+        total += len(toks)
+        chunks.extend(_split(sec, toks))
 
     # fixed overlap
     result: List[str] = []
-    for i, chunk in enumerate(chunks):
+    counts: List[int] = []
+    for i, (chunk, toks) in enumerate(chunks):
         if i == 0:
             result.append(chunk.strip())
+            counts.append(len(toks))
         else:
-            overlap = enc.decode(enc.encode(chunks[i - 1])[-OVERLAP_TOKENS:])
-            result.append((overlap + "\n\n" + chunk).strip())
-    return result
\ No newline at end of file
+            prev = chunks[i - 1][1][-OVERLAP_TOKENS:]
+            result.append((enc.decode(prev) + "\n\n" + chunk).strip())
+            counts.append(len(prev) + 1 + len(toks))
+    return result, counts, total
+
+
+def dynamic_markdown_split(md: str) -> List[str]:
+    """Public API – returns a list of overlapped chunks."""
+    return split_with_tokens(md)[0]
@@ -0,0 +1,228 @@
+"""
+procore_scraper.store – append-only, crash-safe embedding store
+---------------------------------------------------------------
+::
+
+    data/embeddings/store/
+        MANIFEST.json        committed segments, in order   ← commit point
+        seg-000001.emb       one immutable segment per commit
+        ...
+
+Segment layout (little-endian)::
+
+    b"PCEMB\\x00\\x01\\x00"           magic + format version
+    u32                             header length
+    JSON header                     {"dim", "dtype", "model", "rows", offsets…}
+    zero padding to 64 bytes
+    rows × dim vectors              dtype from the header
+    (rows + 1) × u64                metadata offsets, relative to the block
+    metadata block                  one JSON object per row, back to back
+
+A segment is written to a temp file, fsync'd and renamed, and only then listed
+in MANIFEST.json (itself replaced atomically). A crash leaves either the old
+or the new manifest – vectors and their metadata are committed together or not
+at all – and unlisted segment files are swept on the next commit.
+
+Readers mmap every segment: vectors are zero-copy ``np.ndarray`` views and
+metadata rows are decoded only when asked for.
+"""
+from __future__ import annotations
+import bisect, json, mmap, os, pathlib, struct
+from typing import Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+
+MAGIC    = b"PCEMB\x00\x01\x00"
+ALIGN    = 64
+MANIFEST = "MANIFEST.json"
+
+
+def _write_atomic(path: pathlib.Path, data: bytes) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as fh:
+        fh.write(data)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp, path)
+
+
+def _read_manifest(root: pathlib.Path) -> dict:
+    p = root / MANIFEST
+    return json.loads(p.read_text()) if p.exists() else {"segments": []}
+
+
+# ------------------------------------------------------------------- #
+# Reader
+# ------------------------------------------------------------------- #
+class Segment:
+    """One mmap'd segment file."""
+
+    def __init__(self, path: pathlib.Path):
+        self.path = path
+        with open(path, "rb") as fh:
+            self._mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:8] != MAGIC:
+            raise ValueError(f"{path}: not an embedding segment")
+        (hlen,) = struct.unpack_from("<I", self._mm, 8)
+        self.header = json.loads(self._mm[12 : 12 + hlen])
+        h = self.header
+        self.rows, self.dim, self.dtype = h["rows"], h["dim"], np.dtype(h["dtype"])
+        self.vectors = np.frombuffer(self._mm, dtype=self.dtype, count=self.rows * self.dim,
+                                     offset=h["vec_offset"]).reshape(self.rows, self.dim)
+        self._offs = np.frombuffer(self._mm, dtype="<u8", count=self.rows + 1, offset=h["off_offset"])
+        self._meta = h["meta_offset"]
+
+    def meta(self, i: int) -> dict:
+        a, b = int(self._offs[i]), int(self._offs[i + 1])
+        return json.loads(self._mm[self._meta + a : self._meta + b])
+
+    def iter_meta(self) -> Iterator[dict]:
+        for i in range(self.rows):
+            yield self.meta(i)
+
+    def evict(self, a: int, b: int) -> None:
+        """Drop the resident pages backing vector rows [a, b); they fault back in on access."""
+        if not hasattr(self._mm, "madvise") or b <= a:
+            return
+        row = self.dim * self.dtype.itemsize
+        lo = self.header["vec_offset"] + a * row
+        lo -= lo % mmap.PAGESIZE
+        self._mm.madvise(mmap.MADV_DONTNEED, lo, self.header["vec_offset"] + b * row - lo)
+
+
+class EmbeddingStore:
+    """Read-only view over every committed segment (global row ids in commit order)."""
+
+    def __init__(self, root: pathlib.Path):
+        self.root = pathlib.Path(root)
+        man = _read_manifest(self.root)
+        self.model: Optional[str] = man.get("model")
+        self.dim: Optional[int] = man.get("dim")
+        self.dtype: Optional[str] = man.get("dtype")
+        self.segments = [Segment(self.root / name) for name in man["segments"]]
+        self._starts = [0]
+        for seg in self.segments:
+            self._starts.append(self._starts[-1] + seg.rows)
+
+    def __len__(self) -> int:
+        return self._starts[-1]
+
+    def _locate(self, row: int) -> Tuple[Segment, int]:
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        k = bisect.bisect_right(self._starts, row) - 1
+        return self.segments[k], row - self._starts[k]
+
+    def vector(self, row: int) -> np.ndarray:
+        seg, i = self._locate(row)
+        return seg.vectors[i]
+
+    def meta(self, row: int) -> dict:
+        seg, i = self._locate(row)
+        return seg.meta(i)
+
+    def evict(self, row: int, n: int) -> None:
+        """Release mmap pages of rows [row, row + n) once a streaming reader is done with them."""
+        while n > 0:
+            seg, i = self._locate(row)
+            k = min(n, seg.rows - i)
+            seg.evict(i, i + k)
+            row, n = row + k, n - k
+
+    def iter_meta(self) -> Iterator[dict]:
+        for seg in self.segments:
+            yield from seg.iter_meta()
+
+    def blocks(self, block_rows: int = 0, start: int = 0) -> Iterator[Tuple[int, np.ndarray]]:
+        """
+        (first global row, zero-copy vector view) from row `start` on, one per
+        segment split to ≤ block_rows.
+        """
+        for first, seg in zip(self._starts, self.segments):
+            if first + seg.rows <= start:
+                continue
+            step = block_rows or seg.rows or 1
+            for a in range(max(0, start - first), seg.rows, step):
+                yield first + a, seg.vectors[a : a + step]
+
+
+# ------------------------------------------------------------------- #
+# Writer
+# ------------------------------------------------------------------- #
+class StoreWriter:
+    """Buffers rows and commits them as a new segment."""
+
+    def __init__(self, root: pathlib.Path, model: str, dim: int, dtype: str = "float16"):
+        self.root = pathlib.Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._man = _read_manifest(self.root)
+        want = {"model": model, "dim": dim, "dtype": np.dtype(dtype).name}
+        have = {k: self._man.get(k) for k in want}
+        if self._man["segments"] and have != want:
+            raise ValueError(f"{self.root} holds {have}, not {want}; "
+                             f"use another store directory or remove this one")
+        self._man.update(want)
+        self.dtype = np.dtype(dtype).newbyteorder("<")
+        self.dim = dim
+        self._vecs: List[np.ndarray] = []
+        self._metas: List[dict] = []
+
+    @property
+    def pending(self) -> int:
+        return len(self._metas)
+
+    def append(self, vecs: np.ndarray, metas: Sequence[dict]) -> None:
+        vecs = np.asarray(vecs, dtype=self.dtype).reshape(-1, self.dim)
+        if len(vecs) != len(metas):
+            raise ValueError(f"{len(vecs)} vectors for {len(metas)} metadata rows")
+        self._vecs.append(vecs)
+        self._metas.extend(metas)
+
+    def commit(self) -> int:
+        """Write pending rows as one segment; returns the number of rows committed."""
+        rows = len(self._metas)
+        if not rows:
+            return 0
+        vecs = np.concatenate(self._vecs)
+        blobs = [json.dumps(m, ensure_ascii=False).encode() for m in self._metas]
+        offs = np.zeros(rows + 1, dtype="<u8")
+        np.cumsum([len(b) for b in blobs], out=offs[1:])
+
+        header = {"dim": self.dim, "dtype": self._man["dtype"], "model": self._man["model"],
+                  "rows": rows, "vec_offset": 0, "off_offset": 0, "meta_offset": 0}
+        # offsets depend on the header's own length; iterate until stable
+        while True:
+            hb = json.dumps(header).encode()
+            vec_off = -(-(12 + len(hb)) // ALIGN) * ALIGN
+            off_off = vec_off + vecs.nbytes
+            layout = dict(vec_offset=vec_off, off_offset=off_off, meta_offset=off_off + offs.nbytes)
+            if all(header[k] == v for k, v in layout.items()):
+                break
+            header.update(layout)
+
+        seq = self._man.get("next_seq", 1)
+        name = f"seg-{seq:06d}.emb"
+        tmp = self.root / (name + ".tmp")
+        with open(tmp, "wb") as fh:
+            fh.write(MAGIC + struct.pack("<I", len(hb)) + hb)
+            fh.write(b"\0" * (vec_off - 12 - len(hb)))
+            fh.write(vecs.tobytes())
+            fh.write(offs.tobytes())
+            for b in blobs:
+                fh.write(b)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, self.root / name)
+
+        self._man["segments"].append(name)
+        self._man["next_seq"] = seq + 1
+        self._man["rows"] = self._man.get("rows", 0) + rows
+        _write_atomic(self.root / MANIFEST, json.dumps(self._man, indent=1).encode())
+        self._sweep()
+        self._vecs, self._metas = [], []
+        return rows
+
+    def _sweep(self) -> None:
+        live = set(self._man["segments"])
+        for p in self.root.glob("seg-*"):
+            if p.name not in live:
+                p.unlink()
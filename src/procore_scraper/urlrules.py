@@ -0,0 +1,102 @@
+"""
+procore_scraper.urlrules – compiled include / exclude rules and URL dedupe
+--------------------------------------------------------------------------
+Rules come from ``url_rules`` in settings.yaml::
+
+    url_rules:
+      exclude: ['/blog/', '\\.(jpg|png|pdf)$', login]   # regexes, searched
+      include: []                 # if any, a URL must match one of them
+      strip_params: [ref]         # extra query params to drop (regexes)
+      drop_query: false           # ignore the whole query string for dedupe
+      default_locales: [en, en-us]  # /en-us/x is the same page as /x
+
+Each list compiles to a single alternation, so a URL costs one regex search
+per list no matter how many patterns there are. URLs are canonicalized
+first (see utils.canonicalize) and rules run against that form.
+
+``process`` is one streaming pass – canonicalize, filter, dedupe – that
+yields each surviving URL the first time its dedupe key is seen. The key
+additionally ignores trailing index pages (``/index.html``), a default-locale
+prefix and query-parameter order, and is kept as a 16-byte digest, so memory
+per distinct URL is small enough for million-line lists.
+"""
+from __future__ import annotations
+import hashlib, re
+from typing import Dict, Iterable, Iterator, Optional, Pattern, Sequence
+from procore_scraper.utils import TRACKING_RE, canonicalize
+
+DEFAULT_EXCLUDE = (r"/blog/", r"\.(jpg|jpeg|png|gif|svg|pdf)$", r"login", r"signup")
+_INDEX_RE = re.compile(r"/(?:index|default)\.(?:html?|php|aspx?)$", re.IGNORECASE)
+
+
+def compile_any(patterns: Sequence[str]) -> Optional[Pattern]:
+    """One regex matching wherever any of `patterns` would (None for no patterns)."""
+    if not patterns:
+        return None
+    return re.compile("|".join(f"(?:{p})" for p in patterns))
+
+
+class UrlRules:
+    def __init__(self, include: Sequence[str] = (), exclude: Sequence[str] = DEFAULT_EXCLUDE,
+                 strip_params: Sequence[str] = (), drop_query: bool = False,
+                 default_locales: Sequence[str] = ()):
+        self.include = compile_any(include)
+        self.exclude = compile_any(exclude)
+        self.strip = re.compile(f"{TRACKING_RE.pattern}|{compile_any(strip_params).pattern}") \
+            if strip_params else TRACKING_RE
+        self.drop_query = drop_query
+        locales = "|".join(re.escape(l.lower()) for l in default_locales)
+        self._locale = re.compile(f"^(/(?:{locales}))(?=/|$)", re.IGNORECASE) if locales else None
+        self.stats: Dict[str, int] = dict.fromkeys(("seen", "excluded", "duplicate", "kept"), 0)
+
+    @classmethod
+    def from_config(cls, cfg: Optional[dict]) -> "UrlRules":
+        r = (cfg or {}).get("url_rules") or {}
+        return cls(include=r.get("include") or (), exclude=r.get("exclude", DEFAULT_EXCLUDE) or (),
+                   strip_params=r.get("strip_params") or (), drop_query=bool(r.get("drop_query")),
+                   default_locales=r.get("default_locales") or ())
+
+    # ------------------------------------------------------------------ #
+    def canonical(self, url: str) -> str:
+        return canonicalize(url, self.strip)
+
+    def allowed(self, canon: str) -> bool:
+        if self.exclude is not None and self.exclude.search(canon):
+            return False
+        return self.include is None or self.include.search(canon) is not None
+
+    def key(self, canon: str) -> bytes:
+        """Dedupe key of a canonical URL."""
+        rest = canon.split("://", 1)[-1]
+        host, slash, tail = rest.partition("/")
+        path, _, query = (slash + tail).partition("?")
+        path = _INDEX_RE.sub("", path)
+        if self._locale is not None:
+            path = self._locale.sub("", path)
+        if self.drop_query:
+            query = ""
+        elif "&" in query:
+            query = "&".join(sorted(query.split("&")))
+        k = f"{host}{path.rstrip('/')}?{query}"
+        return hashlib.blake2b(k.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+    def process(self, urls: Iterable[str], seen: Optional[set] = None) -> Iterator[str]:
+        """Canonical, allowed, first-of-their-key URLs from `urls`, in input order."""
+        seen = set() if seen is None else seen
+        st = self.stats
+        for url in urls:
+            url = url.strip()
+            if not url:
+                continue
+            st["seen"] += 1
+            canon = self.canonical(url)
+            if not self.allowed(canon):
+                st["excluded"] += 1
+                continue
+            k = self.key(canon)
+            if k in seen:
+                st["duplicate"] += 1
+                continue
+            seen.add(k)
+            st["kept"] += 1
+            yield canon
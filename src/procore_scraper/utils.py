@@ -3,23 +3,55 @@
 procore_scraper.utils – misc helpers
 """
 from __future__ import annotations
-import hashlib, re, json, datetime, sys
-from typing import Any
+import hashlib, re, json, datetime, os, sys
+from typing import Any, Optional, Pattern
 
 _SLUG_RE = re.compile(r"[^a-z0-9]+")
+DEFAULT_PORTS = {"http": 80, "https": 443}
+_URL_RE  = re.compile(r"([A-Za-z][A-Za-z0-9+.-]*)://([^/?#]*)([^?#]*)(?:\?([^#]*))?", re.S)
+_PORT_RE = re.compile(r":(\d+)$")
+# analytics / click-tracking query parameters; never part of a page's identity
+TRACKING_RE = re.compile(r"utm_\w+|gclid|gbraid|wbraid|fbclid|msclkid|mc_cid|mc_eid|_ga|_gl"
+                         r"|_hsenc|_hsmi|hsCtaTracking|mkt_tok|ref_src|trk|igshid")
 
 def sha1_text(text: str) -> str:
     return hashlib.sha1(text.encode("utf-8", "ignore")).hexdigest()
 
-def canonicalize(url: str) -> str:
-    url = url.strip().replace("http://", "https://").rstrip("/").lower()
-    return url
+def canonicalize(url: str, strip_params: Optional[Pattern] = TRACKING_RE) -> str:
+    """
+    Fetchable canonical form: https, lower-case host, no default port,
+    fragment or trailing slash, and no query parameters whose name fully
+    matches `strip_params`. Path and query keep their case.
+    """
+    m = _URL_RE.match(url.strip())
+    if m is None:                             # no scheme: leave it as given
+        return url.strip().rstrip("/")
+    scheme, netloc, path, query = m.groups()
+    scheme = scheme.lower()
+    netloc = (netloc or "").rpartition("@")[2].lower()
+    given = scheme
+    if scheme == "http":
+        scheme = "https"
+    # default port of the scheme given (http:…:80) or the one fetched (…:443 once upgraded to https)
+    port = _PORT_RE.search(netloc)
+    if port and int(port.group(1)) in (DEFAULT_PORTS.get(given), DEFAULT_PORTS.get(scheme)):
+        netloc = netloc[: port.start()]
+    if query and strip_params is not None:
+        query = "&".join(p for p in query.split("&")
+                         if p and not strip_params.fullmatch(p.partition("=")[0]))
+    out = f"{scheme}://{netloc}{path.rstrip('/')}"
+    return f"{out}?{query}" if query else out
 
 def slugify(url: str, max_len: int = 240) -> str:
-    body = canonicalize(url).split("://",1)[-1]
+    body = canonicalize(url).lower().split("://",1)[-1]
     slug = _SLUG_RE.sub("-", body).strip("-")
     return slug[:max_len]
 
+def emb_dims(cfg: dict) -> Optional[int]:
+    """Matryoshka cut for embedding requests: $EMB_DIMS, else ``emb_dims`` in settings.yaml; None = full width."""
+    return int(os.getenv("EMB_DIMS") or cfg.get("emb_dims") or 0) or None
+
+
 def log_json(event: str, **data: Any) -> None:
     payload = {"ts": datetime.datetime.utcnow().isoformat(timespec="seconds")+"Z",
                "event": event, **data}
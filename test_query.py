@@ -1,48 +1,36 @@
 # test_query.py
-import openai, os, time
+"""
+Ask the Procore Assistant a few questions concurrently and report time to
+first token / total latency for each (see procore_scraper.assistant).
+"""
+import argparse, asyncio
+from procore_scraper.assistant import AssistantClient, ASSISTANT_ID
 
-openai.api_key = os.getenv("OPENAI_API_KEY")
+QUESTIONS = [
+    "How do I authenticate with the Procore API?",
+    "How do I refresh an OAuth token?",
+    "How do I create an RFI?",
+]
 
-# Use the assistant ID from create_assistant.py
-assistant_id = "asst_ueLOB0oOsC8ZQkymnJ3nBkSj"
 
-def ask_question(question):
-    """Ask a question to the Procore Assistant"""
-    # Create a thread
-    thread = openai.beta.threads.create()
-    
-    # Add the message to the thread
-    message = openai.beta.threads.messages.create(
-        thread_id=thread.id,
-        role="user",
-        content=question
-    )
-    
-    # Run the assistant
-    run = openai.beta.threads.runs.create(
-        thread_id=thread.id,
-        assistant_id=assistant_id
-    )
-    
-    # Wait for completion
-    while run.status != "completed":
-        time.sleep(1)
-        run = openai.beta.threads.runs.retrieve(thread_id=thread.id, run_id=run.id)
-        if run.status == "failed":
-            return f"Error: {run.last_error}"
-    
-    # Get the response
-    messages = openai.beta.threads.messages.list(thread_id=thread.id)
-    for msg in messages.data:
-        if msg.role == "assistant":
-            return msg.content[0].text.value
-    
-    return "No response received"
+async def run(questions, assistant_id, concurrency):
+    client = AssistantClient(assistant_id=assistant_id, concurrency=concurrency)
+    for r in await client.ask_many(questions):
+        print(f"❓ Question: {r['question']}")
+        if r["status"] != "completed":
+            print(f"❌ {r['status']}: {r['error']}")
+        print(f"💡 Answer:\n{r['answer']}")
+        print(f"⏱  first token {r['ttft_s']}s, total {r['total_s']}s\n")
 
-# Test question
-question = "How do I authenticate with the Procore API?"
-print(f"❓ Question: {question}")
-print("🤔 Thinking...")
 
-answer = ask_question(question)
-print(f"\n💡 Answer:\n{answer}") 
\ No newline at end of file
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("questions", nargs="*", default=QUESTIONS)
+    ap.add_argument("--assistant", default=ASSISTANT_ID)
+    ap.add_argument("-c", "--concurrency", type=int, default=4, help="runs in flight")
+    args = ap.parse_args()
+    asyncio.run(run(args.questions, args.assistant, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+from procore_scraper.neardup import NearDupIndex
+
+WORDS = [f"w{i}" for i in range(400)]
+
+
+def page(seed: int, n: int = 300) -> str:
+    return " ".join(WORDS[(seed * 7 + i * 13) % len(WORDS)] for i in range(n))
+
+
+def near(text: str, tail: str) -> str:
+    return text + " " + tail
+
+
+def test_orphans_of_an_edited_canonical_form_one_star(tmp_path):
+    base = page(1)
+    idx = NearDupIndex(tmp_path / "neardup.sqlite")
+    idx.update({"a": base, "b": near(base, "x1"), "c": near(base, "x2"), "d": near(base, "x3")})
+    assert idx.duplicates() == {"b": "a", "c": "a", "d": "a"}
+
+    idx.update({"a": page(99)})                     # canonical edited away, three members remain
+    dups = idx.duplicates()
+    assert dups == {"c": "b", "d": "b"}
+    assert not set(dups) & set(dups.values())       # no canonical is itself a duplicate
+    idx.close()
+
+
+def test_orphans_of_a_dropped_canonical_stay_live(tmp_path):
+    base = page(2)
+    idx = NearDupIndex(tmp_path / "neardup.sqlite")
+    idx.update({"a": base, "b": near(base, "y1"), "c": near(base, "y2")})
+    idx.update({}, drop=["a"])
+    assert idx.duplicates() == {"c": "b"}
+    idx.close()